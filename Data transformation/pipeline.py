@@ -0,0 +1,280 @@
+"""
+Pipeline of the data transformation, the same steps of "data_transformation.ipynb"
+as a script that runs outside Jupyter.
+
+The movies are transformed in memory (one row per movie), the credits are read in
+chunks of ids, transformed, merged with their movies and appended to the output
+files, so the peak memory doesn't depend on the size of "credits.csv". The columns
+of the API of each chunk are appended to the binary columnar dataset
+("api/data/movies") too, its .npy files are written from them at the end.
+
+Usage (from the root of the repository):
+    python "Data transformation/pipeline.py" [--chunk-size 5000] [--workers 4]
+
+Available Functions:
+- transform_movies: Clean the movies and extract their nested columns.
+- transform_credits: Clean a chunk of credits and extract the cast and crew.
+- run_pipeline: Run the whole pipeline and write the output files.
+- transform_all: The steps of run_pipeline, with the process pool of the nested columns.
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils import validation
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(script_dir)
+
+movies_path = os.path.join(script_dir, "raw data", "movies_dataset.csv")
+credits_path = os.path.join(script_dir, "raw data", "credits.csv")
+api_dir = os.path.join(root_dir, "api", "data")
+model_dir = os.path.join(root_dir, "ML_model", "data")
+eda_dir = os.path.join(root_dir, "EDA", "data")
+
+columns_to_drop = ["video", "imdb_id", "adult", "original_title", "poster_path", "homepage"]
+
+# Nested columns of the movies: (column, keys, new columns)
+movies_nested = [
+    ("spoken_languages", ["iso_639_1", "name"], ["initial_sp_languages", "sp_languages"]),
+    ("production_countries", ["iso_3166_1", "name"], ["initial_prod_countries", "prod_countries"]),
+    ("production_companies", ["id", "name"], ["companies_id", "companies_name"]),
+    ("genres", ["id", "name"], ["movie_genres_id", "movie_genres"]),
+]
+
+# Nested columns of the credits
+credits_nested = [
+    ("crew", ["id", "name", "gender", "department", "job"],
+     ["crew_id", "crew_name", "crew_gender", "crew_department", "crew_job"]),
+    ("cast", ["id", "name", "gender", "character"],
+     ["actor_id", "actor_name", "actor_gender", "actor_character"]),
+]
+
+# Columns of each output file
+api_files = {
+    "api_data12": ["release_date", "status"],
+    "api_data3": ["title", "release_year", "popularity"],
+    "api_data4": ["title", "release_year", "vote_count", "vote_average"],
+    "api_data5": ["id", "return", "actor_name"],
+    "api_data6": ["title", "release_date", "return", "revenue", "budget", "crew_name", "crew_job"],
+}
+# Binary columnar dataset of the API, it replaces the api_data files
+api_schema = {
+    "id": "int", "title": "str", "release_date": "date", "release_year": "int", "status": "category",
+    "popularity": "float", "vote_count": "float", "vote_average": "float", "return": "float",
+    "revenue": "float", "budget": "float", "actor_name": "list", "crew_name": "list", "crew_job": "list",
+}
+overview_columns = ["id", "title", "overview", "release_year", "vote_count"]
+# Lists of labels of the model (ML_model/data), only the movies with any label
+label_files = {
+    "genre": ["id", "title", "movie_genres"],
+    "collections": ["id", "title", "collection_name"],
+}
+eda_columns = ["id", "title", "collection_name", "movie_genres", "release_year", "status", "return", "revenue",
+               "budget", "vote_count", "vote_average", "popularity", "original_language", "overview",
+               "companies_name", "prod_countries", "runtime", "sp_languages", "tagline", "actor_name",
+               "crew_name", "crew_job"]
+
+
+def transform_movies(path=movies_path, workers=1, executor=None):
+    """
+    Clean the movies and extract their nested columns.
+    The nested columns are evaluated with the given number of processes (in the executor, if given).
+
+    Returns:
+        movies: DataFrame with a row per movie id.
+        reports: A list with the report of each nested column.
+    """
+    movies = pd.read_csv(path, low_memory=False)
+
+    # Duplicated and non numeric ids
+    movies = validation.remove_duplicates(movies, "id")
+    id_invalid_values = validation.date_pattern(movies["id"], 0)
+    movies = movies[~movies["id"].isin(id_invalid_values)]
+    movies = validation.convert_to_numeric(movies.copy(), "id")
+    movies = movies[pd.to_numeric(movies["id"], errors="coerce").notna()]
+    movies["id"] = movies["id"].astype(np.int64)
+
+    movies = movies.drop(columns=[column for column in columns_to_drop if column in movies.columns])
+    movies[["revenue", "budget"]] = movies[["revenue", "budget"]].fillna(0)
+
+    # Release date and year
+    movies = movies.dropna(subset=["release_date"])
+    movies["release_date"] = pd.to_datetime(movies["release_date"])
+    movies["release_year"] = movies["release_date"].dt.year
+
+    # Return of the investment
+    movies = validation.convert_to_numeric(movies, "budget")
+    movies["return"] = movies["revenue"] / movies["budget"]
+    movies.loc[(movies["revenue"] == 0) | (movies["budget"] == 0), "return"] = 0
+
+    reports = []
+    for column_name, keys, new_columns in movies_nested:
+        movies, report = validation.extract_values(movies, column_name, keys, new_columns,
+                                                   report=True, workers=workers, executor=executor)
+        reports.append(report)
+    movies, report = validation.extract_dict_values(movies, "belongs_to_collection", ["id", "name"],
+                                                     ["collection_id", "collection_name"],
+                                                     report=True, workers=workers, executor=executor)
+    reports.append(report)
+
+    for column_name in ["original_language", "overview", "status", "tagline"]:
+        movies = validation.replace_nan_with_empty_string(movies, column_name)
+
+    movies = movies.drop(columns=[column_name for column_name, _, _ in movies_nested] + ["belongs_to_collection"])
+    return movies.reset_index(drop=True), reports
+
+
+def transform_credits(credits, movie_ids, seen_ids, workers=1, executor=None):
+    """
+    Clean a chunk of credits and extract the cast and crew.
+
+    Parameters:
+    - credits: A chunk of "credits.csv".
+    - movie_ids: The ids of the movies, credits of other ids are dropped.
+    - seen_ids: The ids of the previous chunks, to remove duplicates between chunks.
+                It's updated with the ids of this chunk.
+    - workers (optional): Number of processes to evaluate the cast and crew.
+    - executor (optional): Process pool shared by the chunks, by default one is started per column.
+
+    Returns:
+        credits: DataFrame with the cast and crew columns, a row per id.
+        reports: A list with the report of each nested column.
+    """
+    credits = validation.remove_duplicates(credits, "id")
+    credits = credits[credits["id"].isin(movie_ids) & ~credits["id"].isin(seen_ids)].copy()
+    seen_ids.update(credits["id"].tolist())
+
+    reports = []
+    for column_name, keys, new_columns in credits_nested:
+        credits[column_name] = credits[column_name].replace("[]", "")
+        credits = validation.replace_nan_with_empty_string(credits, column_name)
+        credits, report = validation.extract_values(credits, column_name, keys, new_columns,
+                                                    report=True, workers=workers, executor=executor)
+        reports.append(report)
+
+    return credits.drop(columns=[column_name for column_name, _, _ in credits_nested]), reports
+
+
+def empty_credits(movies):
+    """Credits of the movies without credits, with empty lists like the merge of the notebook."""
+    credits = pd.DataFrame({"id": movies["id"].values})
+    for _, _, new_columns in credits_nested:
+        for column in new_columns:
+            credits[column] = pd.Series([[] for _ in range(len(credits))], dtype="object")
+    return credits
+
+
+def append_csv(dataset, path, first):
+    """Write the header with the first chunk, append the rest."""
+    dataset.to_csv(path, mode="w" if first else "a", header=first, index=False)
+
+
+def with_labels(movies, column_name):
+    """Rows of the movies with a non-empty list in the column."""
+    return movies[movies[column_name].map(lambda value: isinstance(value, list) and len(value) > 0)]
+
+
+def write_chunk(movies, first, output_dirs):
+    """Write a chunk of merged movies to every output file."""
+    api_output, model_output, eda_output = output_dirs
+    for name, columns in api_files.items():
+        append_csv(movies[columns], os.path.join(api_output, f"{name}.csv"), first)
+    append_csv(movies[overview_columns], os.path.join(model_output, "overview.csv"), first)
+    for name, columns in label_files.items():
+        append_csv(with_labels(movies, columns[-1])[columns], os.path.join(model_output, f"{name}.csv"), first)
+    append_csv(movies[eda_columns], os.path.join(eda_output, "eda_movies_data.csv"), first)
+
+
+def run_pipeline(chunk_size=5000, movies_file=movies_path, credits_file=credits_path,
+                 api_output=api_dir, model_output=model_dir, eda_output=eda_dir, workers=1):
+    """
+    Run the whole pipeline and write the output files.
+
+    Parameters:
+    - chunk_size (optional): Number of credits read at the same time.
+    - movies_file, credits_file (optional): Paths of the raw data.
+    - api_output, model_output, eda_output (optional): Folders of the output files.
+    - workers (optional): Number of processes to evaluate the nested columns, a single pool is
+                          shared by every column and chunk.
+
+    Returns:
+        reports: A list with the report of each nested column (and chunk).
+    """
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return transform_all(chunk_size, movies_file, credits_file, api_output, model_output, eda_output,
+                                 workers, executor)
+    return transform_all(chunk_size, movies_file, credits_file, api_output, model_output, eda_output, workers)
+
+
+def transform_all(chunk_size, movies_file, credits_file, api_output, model_output, eda_output, workers=1,
+                  executor=None):
+    """Run the steps of run_pipeline, the nested columns are evaluated in the executor if given."""
+    output_dirs = (api_output, model_output, eda_output)
+    for folder in output_dirs:
+        os.makedirs(folder, exist_ok=True)
+
+    movies, reports = transform_movies(movies_file, workers, executor)
+    movies = movies.set_index("id", drop=False)
+    movie_ids = set(movies["id"].tolist())
+
+    seen_ids = set()
+    cast_edges = []
+    crew_edges = []
+    columnar = validation.open_columnar(os.path.join(api_output, "movies"), api_schema)
+    first = True
+
+    for chunk in pd.read_csv(credits_file, chunksize=chunk_size):
+        chunk = validation.convert_to_numeric(chunk, "id")
+        credits, chunk_reports = transform_credits(chunk, movie_ids, seen_ids, workers, executor)
+        reports.extend(chunk_reports)
+        if credits.empty:
+            continue
+
+        merged = movies.loc[credits["id"].values].reset_index(drop=True).merge(credits, on="id", how="left")
+        write_chunk(merged, first, output_dirs)
+        validation.append_columnar(columnar, merged)
+        first = False
+
+        cast_edges.append(validation.extract_edges(merged, "id", "actor_name", "actor_id"))
+        crew_edges.append(validation.extract_edges(merged, "id", "crew_name", "crew_id", "crew_job"))
+
+    # Movies without credits, as in the left merge
+    missing = movies[~movies["id"].isin(seen_ids)].reset_index(drop=True)
+    if not missing.empty or first:
+        merged = missing.merge(empty_credits(missing), on="id", how="left")
+        write_chunk(merged, first, output_dirs)
+        validation.append_columnar(columnar, merged)
+
+    # The edge tables go in the columnar folder before it's closed, so its manifest covers them
+    validation.save_edges(validation.concat_edges(cast_edges), columnar["folder"], "cast_edges")
+    validation.save_edges(validation.concat_edges(crew_edges), columnar["folder"], "crew_edges")
+    validation.close_columnar(columnar)
+
+    return reports
+
+
+def main():
+    """Run the pipeline from the command line."""
+    parser = argparse.ArgumentParser(description="Transform the raw movies data for the API, the model and the EDA.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Number of credits read at the same time.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to evaluate the nested columns.")
+    parser.add_argument("--movies", default=movies_path, help="Path of movies_dataset.csv.")
+    parser.add_argument("--credits", default=credits_path, help="Path of credits.csv.")
+    parser.add_argument("--api-output", default=api_dir, help="Folder of the api_data files.")
+    parser.add_argument("--model-output", default=model_dir, help="Folder of overview.csv, genre.csv and collections.csv.")
+    parser.add_argument("--eda-output", default=eda_dir, help="Folder of eda_movies_data.csv.")
+    args = parser.parse_args()
+
+    reports = run_pipeline(args.chunk_size, args.movies, args.credits,
+                           args.api_output, args.model_output, args.eda_output, args.workers)
+
+    errors = sum(report["error_count"] for report in reports)
+    print(f"Nested values that couldn't be evaluated: {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+This module provides the manifest and the atomic writes of the files of the ETL.
+
+The API verifies the folders written by the ETL (e.g. the binary columnar dataset)
+against their "manifest.json" file with `api/utils/artifacts.py`, so the manifest
+written here has the same format: the size and sha256 checksum of each file and a
+version computed from them. The ETL runs without the API package, so it keeps its
+own copy of these functions instead of importing them.
+
+The files are written to a temporary file and renamed (`atomic_write`), never
+overwritten in place, so an API that memory-mapped the previous version keeps
+reading it until it loads the new one.
+
+Available Functions:
+- atomic_write: Context manager that writes a file atomically.
+- file_checksum: Return the sha256 checksum of a file.
+- write_manifest: Write the manifest of a folder.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+
+manifest_file = "manifest.json"
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="wb", **kwargs):
+    """
+    Open a temporary file next to the path and rename it to the path when it's closed,
+    so readers see the previous file or the new one, never a partial file.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, mode, **kwargs) as file:
+            yield file
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def file_checksum(path, block=1 << 20):
+    """Return the sha256 checksum of a file, reading it in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for data in iter(lambda: file.read(block), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def write_manifest(folder, **info):
+    """
+    Write the manifest of every file of a folder.
+
+    Parameters:
+    - folder: The folder of the files.
+    - info (optional): Other values stored in the manifest.
+
+    Returns:
+        manifest: A dictionary with the "version", the "files" and the other values.
+    """
+    files = {}
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name == manifest_file or name.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        files[name] = {"size": os.path.getsize(path), "sha256": file_checksum(path)}
+
+    version = hashlib.sha1(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    manifest = {"version": version, "files": files, **info}
+    with atomic_write(os.path.join(folder, manifest_file), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
+    return manifest
@@ -10,14 +10,27 @@ Available Functions:
 - remove_blanks: Remove rows of a DataFrame with blank values from the specified column.
 - check_valid_expression: Check valid Python expressions in the values of a column.
 - directories_duplicates: Check for duplicate directories.
+- evaluate_column: Evaluate the Python expressions of a column in a single pass.
+- extract_column: Evaluate and extract a column, in parallel with several workers.
 - extract_values: Extract nested data from columns.
 - extract_dir_values: Extract values from a dictionary.
+- extract_edges: Build an edge table (movie id -> person id, job) from extracted columns.
+- concat_edges: Concatenate edge tables (e.g. one per chunk).
+- save_edges: Save an edge table as .npy files.
+- save_columnar: Save a DataFrame as a binary columnar dataset (a folder of .npy files).
+- open_columnar: Start a binary columnar dataset written in chunks.
+- append_columnar: Append a chunk of rows to a binary columnar dataset.
+- close_columnar: Write the files of a binary columnar dataset written in chunks.
 """
 
 import re
 import ast
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
+from utils.artifacts import atomic_write, write_manifest
 
 
 def convert_to_numeric(dataset, column_name, fillna=None):
@@ -190,6 +203,9 @@ def check_valid_expression(dataset, column_name):
 def directories_duplicates(directories, keys, delete_duplicates=False, summary=False):
     """
     Check for duplicate directories.
+
+    Two directories are duplicated if they have the same values in the keys, the first
+    one is kept. Each directory is checked with a hash of its values, O(n).
     
     Parameters:
     - directories: A list with directories.
@@ -202,35 +218,36 @@ def directories_duplicates(directories, keys, delete_duplicates=False, summary=F
         summary (optional): A summary of the performed analysis.
     """
         
-    unique_files = []
     idx_duplicates = []
-    #total_duplicates = 0
 
     if len(directories) > 1:
+        # Values of the keys of the unique directories, O(1) to check a directory
+        unique_keys = set()
+        # Values that can't be hashed (e.g. lists) are compared one by one
+        unhashable_keys = []
+
         for idx_directory, directory in enumerate(directories):
-            if idx_directory == 0:
-                # Add the 1st directory to start the comparison
-                unique_files.append(directory)
-            else:
-                # Compare the directory to every unique directory
-                is_duplicate = False
-                for unique in unique_files:
-                    # If all the values of the keys are the same, add idx_directory to idx_duplicates list
-                    # Else add directory to unique_files list
-                    try:
-                        is_duplicate = all(directory.get(key) == unique.get(key) for key in keys)
-                        if is_duplicate:
-                            idx_duplicates.append(idx_directory)
-                            break
-                    except AttributeError:
-                        pass
-                
+            # Directories that are not dictionaries are always kept
+            if not isinstance(directory, dict):
+                continue
+
+            directory_keys = tuple(directory.get(key) for key in keys)
+            try:
+                is_duplicate = directory_keys in unique_keys
                 if not is_duplicate:
-                    unique_files.append(directory)        
-        
-        if delete_duplicates:
-            # Delete directories using idx_duplicates list
-            directories = [directory for idx, directory in enumerate(directories) if idx not in idx_duplicates]
+                    unique_keys.add(directory_keys)
+            except TypeError:
+                is_duplicate = directory_keys in unhashable_keys
+                if not is_duplicate:
+                    unhashable_keys.append(directory_keys)
+
+            if is_duplicate:
+                idx_duplicates.append(idx_directory)
+
+        if delete_duplicates and idx_duplicates:
+            # Delete directories using idx_duplicates
+            duplicates = set(idx_duplicates)
+            directories = [directory for idx, directory in enumerate(directories) if idx not in duplicates]
     
     if summary:
         summary_txt = f"Total duplicates found: {len(idx_duplicates)}"
@@ -244,115 +261,544 @@ def directories_duplicates(directories, keys, delete_duplicates=False, summary=F
         return directories
 
 
-def extract_values(dataset, column_name, keys, new_columns):
+def evaluate_column(values):
+    """
+    Evaluate the Python expressions of a column in a single pass.
+
+    Blank and NaN values are evaluated as an empty list, they are not errors.
+
+    Parameters:
+    - values: The values of the column (e.g. a Series).
+
+    Returns:
+        evaluated: A list with the evaluated values, None for the values with errors.
+        errors: A list with the "index", "value" and "error" of each value that couldn't be evaluated.
+    """
+    evaluated = []
+    errors = []
+    index = values.index if hasattr(values, "index") else range(len(values))
+
+    for idx_value, value in zip(index, values):
+        if not isinstance(value, str):
+            evaluated.append([] if value is None or (np.isscalar(value) and pd.isna(value)) else value)
+        elif value == "":
+            evaluated.append([])
+        else:
+            try:
+                evaluated.append(ast.literal_eval(value))
+            except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError) as error:
+                evaluated.append(None)
+                errors.append({"index": idx_value, "value": value, "error": repr(error)})
+
+    return evaluated, errors
+
+
+def extraction_report(column_name, evaluated_count, errors):
+    """Summary of an extraction, with the values that couldn't be evaluated."""
+    return {
+        'column': column_name,
+        'evaluated_count': evaluated_count,
+        'error_count': len(errors),
+        'errors': errors,
+    }
+
+
+def extract_partition(values, index, keys, extract):
+    """
+    Evaluate and extract a partition of the rows of a column.
+
+    Returns:
+        extracted_values: The result of extract (extract_lists or extract_dicts).
+        evaluated_count: Number of values evaluated without errors.
+        errors: The errors of evaluate_column.
+    """
+    evaluated, errors = evaluate_column(pd.Series(values, index=index, dtype='object'))
+    return extract(evaluated, keys), len(evaluated) - len(errors), errors
+
+
+def extract_column(column, keys, extract, workers=1, executor=None):
+    """
+    Evaluate and extract a column, in parallel if workers > 1.
+
+    The rows are split in contiguous partitions, one task per partition, and the results
+    are joined in the order of the partitions, so the output doesn't depend on the workers.
+    The partitions run in the given executor (a process pool shared by several columns, e.g.
+    by every chunk of the pipeline), or in a pool of `workers` processes started for the call.
+
+    Returns:
+        extracted_values: A dictionary with a list per key, with the value of each row.
+        evaluated_count: Number of values evaluated without errors.
+        errors: The errors of evaluate_column, in the order of the rows.
+    """
+    values = column.tolist()
+    index = column.index.tolist()
+
+    if workers <= 1 or len(values) < 2:
+        return extract_partition(values, index, keys, extract)
+
+    # A few partitions per worker to balance the work
+    num_partitions = min(len(values), workers * 4)
+    bounds = np.linspace(0, len(values), num_partitions + 1).astype(int)
+    partitions = [(values[start:end], index[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    arguments = ([partition[0] for partition in partitions], [partition[1] for partition in partitions],
+                 [keys] * len(partitions), [extract] * len(partitions))
+    if executor is not None:
+        results = list(executor.map(extract_partition, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as call_executor:
+            results = list(call_executor.map(extract_partition, *arguments))
+
+    extracted_values = {key: [] for key in keys}
+    evaluated_count = 0
+    errors = []
+    for partition_values, partition_count, partition_errors in results:
+        for key in keys:
+            extracted_values[key].extend(partition_values[key])
+        evaluated_count += partition_count
+        errors.extend(partition_errors)
+
+    return extracted_values, evaluated_count, errors
+
+
+def extract_values(dataset, column_name, keys, new_columns, report=False, workers=1, executor=None):
     """
     Extract values from nested data.
+
+    The column is evaluated in a single pass and every new column is assigned at once.
+    The values that couldn't be evaluated get empty lists and are listed in the report.
     
     Parameters:
     - dataset: DataFrame containing the data.
     - column_name: Name of the column to extract the data.
     - keys: A list with the name of the keys.
     - new_columns: A list with the names of the new columns.
+    - report (optional): The option to return a report of the values with errors.
+    - workers (optional): Number of processes, the rows are split in partitions evaluated
+                          in parallel. The result is the same as with 1 worker.
+    - executor (optional): Process pool of the partitions, shared by several calls. By default,
+                           a pool of `workers` processes is started for the call.
 
     Returns:
         dataset: DataFrame containing the data.
+        report (optional): A dictionary with the number of values evaluated and the errors.
     """
     # Evaluating lenght of keys and new_columns lists
     if len(keys) != len(new_columns):
         raise ValueError("keys and new_columns length must be the same")
 
-    # Createing new columns in the dataset using new_columns
-    for column in new_columns:
-        dataset[column] = pd.Series([], dtype='object')
-
-    # Reading each value of the column
-    for indx_column_name, value in dataset[column_name].items():
-        # Evaluating the value of the column
-        # value_evaluated = []
-        try:
-            value_evaluated = ast.literal_eval(value)
-        except (ValueError, SyntaxError):
-            pass
-        # Checking for duplicate values
-        value_evaluated = directories_duplicates(value_evaluated, keys, True)
-
-        extracted_values = {key: [] for key in keys}
-
-        # Extracting items from dictionaries based on a key
-        for item in value_evaluated:
-            for key in keys:
-                if item.get(key) is not None:
-                    extracted_values[key].append(item.get(key))
-                else:
-                    extracted_values[key].append(None)
-
-        # Going through every new column to store extracted values
-        for indx_new_column, column in enumerate(new_columns):
-            
-            indx_extracted_values = keys[indx_new_column]
-            
-            if indx_extracted_values in extracted_values:
-                # without assigning the values to a variable returns an error
-                key_value = extracted_values[indx_extracted_values] 
-            
-            dataset.at[indx_column_name, column] = key_value
-    
+    extracted_values, evaluated_count, errors = extract_column(dataset[column_name], keys, extract_lists, workers,
+                                                               executor)
+
+    # Assigning every new column at once
+    for key, column in zip(keys, new_columns):
+        dataset[column] = pd.Series(extracted_values[key], index=dataset.index, dtype='object')
+
+    if report:
+        return dataset, extraction_report(column_name, evaluated_count, errors)
     return dataset
 
 
-def extract_dict_values(dataset, column_name, keys, new_columns):
+def extract_lists(evaluated, keys):
+    """
+    Extract the values of the keys from lists of dictionaries.
+
+    Parameters:
+    - evaluated: A list with a list of dictionaries per row.
+    - keys: A list with the name of the keys.
+
+    Returns:
+        extracted_values: A dictionary with a list per key, with the list of values of each row.
+    """
+    extracted_values = {key: [] for key in keys}
+
+    for value in evaluated:
+        if isinstance(value, (list, tuple)):
+            # Checking for duplicate values
+            value = directories_duplicates(list(value), keys, True)
+        else:
+            value = []
+
+        for key in keys:
+            extracted_values[key].append([item.get(key) if isinstance(item, dict) else None for item in value])
+
+    return extracted_values
+
+
+def extract_dict_values(dataset, column_name, keys, new_columns, report=False, workers=1, executor=None):
     """
     Extract values from a dictionary.
+
+    The column is evaluated in a single pass and every new column is assigned at once.
     
     Parameters:
     - dataset: DataFrame containing the data.
     - column_name: Name of the column to extract the data.
     - keys: A list with the name of the keys.
     - new_columns: A list with the names of the new columns.
+    - report (optional): The option to return a report of the values with errors.
+    - workers (optional): Number of processes, the rows are split in partitions evaluated
+                          in parallel. The result is the same as with 1 worker.
+    - executor (optional): Process pool of the partitions, shared by several calls. By default,
+                           a pool of `workers` processes is started for the call.
 
     Returns:
         dataset: DataFrame containing the data.
+        report (optional): A dictionary with the number of values evaluated and the errors.
     """
     if len(keys) != len(new_columns):
         raise ValueError("keys and new_columns length must be the same")
 
-    for column in new_columns:
-        dataset[column] = pd.Series([], dtype='object')
-
-    for indx_column_name, value in dataset[column_name].items():
-        value_evaluated = None
-
-        try:
-            value_evaluated = ast.literal_eval(value)
-        except (ValueError, SyntaxError): 
-            pass
-
-        extracted_values = {key: [] for key in keys}
-        keys_extracted = False
-
-        if isinstance(value_evaluated, dict):
-            for key in keys:
-                if value_evaluated.get(key) is not None:
-                    extracted_values[key].append(value_evaluated.get(key))
-                    keys_extracted = True
-                else:
-                    extracted_values[key].append(None)
-
-        if keys_extracted:
-            for indx_new_column, column in enumerate(new_columns):
-                indx_extracted_values = keys[indx_new_column]
-                
-                if indx_extracted_values in extracted_values:
-                    key_value = extracted_values[indx_extracted_values]
-                
-                dataset.at[indx_column_name, column] = key_value
-        else:
-            for column in new_columns:
-                dataset.at[indx_column_name, column] = None
-    
+    extracted_values, evaluated_count, errors = extract_column(dataset[column_name], keys, extract_dicts, workers,
+                                                               executor)
+
+    for key, column in zip(keys, new_columns):
+        dataset[column] = pd.Series(extracted_values[key], index=dataset.index, dtype='object')
+
+    if report:
+        return dataset, extraction_report(column_name, evaluated_count, errors)
     return dataset
 
 
+def extract_dicts(evaluated, keys):
+    """
+    Extract the values of the keys from dictionaries.
+
+    Parameters:
+    - evaluated: A list with a dictionary per row.
+    - keys: A list with the name of the keys.
+
+    Returns:
+        extracted_values: A dictionary with a list per key. Each row has a list with the value,
+                          or None if the row has none of the keys.
+    """
+    extracted_values = {key: [] for key in keys}
+
+    for value in evaluated:
+        row_values = None
+        if isinstance(value, dict):
+            row_values = [value.get(key) for key in keys]
+            if all(row_value is None for row_value in row_values):
+                row_values = None
+
+        for idx_key, key in enumerate(keys):
+            extracted_values[key].append([row_values[idx_key]] if row_values is not None else None)
+
+    return extracted_values
+
+
+def extract_edges(dataset, id_column, names_column, person_ids_column=None, jobs_column=None):
+    """
+    Build an edge table (movie id -> person id, job) from the columns created by extract_values.
+
+    Parameters:
+    - dataset: DataFrame containing the data.
+    - id_column: Name of the column with the id of the movie.
+    - names_column: Name of the column with the list of names (e.g. "actor_name").
+    - person_ids_column (optional): Name of the column with the list of person ids.
+                                    If None, an id is assigned to each name.
+    - jobs_column (optional): Name of the column with the list of jobs (e.g. "crew_job").
+
+    Returns:
+        edges: A dictionary of arrays. "movie_id", "person_id" and "job" have a value per edge,
+               "person_ids" and "person_names" are the persons table,
+               "jobs" are the names of the job codes.
+    """
+    movie_ids = []
+    person_ids = []
+    jobs = []
+    person_names = {}
+
+    names_values = dataset[names_column]
+    ids_values = dataset[person_ids_column] if person_ids_column is not None else names_values
+    jobs_values = dataset[jobs_column] if jobs_column is not None else names_values
+
+    for movie_id, names, ids, movie_jobs in zip(dataset[id_column], names_values, ids_values, jobs_values):
+        if not isinstance(names, list):
+            continue
+        if person_ids_column is None or not isinstance(ids, list):
+            ids = names
+        for idx_name, name in enumerate(names):
+            if name is None:
+                continue
+            person_id = ids[idx_name]
+            if person_ids_column is None:
+                person_id = person_names.setdefault(name, len(person_names))
+            else:
+                person_names.setdefault(person_id, name)
+            movie_ids.append(movie_id)
+            person_ids.append(person_id)
+            if jobs_column is not None:
+                jobs.append(movie_jobs[idx_name] if isinstance(movie_jobs, list) else None)
+
+    if person_ids_column is None:
+        # Names were used as keys, the table is id -> name
+        person_names = {person_id: name for name, person_id in person_names.items()}
+
+    persons = np.array(sorted(person_names), dtype=np.int64)
+    edges = {
+        "movie_id": np.array(movie_ids, dtype=np.int64),
+        "person_id": np.array(person_ids, dtype=np.int64),
+        "person_ids": persons,
+        "person_names": np.array([str(person_names[person_id]) for person_id in persons], dtype=str),
+    }
+
+    if jobs_column is not None:
+        job_names, job_codes = np.unique(np.array([str(job) for job in jobs], dtype=str), return_inverse=True)
+        edges["job"] = job_codes.astype(np.int32)
+        edges["jobs"] = job_names
+
+    return edges
+
+
+def concat_edges(edges_list):
+    """
+    Concatenate edge tables created by extract_edges (e.g. one per chunk of data).
+
+    Parameters:
+    - edges_list: A list with the dictionaries of arrays created by extract_edges.
+
+    Returns:
+        edges: A dictionary of arrays with every edge and a single persons table.
+    """
+    has_jobs = any("job" in edges for edges in edges_list)
+    person_names = {}
+    jobs = []
+
+    for edges in edges_list:
+        for person_id, name in zip(edges["person_ids"].tolist(), edges["person_names"].tolist()):
+            person_names.setdefault(person_id, name)
+        if has_jobs:
+            jobs.append(edges["jobs"][edges["job"]] if "job" in edges else np.full(len(edges["movie_id"]), "None"))
+
+    persons = np.array(sorted(person_names), dtype=np.int64)
+    concatenated = {
+        "movie_id": np.concatenate([edges["movie_id"] for edges in edges_list] or [np.array([], dtype=np.int64)]),
+        "person_id": np.concatenate([edges["person_id"] for edges in edges_list] or [np.array([], dtype=np.int64)]),
+        "person_ids": persons,
+        "person_names": np.array([person_names[person_id] for person_id in persons.tolist()], dtype=str),
+    }
+
+    if has_jobs:
+        job_names, job_codes = np.unique(np.concatenate(jobs).astype(str), return_inverse=True)
+        concatenated["job"] = job_codes.astype(np.int32)
+        concatenated["jobs"] = job_names
+
+    return concatenated
+
+
+def save_edges(edges, folder, name):
+    """
+    Save an edge table as .npy files of a folder, one array per column (<name>.<column>.npy),
+    so the API can memory-map them.
+
+    The edges are saved in the folder of the binary columnar dataset before it's closed
+    (save_columnar or close_columnar), so its manifest covers them too.
+
+    Parameters:
+    - edges: The dictionary of arrays created by extract_edges.
+    - folder: The folder of the files, it's created if it doesn't exist.
+    - name: The name of the table (e.g. "cast_edges").
+    """
+    os.makedirs(folder, exist_ok=True)
+    for column_name, array in edges.items():
+        # Written to a temporary file and renamed, so a running API never reads a partial file
+        with atomic_write(os.path.join(folder, f"{name}.{column_name}.npy")) as file:
+            np.save(file, array)
+
+
+def encode_strings(values):
+    """Encode strings as a utf-8 buffer and the offsets of each string (len(values) + 1)."""
+    encoded = [("" if value is None else str(value)).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def save_columnar(dataset, folder, schema):
+    """
+    Save a DataFrame as a binary columnar dataset: a folder with a .npy file per array,
+    that can be memory-mapped, and a "schema.json" file.
+
+    Column types and files:
+    - "int", "float": <column>.npy.
+    - "date": <column>.npy with datetime64[D] values.
+    - "category": <column>.npy with the codes and <column>.categories.npy with the values.
+    - "str": <column>.bytes.npy (utf-8) and <column>.offsets.npy.
+    - "list": lists of strings, <column>.offsets.npy (start of each row), <column>.values.npy
+              (code of each item) and the dictionary of the codes as a "str" column
+              (<column>.dictionary.bytes.npy and <column>.dictionary.offsets.npy).
+
+    A dataset larger than the memory is saved in chunks with open_columnar, append_columnar
+    and close_columnar, the result is the same.
+
+    Parameters:
+    - dataset: DataFrame containing the data. The "list" columns contain lists.
+    - folder: Folder of the dataset, it's created if it doesn't exist.
+    - schema: A dictionary with the name and type of the columns to save.
+    """
+    writer = open_columnar(folder, schema)
+    append_columnar(writer, dataset)
+    close_columnar(writer)
+
+
+def column_parts(column_name, column_type):
+    """The raw parts (name and dtype) appended for each chunk of a column of save_columnar."""
+    parts = {
+        "int": [(column_name, np.int64)],
+        "float": [(column_name, np.float64)],
+        "date": [(column_name, "datetime64[D]")],
+        "category": [(f"{column_name}.codes", np.int32)],
+        "str": [(f"{column_name}.bytes", np.uint8), (f"{column_name}.lengths", np.int64)],
+        "list": [(f"{column_name}.lengths", np.int64), (f"{column_name}.values", np.int32)],
+    }
+    if column_type not in parts:
+        raise ValueError(f"Unknown column type: {column_type}")
+    return [(name, np.dtype(dtype)) for name, dtype in parts[column_type]]
+
+
+def open_columnar(folder, schema):
+    """
+    Start a binary columnar dataset (see save_columnar) that is written in chunks.
+
+    Each chunk is appended to raw part files of the folder (append_columnar), and
+    close_columnar writes the .npy files from them in blocks, so only the dictionaries
+    of the "category" and "list" columns are kept in memory.
+
+    Parameters:
+    - folder: Folder of the dataset, it's created if it doesn't exist.
+    - schema: A dictionary with the name and type of the columns to save.
+
+    Returns:
+        writer: A dictionary with the "folder", the "schema", the number of "rows", the open
+                "parts" and the "dictionaries" of the codes (value -> code, in order of appearance).
+    """
+    os.makedirs(folder, exist_ok=True)
+    writer = {"folder": folder, "schema": dict(schema), "rows": 0, "parts": {}, "dictionaries": {}}
+    for column_name, column_type in schema.items():
+        for name, dtype in column_parts(column_name, column_type):
+            writer["parts"][name] = (open(os.path.join(folder, f"{name}.part"), "wb"), dtype)
+        if column_type in ("category", "list"):
+            writer["dictionaries"][column_name] = {}
+    return writer
+
+
+def dictionary_codes(dictionary, values):
+    """Code of each value, the new values are added to the dictionary."""
+    return np.array([dictionary.setdefault(value, len(dictionary)) for value in values], dtype=np.int32)
+
+
+def append_columnar(writer, dataset):
+    """
+    Append a chunk of rows to a binary columnar dataset started with open_columnar.
+
+    Parameters:
+    - writer: The dictionary returned by open_columnar.
+    - dataset: DataFrame with the columns of the schema.
+    """
+    def write(name, array):
+        file, dtype = writer["parts"][name]
+        file.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+    for column_name, column_type in writer["schema"].items():
+        column = dataset[column_name]
+        if column_type == "int":
+            write(column_name, column.fillna(0).to_numpy(dtype=np.int64))
+        elif column_type == "float":
+            write(column_name, pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64))
+        elif column_type == "date":
+            write(column_name, pd.to_datetime(column, errors="coerce").to_numpy().astype("datetime64[D]"))
+        elif column_type == "category":
+            write(f"{column_name}.codes", dictionary_codes(writer["dictionaries"][column_name],
+                                                           column.fillna("").astype(str).tolist()))
+        elif column_type == "str":
+            data, offsets = encode_strings(column.fillna("").tolist())
+            write(f"{column_name}.bytes", data)
+            write(f"{column_name}.lengths", np.diff(offsets))
+        elif column_type == "list":
+            lists = [value if isinstance(value, list) else [] for value in column]
+            write(f"{column_name}.lengths", np.array([len(value) for value in lists], dtype=np.int64))
+            write(f"{column_name}.values", dictionary_codes(writer["dictionaries"][column_name],
+                                                            ["" if item is None else str(item)
+                                                             for value in lists for item in value]))
+
+    writer["rows"] += len(dataset)
+
+
+def close_columnar(writer, block=1 << 20):
+    """
+    Write the .npy files, the "schema.json" and the manifest of a binary columnar dataset
+    started with open_columnar, and remove its part files.
+
+    The dictionaries are sorted, as with a single DataFrame, and the arrays are copied from
+    the part files in blocks of rows.
+    """
+    folder = writer["folder"]
+    for file, _ in writer["parts"].values():
+        file.close()
+
+    # The files are written to a temporary file and renamed, not overwritten in place,
+    # so a running API keeps the memory-mapped files of the previous version
+    def save(name, array):
+        with atomic_write(os.path.join(folder, f"{name}.npy")) as file:
+            np.save(file, array)
+
+    def save_part(part, name, remap=None, offsets=False):
+        part_path = os.path.join(folder, f"{part}.part")
+        dtype = writer["parts"][part][1]
+        count = os.path.getsize(part_path) // dtype.itemsize
+        raw = np.memmap(part_path, dtype=dtype, mode="r", shape=(count,)) if count else np.zeros(0, dtype=dtype)
+        header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                  "shape": (count + 1 if offsets else count,)}
+        with atomic_write(os.path.join(folder, f"{name}.npy")) as file:
+            np.lib.format.write_array_header_1_0(file, header)
+            # The offsets are the start of each row: 0 and the cumulative sum of the lengths
+            total = np.zeros(1, dtype=dtype)
+            if offsets:
+                file.write(total.tobytes())
+            for start in range(0, count, block):
+                values = raw[start:start + block]
+                if remap is not None:
+                    values = remap[values]
+                if offsets:
+                    values = np.cumsum(values, dtype=dtype) + total
+                    total = values[-1:]
+                file.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        del raw
+        os.remove(part_path)
+
+    def sorted_dictionary(column_name):
+        """The values of a dictionary sorted and the new code of each code."""
+        dictionary = writer["dictionaries"][column_name]
+        values = sorted(dictionary)
+        remap = np.zeros(len(dictionary), dtype=np.int32)
+        remap[[dictionary[value] for value in values]] = np.arange(len(values), dtype=np.int32)
+        return values, remap
+
+    for column_name, column_type in writer["schema"].items():
+        if column_type in ("int", "float", "date"):
+            save_part(column_name, column_name)
+        elif column_type == "category":
+            values, remap = sorted_dictionary(column_name)
+            save_part(f"{column_name}.codes", column_name, remap)
+            save(f"{column_name}.categories", np.array(values, dtype=str))
+        elif column_type == "str":
+            save_part(f"{column_name}.bytes", f"{column_name}.bytes")
+            save_part(f"{column_name}.lengths", f"{column_name}.offsets", offsets=True)
+        elif column_type == "list":
+            values, remap = sorted_dictionary(column_name)
+            save_part(f"{column_name}.lengths", f"{column_name}.offsets", offsets=True)
+            save_part(f"{column_name}.values", f"{column_name}.values", remap)
+            data, dictionary_offsets = encode_strings(values)
+            save(f"{column_name}.dictionary.bytes", data)
+            save(f"{column_name}.dictionary.offsets", dictionary_offsets)
+
+    with atomic_write(os.path.join(folder, "schema.json"), "w", encoding="utf-8") as file:
+        json.dump({"rows": writer["rows"], "columns": writer["schema"]}, file, indent=1)
+
+    write_manifest(folder)
+
+
 def replace_nan_with_empty_string(dataset, column_name):
     """
     Replace NaN values with empty strings in a specific column of a DataFrame.
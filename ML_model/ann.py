@@ -0,0 +1,166 @@
+"""
+This module provides the approximate nearest-neighbour index (IVF) of the recommender.
+
+The sparse features of the movies are projected to a few dense dimensions
+(TruncatedSVD) and L2-normalised, and the projected vectors are grouped in lists
+by spherical k-means: each movie belongs to the list of its closest centroid. A
+search only scores the movies of the `n_probe` lists closest to the query, so the
+cost is about N x n_probe / n_lists instead of N. The index is CPU-only NumPy (and
+scikit-learn for the projection), without external services.
+
+The knobs:
+- n_lists: Number of lists (build time), more lists make the lists smaller.
+- dims: Dimensions of the projection (build time), used to pick the lists.
+- n_probe: Number of lists scored by a search (query time), more lists give a
+           higher recall and a higher latency.
+
+Available Functions:
+- project: Project the rows of a sparse matrix to the dimensions of the index.
+- kmeans: Compute the centroids of the lists (spherical k-means).
+- assign_lists: Return the list of the closest centroid of every vector.
+- fit_ann: Fit the projection and the lists of a matrix.
+- list_layout: Group the rows by list.
+- probe_lists: Return the rows of the lists closest to a vector.
+- recall_at_k: Fraction of the exact top-k found by the approximate top-k.
+"""
+
+import numpy as np
+
+# Rows used to fit the projection and the centroids, per list
+train_rows_per_list = 64
+block_size = 4096
+
+
+def project(matrix, components):
+    """
+    Project the rows of a sparse matrix to the dimensions of the index.
+
+    Parameters:
+    - matrix: Sparse matrix (e.g. the features of some movies, already weighted).
+    - components: Array dims x columns of the projection.
+
+    Returns:
+        vectors: Array rows x dims, L2-normalised.
+    """
+    vectors = np.asarray(matrix @ components.T, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def assign_lists(vectors, centroids, block=block_size):
+    """Return the list of the closest centroid (highest inner product) of every vector, in blocks of rows."""
+    lists = np.zeros(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block):
+        lists[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return lists
+
+
+def kmeans(vectors, n_lists, iterations=10, seed=0):
+    """
+    Compute the centroids of the lists with spherical k-means.
+
+    Parameters:
+    - vectors: L2-normalised array rows x dims.
+    - n_lists: Number of centroids.
+    - iterations (optional): Number of iterations.
+    - seed (optional): Seed of the initial centroids.
+
+    Returns:
+        centroids: L2-normalised array n_lists x dims.
+    """
+    from scipy import sparse
+
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        lists = assign_lists(vectors, centroids)
+        membership = sparse.csr_matrix((np.ones(len(lists), dtype=np.float32), (lists, np.arange(len(lists)))),
+                                       shape=(n_lists, len(vectors)))
+        sums = np.asarray(membership @ vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        # An empty list keeps its centroid
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+    return centroids
+
+
+def fit_ann(matrix, n_lists, dims=128, seed=0):
+    """
+    Fit the projection and the lists of a matrix.
+
+    Parameters:
+    - matrix: Sparse matrix with a row per movie (already weighted).
+    - n_lists: Number of lists.
+    - dims (optional): Dimensions of the projection.
+    - seed (optional): Seed of the sample of rows and of the initial centroids.
+
+    Returns:
+        ann: A dictionary with the "components" of the projection, the "centroids" and the
+             list of every row ("lists").
+    """
+    from sklearn.decomposition import TruncatedSVD
+
+    num_rows, num_columns = matrix.shape
+    n_lists = max(min(n_lists, num_rows), 1)
+    dims = max(min(dims, num_columns - 1), 1)
+
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(num_rows, min(num_rows, n_lists * train_rows_per_list), replace=False))
+    svd = TruncatedSVD(dims, random_state=seed).fit(matrix[sample])
+    components = svd.components_.astype(np.float32)
+
+    centroids = kmeans(project(matrix[sample], components), n_lists, seed=seed)
+    lists = np.concatenate([assign_lists(project(matrix[start:start + block_size], components), centroids)
+                            for start in range(0, num_rows, block_size)])
+    return {"components": components, "centroids": centroids, "lists": lists.astype(np.int32)}
+
+
+def list_layout(lists, n_lists):
+    """
+    Group the rows by list.
+
+    Returns:
+        order: The rows sorted by list.
+        offsets: Array n_lists + 1, the rows of list l are order[offsets[l]:offsets[l + 1]].
+    """
+    order = np.argsort(lists, kind="stable").astype(np.int32)
+    offsets = np.searchsorted(lists[order], np.arange(n_lists + 1)).astype(np.int64)
+    return order, offsets
+
+
+def probe_lists(centroids, vector, order, offsets, n_probe, minimum=0, mask=None):
+    """
+    Return the rows of the n_probe lists whose centroid is closest to a vector.
+
+    Parameters:
+    - centroids: The centroids of the lists.
+    - vector: The projected vector of the query.
+    - order, offsets: The rows grouped by list (see list_layout).
+    - n_probe: Number of lists.
+    - minimum (optional): Minimum number of rows, the next closest lists are added until there are enough.
+    - mask (optional): Boolean array with the rows counted for the minimum (e.g. the rows that match a filter).
+
+    Returns:
+        rows: The rows of the lists, the closest list first.
+    """
+    lists = np.argsort(-(centroids @ vector), kind="stable")
+    if mask is None:
+        sizes = np.diff(offsets)
+    else:
+        counted = np.concatenate([[0], np.cumsum(mask[order])])
+        sizes = counted[offsets[1:]] - counted[offsets[:-1]]
+    sizes = np.cumsum(sizes[lists])
+    count = max(min(n_probe, len(lists)), int(np.searchsorted(sizes, minimum)) + 1)
+    return np.concatenate([order[offsets[idx]:offsets[idx + 1]] for idx in lists[:count]])
+
+
+def recall_at_k(exact, approximate):
+    """
+    Fraction of the exact top-k found by the approximate top-k.
+
+    Parameters:
+    - exact, approximate: Arrays queries x k with the rows found by each search.
+    """
+    found = [len(np.intersect1d(row_exact, row_approximate)) for row_exact, row_approximate in zip(exact, approximate)]
+    return float(np.sum(found) / max(np.size(exact), 1))
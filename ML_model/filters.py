@@ -0,0 +1,106 @@
+"""
+This module provides the filters of the recommendations (release year, genre and number of votes).
+
+The attributes of every movie (release year and number of votes) are stored when
+the model is built, and the filters are precomputed as bitsets (NumPy packed bits,
+a bit per movie):
+- year_masks: a bitset per release year Y of the catalogue with the movies released
+  in Y or later, so a range of years is two bitsets (ge[from] and not ge[to + 1]).
+- vote_masks: a bitset per vote tier with the movies with at least that many votes.
+- genre_masks: a bitset per genre with the movies of the genre.
+
+A filter is the AND of a few bitsets, computed once per request and applied to the
+scores of the candidates, so a filtered recommendation costs about the same as an
+unfiltered one and always returns the requested amount when enough movies match.
+
+Available Functions:
+- build_filters: Precompute the bitsets of the filters.
+- filter_mask: Return the movies that match some filters.
+"""
+
+import numpy as np
+
+# Tiers of the number of votes with a precomputed bitset (2000 is the minimum of movie_vote)
+vote_tiers = (10, 100, 500, 1000, 2000, 5000, 10000)
+
+
+def build_filters(years, votes, genre_block=None):
+    """
+    Precompute the bitsets of the filters.
+
+    Parameters:
+    - years: The release year of every movie, 0 if unknown.
+    - votes: The number of votes of every movie.
+    - genre_block (optional): CSC matrix with a row per movie and a column per genre.
+
+    Returns:
+        filters: A dictionary with the attributes of the movies ("years" and "votes"), the
+                 "year_values" of the catalogue, the "vote_tiers" and the "year_masks",
+                 "vote_masks" and "genre_masks" bitsets.
+    """
+    years = np.asarray(years, dtype=np.int16)
+    votes = np.asarray(votes, dtype=np.float32)
+    year_values = np.unique(years[years > 0])
+
+    # Movies released in each year or later, and a last empty bitset for the years after the catalogue
+    year_masks = np.zeros((len(year_values) + 1, (len(years) + 7) // 8), dtype=np.uint8)
+    for idx, year in enumerate(year_values):
+        year_masks[idx] = np.packbits(years >= year)
+
+    tiers = np.array(vote_tiers, dtype=np.float32)
+    vote_masks = np.stack([np.packbits(votes >= tier) for tier in tiers])
+
+    num_genres = genre_block.shape[1] if genre_block is not None else 0
+    genre_masks = np.zeros((num_genres, (len(years) + 7) // 8), dtype=np.uint8)
+    for column in range(num_genres):
+        mask = np.zeros(len(years), dtype=bool)
+        mask[genre_block.indices[genre_block.indptr[column]:genre_block.indptr[column + 1]]] = True
+        genre_masks[column] = np.packbits(mask)
+
+    return {"years": years, "votes": votes, "year_values": year_values, "year_masks": year_masks,
+            "vote_tiers": tiers, "vote_masks": vote_masks, "genre_masks": genre_masks}
+
+
+def filter_mask(filters, year_from=None, year_to=None, min_votes=None, genre=None):
+    """
+    Return the movies that match some filters.
+
+    Parameters:
+    - filters: The bitsets (see build_filters).
+    - year_from, year_to (optional): Range of release years, both included.
+    - min_votes (optional): Minimum number of votes. The tiers use their bitset, other
+                            values compare the votes of every movie.
+    - genre (optional): The column of the genre in the genre bitsets.
+
+    Returns:
+        mask: Boolean array with True for the movies that match every filter, None without filters.
+    """
+    num_rows = len(filters["years"])
+    packed = None
+
+    def intersect(bits):
+        nonlocal packed
+        packed = bits if packed is None else packed & bits
+
+    year_values = filters["year_values"]
+    if year_from is not None or year_to is not None:
+        # The first bitset (the oldest year or later) leaves out the movies without a year
+        start = np.searchsorted(year_values, year_from) if year_from is not None else 0
+        intersect(filters["year_masks"][start])
+        if year_to is not None:
+            end = np.searchsorted(year_values, year_to, side="right")
+            intersect(~filters["year_masks"][end])
+
+    if min_votes is not None:
+        tier = np.flatnonzero(filters["vote_tiers"] == min_votes)
+        if tier.size:
+            intersect(filters["vote_masks"][tier[0]])
+        else:
+            intersect(np.packbits(np.asarray(filters["votes"]) >= min_votes))
+
+    if genre is not None:
+        intersect(filters["genre_masks"][genre])
+
+    if packed is None:
+        return None
+    return np.unpackbits(packed, count=num_rows).astype(bool)
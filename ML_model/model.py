@@ -1,63 +1,1001 @@
-import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+"""
+This module provides the movie recommendation system.
 
+The model is built offline with `build_model` (or running `python -m ML_model.model`),
+which stores the artifacts in the "artifacts" folder. New movies are added to it
+with `add_movies` (`python -m ML_model.model --add new_movies.csv`), which only
+vectorizes the new overviews and updates the affected neighbours. The API loads
+them once with `load_model`. The top-k neighbours of every movie are precomputed,
+so a query is a lookup; larger requests fall back to a single row-vs-matrix product.
 
-def movie_recommendation(title: str) -> dict:
-    """Check for the movie realese and popularity."""
+The features of a movie are blocks of columns of a single sparse matrix: the words
+of the overview, the genres ("genre.csv") and the collection ("collections.csv"),
+each block L2-normalised. The similarity is the weighted sum of the cosine
+similarity of each block; the weights of the precomputed neighbours are saved in
+the manifest, and a request with other weights scales the row of the movie, so it's
+still a single product.
 
-    info = {"movie_recommendations": []}
+For catalogues too large to compare every movie with every other one, the model
+can have an approximate index (IVF, see ann.py): the neighbours are computed only
+against the closest lists of each movie, and with RECOMMEND_MODE=ann the scans only
+score those lists. `ann_recall` measures the recall@k of the index against the
+exact search, for each number of probed lists, so the tradeoff can be chosen.
+
+The recommendations can be filtered by release year, genre and minimum number of
+votes (see filters.py). The bitsets of the filters are precomputed with the model,
+and a filter is applied to the candidates while they are scored (the precomputed
+neighbours, the lists of the approximate index or the whole catalogue), so a
+filtered request returns the requested amount whenever enough movies match.
+
+The arrays (the CSR matrix split in data, indices and indptr, the neighbours and
+their scores) are flat .npy files, memory-mapped read-only, so every worker shares
+the same pages. The "manifest.json" file of the artifacts has their checksums and
+the version of the model, it's verified before serving with `verify_model`. When
+the version changes, `reload_model` swaps the new model in without a restart.
+
+pandas, scipy and scikit-learn are imported when they are used, so importing this
+module (e.g. by the API) is fast.
+
+Settings (environment variables):
+- MODEL_ARTIFACTS_DIR: Folder of the model artifacts (default "ML_model/artifacts").
+- RECOMMEND_MODE: "ann" scores the candidates of the approximate index instead of the whole
+                  catalogue, when the model has one (default "exact").
+- ANN_PROBES: Number of lists of the approximate index scored by a search (default 8).
+
+Available Functions:
+- read_labels: Read the lists of labels (genres, collections) of the movies.
+- movie_attributes: Return the release year and the number of votes of the movies.
+- multi_hot: Encode lists of labels as a multi-hot sparse matrix.
+- column_weights: Return the weight of every column from the weight of each block.
+- build_neighbours: Compute the top-k most similar movies of every movie.
+- build_model: Fit the vectorizer and save the model artifacts.
+- update_neighbours: Update the top-k neighbours after new movies were added.
+- build_neighbours_ann: Compute the approximate neighbours with the lists of the approximate index.
+- add_movies: Add new movies to the saved model without fitting it again.
+- read_model: Read the model artifacts.
+- load_model: Return the live model, loading it the first time.
+- reload_model: Load a new version of the model artifacts and swap it in.
+- verify_model: Verify the model artifacts against their manifest.
+- model_version: Version of the loaded model artifacts.
+- exact_search: Score the whole catalogue.
+- ann_search: Score the closest lists of the approximate index.
+- ann_recall: Measure the recall@k of the approximate index against the exact search.
+- request_weights: Return the weight of each block of a request.
+- request_filters: Return the filters of a request.
+- needs_scan: Check if a recommendation needs to score the whole catalogue.
+- movie_recommendation: Recommend similar movies.
+- scored_recommendation: Recommend similar movies and return the version of the model used.
+"""
+
+import ast
+import os
+import json
+import numpy as np
+from api.utils.artifacts import atomic_write, read_manifest, verify_manifest, write_manifest
+from api.utils.cache import cached
+from api.utils.metrics import measured, stage
+from api.utils.reloader import record_version
+from api.utils.text import normalize_string
+from ML_model.ann import fit_ann, project, assign_lists, list_layout, probe_lists, recall_at_k
+from ML_model.filters import build_filters, filter_mask
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+overview_path = os.path.join(script_dir, "data", "overview.csv")
+artifacts_dir = os.environ.get("MODEL_ARTIFACTS_DIR", os.path.join(script_dir, "artifacts"))
+
+# The CSR matrix is saved as matrix.data.npy, matrix.indices.npy and matrix.indptr.npy
+matrix_file = "matrix"
+vocabulary_file = "vocabulary.json"
+titles_file = "titles.json"
+neighbours_file = "neighbours.npy"
+scores_file = "scores.npy"
+ids_file = "ids.npy"
+labels_file = "labels.json"
+
+# Blocks of labels of the features: name -> (file of the folder of the overviews, column)
+label_blocks = {
+    "genres": ("genre.csv", "movie_genres"),
+    "collection": ("collections.csv", "collection_name"),
+}
+
+# Weight of each block of features in the similarity, the requests can change them
+default_weights = {"overview": 1.0, "genres": 0.5, "collection": 1.0}
+
+top_k = 20
+block_size = 512
+
+# Approximate search (see ann.py): the index is built with build_model(ann_lists=...), and the
+# scans of the whole catalogue use it when RECOMMEND_MODE is "ann"
+recommend_mode = os.environ.get("RECOMMEND_MODE", "exact")
+ann_probes = int(os.environ.get("ANN_PROBES", 8))
+ann_files = {"components": "ann_components.npy", "centroids": "ann_centroids.npy", "lists": "ann_lists.npy"}
+
+# Filters of the recommendations (see filters.py): attributes of the movies -> column of the overviews
+attribute_columns = {"year": "release_year", "votes": "vote_count"}
+# Filters of a request -> attribute of the movies they need
+filter_attributes = {"year_from": "year", "year_to": "year", "min_votes": "votes", "genre": "genres"}
+filter_files = {
+    "years": "attr_years.npy",
+    "votes": "attr_votes.npy",
+    "year_values": "filter_year_values.npy",
+    "year_masks": "filter_years.npy",
+    "vote_tiers": "filter_vote_tiers.npy",
+    "vote_masks": "filter_votes.npy",
+    "genre_masks": "filter_genres.npy",
+}
+
+_model = {}
+
+
+def read_labels(path, column_name, ids):
+    """
+    Read the lists of labels (e.g. the genres) of the movies from a csv file with the "id" column.
+
+    Returns:
+        labels: A list with the labels of each id (empty if the movie isn't in the file),
+                None if the file doesn't exist.
+    """
+    import pandas as pd
+
+    if not os.path.exists(path):
+        return None
+    data = pd.read_csv(path).drop_duplicates("id").set_index("id")[column_name].dropna()
+    labels = {movie_id: ast.literal_eval(value) for movie_id, value in data.items()}
+    return [labels.get(movie_id, []) for movie_id in ids]
+
+
+def movie_attributes(movies):
+    """
+    Return the release year and the number of votes of the movies, 0 if unknown.
+
+    Parameters:
+    - movies: DataFrame with the "release_year" and "vote_count" columns (both optional).
+
+    Returns:
+        years, votes: Arrays with the value of each movie.
+        attributes: The attributes found in the columns ("year", "votes").
+    """
+    import pandas as pd
+
+    values, attributes = {}, []
+    for name, column_name in attribute_columns.items():
+        if column_name in movies.columns:
+            attributes.append(name)
+            values[name] = pd.to_numeric(movies[column_name], errors='coerce').fillna(0).to_numpy()
+        else:
+            values[name] = np.zeros(len(movies))
+    return values["year"], values["votes"], attributes
+
+
+def movie_filters(matrix, blocks, years, votes, attributes):
+    """
+    Precompute the bitsets of the filters (see filters.build_filters), the genres are the columns of the genre block.
+
+    Returns:
+        filters: The arrays of the filters.
+        info: The "filters" value of the manifest, with the attributes that can be filtered.
+    """
+    genre_block = None
+    if "genres" in blocks:
+        start, end = blocks["genres"]
+        genre_block = matrix[:, start:end].tocsc()
+        attributes = attributes + ["genres"]
+    return build_filters(years, votes, genre_block), {"attributes": attributes}
+
+
+def multi_hot(labels, dictionary=None):
+    """
+    Encode the lists of labels as a L2-normalised multi-hot sparse matrix.
+
+    Parameters:
+    - labels: A list with the labels of each movie.
+    - dictionary (optional): The labels of the columns, the labels that aren't in it are ignored.
+                             By default, every label found (sorted).
+
+    Returns:
+        matrix: Sparse matrix with a row per movie and a column per label.
+        dictionary: The labels of the columns.
+    """
+    from scipy import sparse
+    from sklearn.preprocessing import normalize
+
+    if dictionary is None:
+        dictionary = sorted({label for movie in labels for label in movie})
+    columns = {label: idx for idx, label in enumerate(dictionary)}
+
+    rows, cols = [], []
+    for row, movie in enumerate(labels):
+        for col in {columns[label] for label in movie if label in columns}:
+            rows.append(row)
+            cols.append(col)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                               shape=(len(labels), len(dictionary)))
+    return normalize(matrix, norm='l2', copy=False), dictionary
+
+
+def column_weights(blocks, weights):
+    """
+    Return the weight of every column of the matrix, normalised so the weights of the blocks add up to 1.
+
+    Parameters:
+    - blocks: The (start, end) columns of each block of features.
+    - weights: The weight of each block, the blocks without a weight get 0.
+
+    Raises:
+        ValueError: If a weight is negative or every weight is 0.
+    """
+    if any(weight < 0 for weight in weights.values()):
+        raise ValueError("The weights can't be negative")
+    total = sum(weights.get(name, 0) for name in blocks)
+    if total <= 0:
+        raise ValueError(f"At least one weight of {', '.join(blocks)} must be positive")
+
+    result = np.zeros(max((end for _, end in blocks.values()), default=0), dtype=np.float32)
+    for name, (start, end) in blocks.items():
+        result[start:end] = weights.get(name, 0) / total
+    return result
+
+
+def scale_columns(matrix, weights):
+    """Return a copy of a CSR matrix with each column multiplied by its weight (None returns the matrix)."""
+    if weights is None:
+        return matrix
+    scaled = matrix.copy()
+    scaled.data = scaled.data * weights[scaled.indices]
+    return scaled
+
+
+def build_neighbours(matrix, k=top_k, block=block_size, weights=None):
+    """
+    Compute the top-k most similar movies of every movie.
+
+    The similarity is computed in blocks of rows, so the peak memory is
+    block x N instead of N x N.
+
+    Parameters:
+    - matrix: Sparse matrix with a row per movie, each block of features L2-normalised.
+    - k (optional): The number of neighbours to keep for each movie.
+    - block (optional): The number of rows compared at the same time.
+    - weights (optional): The weight of each column (see column_weights), 1 by default.
+
+    Returns:
+        neighbours: Array N x k with the index of the neighbours, most similar first.
+        scores: Array N x k with the weighted similarity of each neighbour.
+    """
+    num_rows = matrix.shape[0]
+    k = max(min(k, num_rows - 1), 0)
+
+    neighbours = np.zeros((num_rows, k), dtype=np.int32)
+    scores = np.zeros((num_rows, k), dtype=np.float32)
+    if k == 0:
+        return neighbours, scores
+
+    matrix_t = matrix.T.tocsc()
+    weighted = scale_columns(matrix, weights)
+    for start in range(0, num_rows, block):
+        end = min(start + block, num_rows)
+        similarity = (weighted[start:end] @ matrix_t).toarray()
+
+        # The movie itself is not a neighbour
+        rows = np.arange(end - start)
+        similarity[rows, rows + start] = -np.inf
+
+        neighbours[start:end], scores[start:end] = top_k_columns(similarity, k)
+
+    return neighbours, scores
+
+
+def top_k_columns(similarity, k, columns=None):
+    """
+    Return the k columns with the highest similarity of each row, most similar first.
+
+    Parameters:
+    - similarity: Dense array with a row per movie.
+    - k: The number of columns to keep.
+    - columns (optional): The index of each column of each row, by default its position.
+    """
+    best = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(similarity, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best = np.take_along_axis(best, order, axis=1)
+    if columns is not None:
+        best = np.take_along_axis(columns, best, axis=1)
+    return best, np.take_along_axis(best_scores, order, axis=1)
+
+
+def update_neighbours(matrix, neighbours, scores, start, block=block_size, weights=None):
+    """
+    Update the top-k neighbours after new rows were appended to the matrix.
+
+    Only the new rows are compared with the catalogue, so the cost is
+    new rows x N instead of N x N: the new rows get their neighbours, and the
+    neighbours of an existing row only change if a new row is more similar than
+    its last neighbour.
+
+    Parameters:
+    - matrix: Sparse matrix with a row per movie, the new rows at the end.
+    - neighbours, scores: The top-k neighbours of the rows before `start`.
+    - start: The first new row.
+    - block (optional): The number of new rows compared at the same time.
+    - weights (optional): The weight of each column, the same used to build the neighbours.
+
+    Returns:
+        neighbours: Array N x k with the index of the neighbours, most similar first.
+        scores: Array N x k with the weighted similarity of each neighbour.
+    """
+    num_rows = matrix.shape[0]
+    k = neighbours.shape[1]
+    neighbours = np.vstack([neighbours, np.zeros((num_rows - start, k), dtype=np.int32)])
+    scores = np.vstack([scores, np.zeros((num_rows - start, k), dtype=np.float32)])
+
+    matrix_t = matrix.T.tocsc()
+    for block_start in range(start, num_rows, block):
+        block_end = min(block_start + block, num_rows)
+        similarity = (scale_columns(matrix[block_start:block_end], weights) @ matrix_t).toarray()
+
+        rows = np.arange(block_end - block_start)
+        similarity[rows, rows + block_start] = -np.inf
+        neighbours[block_start:block_end], scores[block_start:block_end] = top_k_columns(similarity, k)
+
+        # Existing rows where a new row is more similar than the last neighbour
+        candidates = similarity[:, :start].T
+        affected = np.flatnonzero(candidates.max(axis=1) > scores[:start, k - 1])
+        if affected.size == 0:
+            continue
+        merged_columns = np.hstack([neighbours[affected],
+                                    np.broadcast_to(np.arange(block_start, block_end, dtype=np.int32),
+                                                    (affected.size, block_end - block_start))])
+        merged_scores = np.hstack([scores[affected], candidates[affected]])
+        neighbours[affected], scores[affected] = top_k_columns(merged_scores, k, merged_columns)
+
+    return neighbours, scores
+
+
+def build_neighbours_ann(matrix, ann, n_probe=ann_probes, k=top_k, block=block_size, weights=None):
+    """
+    Compute the approximate top-k most similar movies of every movie with the lists of the index.
+
+    The movies of each list are only compared with the movies of the n_probe lists
+    closest to its centroid, so the cost is about N x N x n_probe / n_lists.
+
+    Parameters:
+    - matrix: Sparse matrix with a row per movie.
+    - ann: The approximate index (see ann.fit_ann).
+    - n_probe (optional): Number of lists compared with each list.
+    - k, block, weights (optional): As in build_neighbours.
+
+    Returns:
+        neighbours, scores: As in build_neighbours.
+    """
+    num_rows = matrix.shape[0]
+    k = max(min(k, num_rows - 1), 0)
+
+    neighbours = np.zeros((num_rows, k), dtype=np.int32)
+    scores = np.zeros((num_rows, k), dtype=np.float32)
+    if k == 0:
+        return neighbours, scores
+
+    centroids = ann["centroids"]
+    order, offsets = list_layout(ann["lists"], len(centroids))
+    weighted = scale_columns(matrix, weights)
+    for list_idx in range(len(centroids)):
+        members = order[offsets[list_idx]:offsets[list_idx + 1]]
+        if len(members) == 0:
+            continue
+        candidates = probe_lists(centroids, centroids[list_idx], order, offsets, n_probe, k + 1)
+        candidates_t = matrix[candidates].T.tocsc()
+
+        for start in range(0, len(members), block):
+            rows = members[start:start + block]
+            similarity = (weighted[rows] @ candidates_t).toarray()
+            # The movie itself is not a neighbour
+            similarity[rows[:, None] == candidates[None, :]] = -np.inf
+            columns = np.broadcast_to(candidates, similarity.shape)
+            neighbours[rows], scores[rows] = top_k_columns(similarity, k, columns)
+
+    return neighbours, scores
+
+
+def stack_blocks(blocks):
+    """
+    Stack the blocks of features side by side in a single CSR matrix.
+
+    Parameters:
+    - blocks: A list of (name, matrix) pairs with the same rows.
+
+    Returns:
+        matrix: The blocks side by side.
+        ranges: The (start, end) columns of each block.
+    """
+    from scipy import sparse
+
+    ranges = {}
+    start = 0
+    for name, block in blocks:
+        ranges[name] = [start, start + block.shape[1]]
+        start += block.shape[1]
+    matrix = sparse.hstack([block for _, block in blocks], format='csr', dtype=np.float32)
+    return matrix, ranges
+
+
+def build_model(path=overview_path, output_dir=artifacts_dir, weights=default_weights, ann_lists=0, ann_dims=128,
+                n_probe=ann_probes):
+    """
+    Fit the vectorizer over the whole catalogue and save the model artifacts.
+
+    The features of a movie are the words of its overview, its genres and its
+    collection, each block L2-normalised and stacked side by side in one sparse
+    matrix. The genres and collections are read from the "genre.csv" and
+    "collections.csv" files of the folder of the overviews, a block is skipped
+    if its file doesn't exist.
+
+    Parameters:
+    - path: Path of the csv file with the "id", "title" and "overview" columns, and optionally the
+            "release_year" and "vote_count" columns of the filters.
+    - output_dir: Folder where the artifacts are saved.
+    - weights (optional): The weight of each block in the similarity of the precomputed neighbours.
+    - ann_lists (optional): Number of lists of the approximate index, 0 doesn't build it and computes
+                            the exact neighbours.
+    - ann_dims (optional): Dimensions of the projection of the approximate index.
+    - n_probe (optional): Number of lists compared with each list to compute the approximate neighbours.
+
+    Returns:
+        output_dir: Folder containing the artifacts.
+    """
+    import pandas as pd
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.preprocessing import normalize
+
+    movies = pd.read_csv(path)
+    ids = movies['id'].to_numpy(dtype=np.int64) if 'id' in movies.columns else None
+
+    with stage("model.vectorize"):
+        cv = CountVectorizer(max_features=5000, stop_words='english')
+        vector = cv.fit_transform(movies['overview'].values.astype('U'))
+
+        # L2-normalised rows, so the cosine similarity is a plain dot product
+        blocks = [("overview", normalize(vector.astype(np.float32), norm='l2', copy=False))]
+
+        labels = {}
+        for name, (file_name, column_name) in label_blocks.items():
+            movie_labels = read_labels(os.path.join(os.path.dirname(path), file_name), column_name, ids) \
+                if ids is not None else None
+            if movie_labels is not None:
+                block, labels[name] = multi_hot(movie_labels)
+                blocks.append((name, block))
+
+        matrix, ranges = stack_blocks(blocks)
+
+    vocabulary = {term: int(idx) for term, idx in cv.vocabulary_.items()}
+    weights = {name: float(weights.get(name, 0)) for name in ranges}
+
+    columns = column_weights(ranges, weights)
+    with stage("model.filters"):
+        filters, info = movie_filters(matrix, ranges, *movie_attributes(movies))
+    info = {"filters": info}
+
+    ann = None
+    if ann_lists:
+        # The inner product of the weighted rows is the weighted similarity
+        with stage("model.ann"):
+            ann = fit_ann(scale_columns(matrix, np.sqrt(columns)), ann_lists, ann_dims)
+        info["ann"] = {"lists": len(ann["centroids"]), "dims": len(ann["components"]), "probes": n_probe}
 
-    movies = pd.read_csv(r"ML_model\data\overview.csv")
-    # Get the number of rows in the DataFrame
-    num_rows = len(movies)
+    with stage("model.neighbours"):
+        if ann is None:
+            neighbours, scores = build_neighbours(matrix, weights=columns)
+        else:
+            neighbours, scores = build_neighbours_ann(matrix, ann, n_probe, weights=columns)
 
-    # Set the desired number of rows (half of the original)
-    desired_num_rows = num_rows // 4
+    save_artifacts(output_dir, matrix, movies['title'].fillna('').astype(str).tolist(), ids,
+                   neighbours, scores, vocabulary, labels, ann, filters, generation=0, blocks=ranges, weights=weights,
+                   **info)
 
-    # Randomly select a subset of rows
-    movies = movies.sample(n=desired_num_rows, random_state=2)
+    return output_dir
 
-    cv=CountVectorizer(max_features=5000, stop_words='english')
 
-    vector=cv.fit_transform(movies['overview'].values.astype('U')).toarray()
+def save_artifacts(output_dir, matrix, titles, ids, neighbours, scores, vocabulary=None, labels=None,
+                   ann_index=None, filter_index=None, **info):
+    """
+    Save the model artifacts and their manifest.
 
-    similarity=cosine_similarity(vector)
+    The files are replaced, not overwritten, so a running API keeps its memory-mapped version
+    until it loads the new manifest.
 
-    matching_rows = movies[movies['title'] == title]
+    Parameters:
+    - output_dir: Folder where the artifacts are saved.
+    - matrix: Sparse matrix with a row per movie.
+    - titles: The title of each row.
+    - ids: The id of the movie of each row, None if unknown.
+    - neighbours, scores: The top-k neighbours of each row.
+    - vocabulary (optional): The vocabulary of the vectorizer, None keeps the saved one.
+    - labels (optional): The labels of the columns of each block of labels, None keeps the saved ones.
+    - ann_index (optional): The approximate index, None removes the saved one.
+    - filter_index (optional): The arrays of the filters, None removes the saved ones.
+    - info (optional): Other values of the manifest (e.g. the generation, the blocks and their weights).
+    """
+    os.makedirs(output_dir, exist_ok=True)
 
-    # if len(matching_rows) > 0:
-    #     movie_index = matching_rows.index[0]
-    #     # Further operations using movie_index
-    # else:
-    #     print("No movie found with the title 'Iron Man'")
-    recomendation = []
+    def save(name, array):
+        with atomic_write(os.path.join(output_dir, name)) as file:
+            np.save(file, array)
 
-    distance = sorted(list(enumerate(similarity[2])), reverse=True, key=lambda vector:vector[1])
-    for i in distance[0:5]:
-        name = movies.iloc[i[0]].title
-        recomendation.append(name)
-    
-    info["movie_recommendations"] = recomendation
+    for part in ("data", "indices", "indptr"):
+        save(f"{matrix_file}.{part}.npy", getattr(matrix, part))
+    save(neighbours_file, neighbours)
+    save(scores_file, scores)
+    if ids is not None:
+        save(ids_file, ids)
+
+    for arrays, files in ((ann_index, ann_files), (filter_index, filter_files)):
+        for name, file_name in files.items():
+            if arrays is not None:
+                save(file_name, arrays[name])
+            elif os.path.exists(os.path.join(output_dir, file_name)):
+                # A live model keeps reading the memory-mapped file until it loads the new version
+                os.remove(os.path.join(output_dir, file_name))
+
+    if vocabulary is not None:
+        with atomic_write(os.path.join(output_dir, vocabulary_file), "w", encoding="utf-8") as file:
+            json.dump(vocabulary, file)
+
+    if labels is not None:
+        with atomic_write(os.path.join(output_dir, labels_file), "w", encoding="utf-8") as file:
+            json.dump(labels, file)
+
+    with atomic_write(os.path.join(output_dir, titles_file), "w", encoding="utf-8") as file:
+        json.dump(titles, file)
+
+    return write_manifest(output_dir, shape=list(matrix.shape), top_k=int(neighbours.shape[1]), **info)
+
+
+def add_movies(path, output_dir=artifacts_dir, block=block_size):
+    """
+    Add new movies to the saved model, without fitting the vectorizer again.
+
+    The new overviews, genres and collections are encoded with the saved vocabulary
+    and labels and appended to the matrix, and only the neighbours of the new movies and of the movies that get a
+    new movie as neighbour are updated (update_neighbours), so the time depends on
+    the number of new movies, not on N². The manifest records the generation of the
+    model (0 after build_model, +1 after each update) and the rows added; the API
+    loads the new generation with its reloader.
+
+    The words, genres and collections that are not in the saved ones are ignored: a full
+    build_model over the updated catalogue refits them. The bitsets of the filters are
+    computed again with the release year and the number of votes of the new movies.
+
+    Parameters:
+    - path: Path of the csv file with the "id", "title" and "overview" columns of the new movies,
+            and optionally the "movie_genres" and "collection_name" lists and the "release_year"
+            and "vote_count" of the filters.
+    - output_dir (optional): Folder of the artifacts.
+    - block (optional): The number of new movies compared at the same time.
+
+    Returns:
+        manifest: The manifest of the new generation.
+    """
+    import pandas as pd
+    from scipy import sparse
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.preprocessing import normalize
+
+    model = read_model(output_dir)
+    manifest = read_manifest(output_dir)
+    movies = pd.read_csv(path)
+
+    ids = None
+    ids_path = os.path.join(output_dir, ids_file)
+    if os.path.exists(ids_path):
+        if 'id' not in movies.columns:
+            raise ValueError(f"The file {path} doesn't have the \"id\" column of the movies")
+        # Movies already in the model are skipped
+        ids = np.load(ids_path)
+        movies = movies.drop_duplicates('id')
+        movies = movies[~movies['id'].isin(ids)]
+        ids = np.concatenate([ids, movies['id'].to_numpy(dtype=np.int64)])
+
+    if movies.empty:
+        return manifest
+
+    with stage("model.add_movies"):
+        cv = CountVectorizer(vocabulary=model["vocabulary"], stop_words='english')
+        vector = cv.transform(movies['overview'].values.astype('U'))
+        blocks = [("overview", normalize(vector.astype(np.float32), norm='l2', copy=False))]
+        for name in model["blocks"]:
+            if name in label_blocks:
+                column_name = label_blocks[name][1]
+                values = movies[column_name] if column_name in movies.columns else [None] * len(movies)
+                movie_labels = [ast.literal_eval(value) if isinstance(value, str) else [] for value in values]
+                blocks.append((name, multi_hot(movie_labels, model["labels"][name])[0]))
+        new_rows, _ = stack_blocks(blocks)
+
+        start = model["matrix"].shape[0]
+        matrix = sparse.vstack([model["matrix"], new_rows], format='csr', dtype=np.float32)
+        weights = column_weights(model["blocks"], model["weights"])
+
+        ann = model["ann"]
+        if ann is not None:
+            # The new movies go to the list of their closest centroid
+            new_lists = assign_lists(project(scale_columns(new_rows, np.sqrt(weights)), ann["components"]),
+                                     ann["centroids"])
+            ann = {"components": ann["components"], "centroids": ann["centroids"],
+                   "lists": np.concatenate([ann["lists"], new_lists])}
+
+        # The attributes of the new movies that aren't in their columns are unknown (0)
+        new_years, new_votes, _ = movie_attributes(movies)
+        saved = model["filters"] or {"years": np.zeros(start), "votes": np.zeros(start), "attributes": []}
+        filters, filters_info = movie_filters(matrix, model["blocks"], np.concatenate([saved["years"], new_years]),
+                                              np.concatenate([saved["votes"], new_votes]),
+                                              [name for name in saved["attributes"] if name in attribute_columns])
+
+        if model["neighbours"].shape[1] < min(top_k, matrix.shape[0] - 1):
+            # The catalogue was smaller than k, the neighbours are computed again
+            neighbours, scores = build_neighbours(matrix, block=block, weights=weights)
+        else:
+            neighbours, scores = update_neighbours(matrix, np.asarray(model["neighbours"]),
+                                                   np.asarray(model["scores"]), start, block, weights)
+
+    titles = model["titles"] + movies['title'].fillna('').astype(str).tolist()
+    info = {"ann": manifest["ann"]} if ann is not None else {}
+    return save_artifacts(output_dir, matrix, titles, ids, neighbours, scores, ann_index=ann, filter_index=filters,
+                          filters=filters_info, generation=manifest.get("generation", 0) + 1, rows_added=len(movies),
+                          blocks=model["blocks"], weights=model["weights"], **info)
+
+
+def read_model(input_dir=artifacts_dir):
+    """Read the model artifacts. The arrays are memory-mapped."""
+    from scipy import sparse
+
+    manifest = read_manifest(input_dir)
+    if manifest is None:
+        raise ValueError(f"The model artifacts don't exist in {input_dir}, run: python -m ML_model.model")
+
+    def load(name):
+        return np.load(os.path.join(input_dir, name), mmap_mode="r")
+
+    matrix = sparse.csr_matrix((load(f"{matrix_file}.data.npy"), load(f"{matrix_file}.indices.npy"),
+                                load(f"{matrix_file}.indptr.npy")), shape=tuple(manifest["shape"]), copy=False)
+
+    with open(os.path.join(input_dir, vocabulary_file), "r", encoding="utf-8") as file:
+        vocabulary = json.load(file)
+
+    with open(os.path.join(input_dir, titles_file), "r", encoding="utf-8") as file:
+        titles = json.load(file)
+
+    labels = {}
+    if os.path.exists(os.path.join(input_dir, labels_file)):
+        with open(os.path.join(input_dir, labels_file), "r", encoding="utf-8") as file:
+            labels = json.load(file)
+
+    neighbours = load(neighbours_file)
+    scores = load(scores_file)
+
+    ann = None
+    if "ann" in manifest:
+        ann = {name: load(file_name) for name, file_name in ann_files.items()}
+        ann["order"], ann["offsets"] = list_layout(np.asarray(ann["lists"]), len(ann["centroids"]))
+
+    filters = None
+    if "filters" in manifest:
+        filters = {name: load(file_name) for name, file_name in filter_files.items()}
+        filters["attributes"] = manifest["filters"]["attributes"]
+        filters["genre_columns"] = {normalize_string(genre): idx for idx, genre in enumerate(labels.get("genres", []))}
+
+    # First occurrence of each normalized title
+    title_index = {}
+    for idx_title, title in enumerate(titles):
+        title_index.setdefault(normalize_string(title), idx_title)
+
+    # The artifacts built before the blocks of labels only have the overview block
+    blocks = manifest.get("blocks", {"overview": [0, matrix.shape[1]]})
+    weights = manifest.get("weights", {"overview": 1.0})
+
+    return {"version": manifest["version"], "generation": manifest.get("generation", 0), "matrix": matrix,
+            "vocabulary": vocabulary, "labels": labels, "blocks": blocks, "weights": weights, "titles": titles,
+            "title_index": title_index, "neighbours": neighbours, "scores": scores, "ann": ann, "filters": filters}
+
+
+def load_model(input_dir=artifacts_dir):
+    """Return the live model, reading the artifacts only the first time it's called."""
+    model = _model.get("current")
+    if model is None:
+        model = _model["current"] = read_model(input_dir)
+    record_version("model", model["version"])
+    return model
+
+
+def reload_model(input_dir=artifacts_dir):
+    """
+    Read the artifacts of a new model version next to the live model and swap it in.
+    The requests that already have the old model finish with it.
+
+    Returns:
+        True if a new version was loaded, False if the live model is up to date (or not loaded yet).
+    """
+    manifest = read_manifest(input_dir)
+    live = _model.get("current")
+    if live is None or manifest is None or manifest["version"] == live["version"]:
+        return False
+
+    verify_model(input_dir)
+    with stage("model.reload"):
+        model = read_model(input_dir)
+    _model["current"] = model
+    return True
+
+
+def verify_model(input_dir=artifacts_dir):
+    """Verify the model artifacts against their manifest, before serving."""
+    with stage("model.verify"):
+        return verify_manifest(input_dir)
+
+
+def model_version():
+    """Version of the loaded model artifacts."""
+    return load_model()["version"]
+
+
+def request_weights(model, weights=None):
+    """
+    Return the weight of each block of a request: the weights of the model with the ones of the request.
+
+    Parameters:
+    - model: The model (see read_model).
+    - weights (optional): (block, weight) pairs of the request, e.g. (("genres", 0.0),).
+
+    Raises:
+        ValueError: If a block isn't in the model or a weight is negative.
+    """
+    result = dict(model["weights"])
+    for name, weight in weights or ():
+        if name not in model["blocks"]:
+            raise ValueError(f"The model doesn't have the {name} features, only: {', '.join(model['blocks'])}")
+        if weight < 0:
+            raise ValueError("The weights can't be negative")
+        result[name] = float(weight)
+    return result
+
+
+def request_filters(model, filters=None):
+    """
+    Return the filters of a request as the arguments of filters.filter_mask.
+
+    Parameters:
+    - model: The model (see read_model).
+    - filters (optional): (name, value) pairs of the request, the names are "year_from", "year_to",
+                          "min_votes" and "genre", e.g. (("year_from", 2000), ("genre", "Drama")).
+
+    Raises:
+        ValueError: If a filter is unknown, the model doesn't have its attribute, the genre doesn't exist,
+                    the number of votes is negative or the range of years is empty.
+    """
+    result = {}
+    for name, value in filters or ():
+        if name not in filter_attributes:
+            raise ValueError(f"Unknown filter {name}, only: {', '.join(filter_attributes)}")
+        if model["filters"] is None or filter_attributes[name] not in model["filters"]["attributes"]:
+            raise ValueError(f"The model doesn't have the {filter_attributes[name]} of the movies to filter them")
+        if name == "genre":
+            column = model["filters"]["genre_columns"].get(normalize_string(value))
+            if column is None:
+                raise ValueError(f"Unknown genre {value}")
+            value = column
+        result[name] = value
+
+    if result.get("min_votes", 0) < 0:
+        raise ValueError("The number of votes can't be negative")
+    if result.get("year_from", 0) > result.get("year_to", np.inf):
+        raise ValueError("The first year can't be after the last one")
+    return result
+
+
+def precomputed_neighbours(model, movie_index, amount, block_weights, mask=None):
+    """
+    Return the first precomputed neighbours of a movie that match a filter.
+
+    Returns:
+        rows: The rows of the neighbours, None if the neighbours were computed with other weights or
+              there aren't enough of them (the catalogue must be scored).
+    """
+    if amount > model["neighbours"].shape[1] or block_weights != model["weights"]:
+        return None
+    best = model["neighbours"][movie_index]
+    if mask is not None:
+        best = best[mask[best]]
+    return best[:amount] if len(best) >= amount else None
+
+
+def needs_scan(amount: int = 5, weights=None, filters=None, title: str = None) -> bool:
+    """
+    Check if a recommendation of this amount of movies (and these weights and filters) needs to score the whole
+    catalogue, instead of reading the precomputed neighbours. With filters, the precomputed neighbours of the
+    title are checked, a filtered request without a title is always a scan.
+    """
+    model = load_model()
+    block_weights = request_weights(model, weights)
+    if not filters:
+        return amount > model["neighbours"].shape[1] or block_weights != model["weights"]
+    mask = filter_mask(model["filters"], **request_filters(model, filters))
+    movie_index = model["title_index"].get(normalize_string(title)) if title is not None else None
+    if movie_index is None:
+        return title is None
+    return precomputed_neighbours(model, movie_index, amount, block_weights, mask) is None
+
+
+def top_movies(similarity, rows, movie_index, amount, mask=None):
+    """
+    Return the rows with the highest similarity, most similar first, without the movie itself.
+    The rows that don't match the mask (a boolean array of the catalogue) are skipped.
+    """
+    similarity[rows == movie_index] = -np.inf
+    amount = min(amount, len(rows) - 1)
+    if mask is not None:
+        similarity[~mask[rows]] = -np.inf
+        amount = min(amount, int(np.count_nonzero(similarity > -np.inf)))
+    if amount <= 0:
+        return rows[:0]
+    return top_k_columns(similarity[None, :], amount, rows[None, :])[0][0]
+
+
+def exact_search(model, movie_index, amount, weights, mask=None):
+    """
+    Score the whole catalogue and return the most similar movies.
+    The weights are applied to the row of the movie, so every block is scored in a single product.
+
+    Parameters:
+    - model: The model (see read_model).
+    - movie_index: The row of the movie.
+    - amount: The number of movies.
+    - weights: The weight of each column (see column_weights).
+    - mask (optional): Boolean array with the movies that can be recommended (see filters.filter_mask).
+    """
+    matrix = model["matrix"]
+    similarity = (matrix @ scale_columns(matrix[movie_index], weights).T).toarray().ravel()
+    return top_movies(similarity, np.arange(matrix.shape[0]), movie_index, amount, mask)
+
+
+def ann_search(model, movie_index, amount, weights, n_probe=ann_probes, mask=None):
+    """
+    Score the movies of the n_probe lists of the approximate index closest to the movie and
+    return the most similar ones. The candidates are scored with the exact features.
+    With a mask, the next closest lists are added until they have enough movies that match it.
+
+    Parameters:
+    - model, movie_index, amount, weights, mask: As in exact_search.
+    - n_probe (optional): Number of lists scored.
+    """
+    matrix, ann = model["matrix"], model["ann"]
+    query = matrix[movie_index]
+    vector = project(scale_columns(query, np.sqrt(weights)), ann["components"])[0]
+    candidates = probe_lists(ann["centroids"], vector, ann["order"], ann["offsets"], n_probe, amount + 1, mask)
+
+    similarity = (matrix[candidates] @ scale_columns(query, weights).T).toarray().ravel()
+    return top_movies(similarity, candidates, movie_index, amount, mask)
+
+
+def ann_recall(model=None, k=10, probes=(1, 2, 4, 8, 16, 32), sample=200, seed=0):
+    """
+    Measure the recall@k and the latency of the approximate index against the exact search.
+
+    Parameters:
+    - model (optional): The model (see read_model), the live model by default.
+    - k (optional): The number of movies of each search.
+    - probes (optional): The numbers of probed lists to measure.
+    - sample (optional): The number of movies searched.
+    - seed (optional): Seed of the sample of movies.
+
+    Returns:
+        results: A dictionary with the "exact_ms" time of a search, the recall of the precomputed
+                 "neighbours" and the "recall", the "ms" and the average "candidates" of each n_probe.
+
+    Raises:
+        ValueError: If the model doesn't have an approximate index.
+    """
+    import time
+
+    model = model or load_model()
+    if model["ann"] is None:
+        raise ValueError("The model doesn't have an approximate index, build it with --ann-lists")
+
+    num_rows = model["matrix"].shape[0]
+    rows = np.random.default_rng(seed).choice(num_rows, min(sample, num_rows), replace=False)
+    weights = column_weights(model["blocks"], model["weights"])
+
+    def run(search, **kwargs):
+        start = time.perf_counter()
+        found = [search(model, row, k, weights, **kwargs) for row in rows]
+        return found, (time.perf_counter() - start) * 1000 / len(rows)
+
+    exact, exact_ms = run(exact_search)
+    results = {"k": k, "queries": len(rows), "exact_ms": round(exact_ms, 3), "probes": []}
+    if k <= model["neighbours"].shape[1]:
+        results["neighbours"] = round(recall_at_k(exact, np.asarray(model["neighbours"][rows, :k])), 4)
+
+    sizes = np.diff(model["ann"]["offsets"])
+    for n_probe in probes:
+        found, ms = run(ann_search, n_probe=n_probe)
+        results["probes"].append({"n_probe": n_probe, "recall": round(recall_at_k(exact, found), 4),
+                                  "ms": round(ms, 3), "candidates": int(min(n_probe, len(sizes)) * sizes.mean())})
+    return results
+
+
+@measured("movie_recommendation")
+@cached("movie_recommendation", model_version)
+def movie_recommendation(title: str, amount: int = 5, weights: tuple = None, filters: tuple = None) -> dict:
+    """
+    Recommend the most similar movies to the given title.
+    The weights are (block, weight) pairs that change the weight of the overview, the genres
+    or the collection in the similarity, e.g. (("collection", 0.0),). The filters are (name, value)
+    pairs that only recommend some movies, e.g. (("year_from", 2000), ("genre", "Drama")), see request_filters.
+    """
+
+    info = {"movie_recommendations": []}
+
+    model = load_model()
+    block_weights = request_weights(model, weights)
+    mask = filter_mask(model["filters"], **request_filters(model, filters)) if filters else None
+    movie_index = model["title_index"].get(normalize_string(title))
+    if movie_index is None or amount <= 0:
+        return info
+
+    # Precomputed neighbours, O(k)
+    best = precomputed_neighbours(model, movie_index, amount, block_weights, mask)
+    if best is not None:
+        info["movie_recommendations"] = [model["titles"][idx] for idx in best]
+        return info
+
+    weights = column_weights(model["blocks"], block_weights)
+    with stage("model.similarity"):
+        if recommend_mode == "ann" and model["ann"] is not None:
+            best = ann_search(model, movie_index, amount, weights, mask=mask)
+        else:
+            best = exact_search(model, movie_index, amount, weights, mask)
+
+    info["movie_recommendations"] = [model["titles"][idx] for idx in best]
 
     return info
 
 
-## For future improvement of the system
-# def belongs_to_collection(title):
-#     """Verify if the movie belongs to a movies series."""
-#     title_normalized = normalize_string(title)
+def scored_recommendation(title: str, amount: int = 5, weights: tuple = None, filters: tuple = None) -> tuple:
+    """
+    Recommend the most similar movies to the given title (see movie_recommendation) in a worker of the
+    process pool, which may still have the previous model after a reload.
+
+    Returns:
+        info: The recommendations.
+        version: The version of the model of the worker.
+    """
+    return movie_recommendation(title, amount, weights, filters), model_version()
+
+
+def main():
+    """Build the model, add new movies to it or measure its approximate index, from the command line."""
+    import argparse
 
-#     dataframe = read_movies_data(path1)
-    
-#     id_movie = []
+    parser = argparse.ArgumentParser(description="Build the recommendation model.")
+    parser.add_argument("--add", default=None,
+                        help="Path of a csv file with new movies (id, title, overview, movie_genres, collection_name) "
+                             "to add to the saved model.")
+    parser.add_argument("--ann-lists", type=int, default=0,
+                        help="Number of lists of the approximate index (e.g. 4 x sqrt(movies)), 0 doesn't build it.")
+    parser.add_argument("--ann-dims", type=int, default=128, help="Dimensions of the approximate index.")
+    parser.add_argument("--probes", default=None,
+                        help="Lists compared to build the approximate neighbours, or a comma-separated list of "
+                             "values to measure with --recall.")
+    parser.add_argument("--recall", action="store_true",
+                        help="Measure the recall@k and the latency of the approximate index against the exact search.")
+    parser.add_argument("--k", type=int, default=10, help="The k of the recall.")
+    args = parser.parse_args()
 
-#     for row in dataframe:
-#         movie = row["title"]
-#         movie_normalized = normalize_string(movie)
+    probes = [int(value) for value in args.probes.split(",")] if args.probes else None
+    if args.recall:
+        print(json.dumps(ann_recall(read_model(), args.k, **({"probes": probes} if probes else {})), indent=1))
+    elif args.add:
+        manifest = add_movies(args.add)
+        print(f"Generation {manifest.get('generation', 0)}: {manifest['shape'][0]} movies")
+    else:
+        build_model(ann_lists=args.ann_lists, ann_dims=args.ann_dims, n_probe=probes[0] if probes else ann_probes)
 
-#         if movie_normalized == title_normalized:
-#             idx_movie = int(row["id"])
-#             id_movie.append(idx_movie)
 
-#     return idx_movie
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+This module provides the manifest of the files shared by the workers of the API.
+
+The data and model files are saved as flat arrays (.npy) that every worker
+memory-maps, so the OS keeps a single copy of them in the page cache. A folder of
+files is described by a "manifest.json" file with the size and checksum of each
+file, and a version computed from the checksums. The API verifies the manifest at
+startup, so a partial or corrupted build is never served.
+
+The files are written to a temporary file and renamed (`atomic_write`), never
+overwritten in place: the processes that memory-mapped the previous version keep
+reading it until they load the new one.
+
+Settings (environment variables):
+- VERIFY_CHECKSUMS: Verify the checksum of every file at startup, "0" only verifies the sizes (default "1").
+
+Available Functions:
+- atomic_write: Context manager that writes a file atomically.
+- file_checksum: Return the sha256 checksum of a file.
+- write_manifest: Write the manifest of a folder.
+- read_manifest: Read the manifest of a folder.
+- verify_manifest: Verify the files of a folder against its manifest.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+
+manifest_file = "manifest.json"
+verify_checksums = os.environ.get("VERIFY_CHECKSUMS", "1") != "0"
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="wb", **kwargs):
+    """
+    Open a temporary file next to the path and rename it to the path when it's closed,
+    so readers see the previous file or the new one, never a partial file.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, mode, **kwargs) as file:
+            yield file
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def file_checksum(path, block=1 << 20):
+    """Return the sha256 checksum of a file, reading it in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for data in iter(lambda: file.read(block), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def write_manifest(folder, **info):
+    """
+    Write the manifest of every file of a folder.
+
+    Parameters:
+    - folder: The folder of the files.
+    - info (optional): Other values stored in the manifest (e.g. the shape of a matrix).
+
+    Returns:
+        manifest: A dictionary with the "version", the "files" and the other values.
+    """
+    files = {}
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name == manifest_file or name.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        files[name] = {"size": os.path.getsize(path), "sha256": file_checksum(path)}
+
+    version = hashlib.sha1(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    manifest = {"version": version, "files": files, **info}
+    with atomic_write(os.path.join(folder, manifest_file), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
+    return manifest
+
+
+def read_manifest(folder):
+    """Read the manifest of a folder, None if it doesn't exist."""
+    path = os.path.join(folder, manifest_file)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def verify_manifest(folder, checksums=verify_checksums):
+    """
+    Verify the files of a folder against its manifest.
+
+    Parameters:
+    - folder: The folder of the files.
+    - checksums (optional): Verify the checksums, otherwise only the sizes are verified.
+
+    Returns:
+        manifest: The manifest of the folder.
+
+    Raises:
+        ValueError: If the manifest doesn't exist, or a file is missing or different.
+    """
+    manifest = read_manifest(folder)
+    if manifest is None:
+        raise ValueError(f"The folder {folder} doesn't have a {manifest_file} file")
+
+    for name, expected in manifest["files"].items():
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            raise ValueError(f"Missing file {name} in {folder}")
+        if os.path.getsize(path) != expected["size"]:
+            raise ValueError(f"The size of {name} in {folder} doesn't match the manifest")
+        if checksums and file_checksum(path) != expected["sha256"]:
+            raise ValueError(f"The checksum of {name} in {folder} doesn't match the manifest")
+
+    return manifest
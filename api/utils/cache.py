@@ -0,0 +1,262 @@
+"""
+This module provides the cache of the results of the endpoints.
+
+The results are cached by endpoint and normalized argument (normalize_string), so
+"Toy Story" and "toy-story" share the same entry. The entries expire after a TTL, the
+least recently used are evicted when the cache is full, and the whole cache is
+cleared when the version of the data changes.
+
+Backends:
+- "memory": A dictionary of the process (default).
+- "file": A folder with a JSON file per entry, shared by every worker of the machine. The
+          folder must belong to the user of the API and only be accessible by it, and the
+          entries are JSON, so the values are dicts, lists, strings and numbers.
+- "none": Disable the cache.
+
+Settings (environment variables):
+- CACHE_BACKEND: Name of the backend.
+- CACHE_SIZE: Maximum number of entries (default 1024).
+- CACHE_TTL: Seconds before an entry expires (default 300).
+- CACHE_DIR: Folder of the "file" backend.
+
+Available Functions:
+- cached: Decorator that caches the results of a function.
+- cache_stats: Return the hits, misses and evictions of the cache.
+- clear_cache: Delete every entry of the cache.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from api.utils.metrics import increment
+from api.utils.text import normalize_string
+
+cache_backend = os.environ.get("CACHE_BACKEND", "memory")
+cache_size = int(os.environ.get("CACHE_SIZE", 1024))
+cache_ttl = float(os.environ.get("CACHE_TTL", 300))
+cache_dir = os.environ.get("CACHE_DIR", os.path.join(tempfile.gettempdir(), "movies-api-cache"))
+
+_missing = object()
+
+
+class MemoryBackend:
+    """LRU dictionary of the process, with TTL."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _missing
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                self.evictions += 1
+                increment("cache_evictions_total")
+                return _missing
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+                increment("cache_evictions_total")
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def private_folder(folder):
+    """
+    Create a folder only accessible by the current user, or check that an existing one is.
+
+    Raises:
+        ValueError: If the folder belongs to another user or other users can access it.
+    """
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    info = os.stat(folder)
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise ValueError(f"The cache folder {folder} belongs to another user, set CACHE_DIR to a private folder")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        raise ValueError(f"Other users can access the cache folder {folder}, set CACHE_DIR to a private folder")
+
+
+class FileBackend:
+    """
+    Folder with a JSON file per entry, shared by the processes of the machine.
+
+    Another process may remove an entry at any time, so a missing file is a miss, never
+    an error. The folder is only listed to evict the least recently used entries once
+    every `evict_every` writes, so it can hold up to size + evict_every entries.
+    The entries are JSON, not pickles, so reading a file never runs code.
+    """
+
+    def __init__(self, size, ttl, folder, evict_every=None):
+        self.size = size
+        self.ttl = ttl
+        self.folder = folder
+        self.evict_every = evict_every or max(size // 16, 1)
+        self.writes = 0
+        self.evictions = 0
+        private_folder(folder)
+
+    def path(self, key):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, f"{name}.json")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+            expires, stored_key, value = entry["expires"], entry["key"], entry["value"]
+        except (OSError, ValueError, TypeError, KeyError):
+            return _missing
+        if stored_key != repr(key):
+            return _missing
+        if expires < time.time():
+            self.remove(path)
+            return _missing
+        # The modification time is used as the last access for the LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        path = self.path(key)
+        # Write to a temporary file and rename, so readers never see a partial entry
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"expires": time.time() + self.ttl, "key": repr(key), "value": value}, file)
+        os.replace(temp_path, path)
+
+        self.writes += 1
+        if self.writes % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries above the size of the cache."""
+        entries = self.entries()
+        for old_path in entries[:max(len(entries) - self.size, 0)]:
+            self.remove(old_path)
+
+    def entries(self):
+        """The paths of the entries, the least recently used first."""
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                # Removed by another process
+                continue
+        return [path for _, path in sorted(entries)]
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+            self.evictions += 1
+            increment("cache_evictions_total")
+        except OSError:
+            pass
+
+    def clear(self):
+        for path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def create_backend(name=cache_backend):
+    """Create the backend with the given name, None disables the cache."""
+    if name == "memory":
+        return MemoryBackend(cache_size, cache_ttl)
+    if name == "file":
+        return FileBackend(cache_size, cache_ttl, cache_dir)
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+_cache = {"backend": create_backend(), "versions": {}, "hits": 0, "misses": 0}
+
+
+def cached(endpoint, version=None):
+    """
+    Decorator that caches the results of a function by endpoint and normalized argument.
+
+    Parameters:
+    - endpoint: Name of the endpoint, part of the key.
+    - version (optional): Function that returns the version of the data used by the endpoint.
+                          When the version changes, the cache is cleared.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(query, *args, **kwargs):
+            backend = _cache["backend"]
+            if backend is None:
+                return function(query, *args, **kwargs)
+
+            data_version = version() if version is not None else None
+            if _cache["versions"].setdefault(endpoint, data_version) != data_version:
+                backend.clear()
+                _cache["versions"][endpoint] = data_version
+
+            key = (endpoint, data_version, normalize_string(query), args, tuple(sorted(kwargs.items())))
+            value = backend.get(key)
+            if value is not _missing:
+                _cache["hits"] += 1
+                increment("cache_requests_total", endpoint=endpoint, result="hit")
+                return value
+
+            _cache["misses"] += 1
+            increment("cache_requests_total", endpoint=endpoint, result="miss")
+            value = function(query, *args, **kwargs)
+            # The data may be swapped while the value is computed, then it isn't stored under this version
+            if version is None or version() == data_version:
+                backend.set(key, value)
+            return value
+
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """Return the hits, misses, evictions and hit rate of the cache."""
+    backend = _cache["backend"]
+    requests = _cache["hits"] + _cache["misses"]
+    return {
+        "backend": type(backend).__name__ if backend is not None else None,
+        "hits": _cache["hits"],
+        "misses": _cache["misses"],
+        "evictions": backend.evictions if backend is not None else 0,
+        "hit_rate": _cache["hits"] / requests if requests else 0.0,
+    }
+
+
+def clear_cache():
+    """Delete every entry of the cache."""
+    if _cache["backend"] is not None:
+        _cache["backend"].clear()
@@ -0,0 +1,143 @@
+"""
+This module provides the process pool for the CPU-heavy work of the API.
+
+Cheap lookups run directly in the async handlers. Heavy work (e.g. scoring a movie
+against the whole catalogue) runs in a dedicated process pool, so it doesn't block
+the event loop or the other endpoints. The metrics recorded by a worker are
+returned with the result and added to the metrics of the API.
+
+The workers are started with the "forkserver" method ("spawn" where it doesn't exist),
+never forked from the API: the pool is started by the warm-up and reloader threads
+while the event loop serves requests, and a fork would copy the locks held by the
+other threads (e.g. of the metrics or the cache) locked forever in the worker.
+
+Settings (environment variables):
+- PROCESS_POOL_SIZE: Number of worker processes, 0 runs the work in a thread (default 2).
+- REQUEST_TIMEOUT: Seconds a request waits for the heavy work (default 10).
+
+Available Functions:
+- start_pool: Start the process pool.
+- warm_pool: Start every worker of the process pool.
+- restart_pool: Replace the process pool, e.g. after a new model is loaded.
+- stop_pool: Stop the process pool.
+- run_in_pool: Run a function in the process pool, with a timeout.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from api.utils.metrics import drain_metrics, merge_metrics
+
+process_pool_size = int(os.environ.get("PROCESS_POOL_SIZE", 2))
+request_timeout = float(os.environ.get("REQUEST_TIMEOUT", 10))
+
+start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_pool = {"executor": None, "size": 0}
+# The work is sent to the pool and the pool is replaced under the lock, so no work is sent to a pool after its shutdown
+_lock = threading.Lock()
+
+
+def create_executor(initializer, size):
+    """Create a process pool whose workers aren't forked from the API (see start_method)."""
+    return ProcessPoolExecutor(max_workers=size, initializer=initializer,
+                               mp_context=multiprocessing.get_context(start_method))
+
+
+def start_pool(initializer=None, size=process_pool_size):
+    """
+    Start the process pool.
+
+    Parameters:
+    - initializer (optional): Function called once by each worker, e.g. to load the model.
+    - size (optional): Number of worker processes. With 0 the work runs in the default threads.
+    """
+    if _pool["executor"] is None and size > 0:
+        _pool["executor"] = create_executor(initializer, size)
+        _pool["size"] = size
+    return _pool["executor"]
+
+
+def warm_pool():
+    """
+    Start every worker of the process pool, so their initializer runs now instead of
+    in the first request. The workers are only started when work is submitted.
+    """
+    executor = _pool["executor"]
+    if executor is not None:
+        futures = [executor.submit(os.getpid) for _ in range(_pool["size"])]
+        for future in futures:
+            future.result()
+
+
+def restart_pool(initializer=None, size=process_pool_size):
+    """
+    Replace the process pool with a new one, e.g. so the workers load a new model.
+    The work already sent to the old pool finishes there, the next work goes to the new one.
+    """
+    with _lock:
+        old_executor = _pool["executor"]
+        if old_executor is None:
+            return None
+        _pool["executor"] = create_executor(initializer, size) if size > 0 else None
+        _pool["size"] = max(size, 0)
+        old_executor.shutdown(wait=False)
+    warm_pool()
+    return _pool["executor"]
+
+
+def stop_pool():
+    """Stop the process pool, without waiting for the pending work."""
+    with _lock:
+        executor = _pool["executor"]
+        _pool["executor"] = None
+        _pool["size"] = 0
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def call_measured(call):
+    """
+    Run a call in a worker process.
+
+    Returns:
+        result: The result of the call, None if it raised an exception.
+        error: The exception raised by the call, None if it didn't raise one.
+        metrics: The metrics recorded by the call (see metrics.drain_metrics).
+    """
+    # The metrics recorded outside the calls (e.g. by the initializer) are not exported
+    drain_metrics()
+    try:
+        return call(), None, drain_metrics()
+    except Exception as error:
+        return None, error, drain_metrics()
+
+
+async def run_in_pool(function, *args, timeout=None, **kwargs):
+    """
+    Run a function in the process pool and wait for the result.
+
+    Raises:
+        asyncio.TimeoutError: If the result takes more than the timeout
+                              (REQUEST_TIMEOUT by default).
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(function, *args, **kwargs)
+    with _lock:
+        executor = _pool["executor"]
+        if executor is None:
+            future = loop.run_in_executor(None, call)
+        else:
+            future = loop.run_in_executor(executor, functools.partial(call_measured, call))
+    if executor is None:
+        # A thread of the API records the metrics directly
+        return await asyncio.wait_for(future, timeout or request_timeout)
+
+    result, error, metrics = await asyncio.wait_for(future, timeout or request_timeout)
+    merge_metrics(metrics)
+    if error is not None:
+        raise error
+    return result
@@ -1,31 +1,19 @@
-import csv
-import ast
-import os
+import numpy as np
+from api.utils.cache import cached
+from api.utils.metrics import measured
+from api.utils.search import search
+from api.utils.store import get_dataset, get_index, data_version
+from api.utils.text import normalize_string
 
-path12 = "../data/api_data12.csv"
-path3 = "../data/api_data3.csv"
-path4 = "../data/api_data4.csv"
-path5 = "../data/api_data5.csv"
-path6 = "../data/api_data6.csv"
 
-def read_movies_data(path):
-    """Read and return the movies data as a dataframe."""
-    # Get the absolute path of the current script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # Derive the path to "file.csv" based on the script directory
-    csv_path = os.path.join(script_dir, path)
-
-    with open(csv_path, "r", encoding="utf-8") as file:
-        reader = csv.DictReader(file)
-        dataframe = list(reader)
-        return dataframe
-
-def normalize_string(string) -> str:
-    """Normalize the text"""
-    string = string.lower().replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ó', 'o').replace('ú', 'u')
-    string = string.replace(" ", "-")
-    return string
+def csv_text(value) -> str:
+    """
+    Return a value of the store as it is written in the api_data*.csv files, the type these
+    endpoints have always returned for it ("" for a missing number).
+    """
+    if isinstance(value, (float, np.floating)) and np.isnan(value):
+        return ""
+    return str(value)
 
 
 def convert_month_to_number(month: str) -> int:
@@ -49,7 +37,7 @@ def convert_month_to_number(month: str) -> int:
 
 
 def convert_day_to_number(day: str) -> int:
-    """Convert the month from text to its corresponding number representation."""
+    """Convert the day from text to its corresponding number representation (1 = Monday)."""
     day_dict = {
         "lunes":        1,
         "martes":       2,
@@ -63,39 +51,46 @@ def convert_day_to_number(day: str) -> int:
     return day_dict.get(normalized_day)
 
 
+@measured("count_movies_released_month")
 def count_movies_released_month(month: str) -> int:
     """Count the number of movies released historically."""
 
     month_number = convert_month_to_number(month)
+    if month_number is None:
+        return 0
 
-    count = 0
-
-    dataframe = read_movies_data(path12)
-    for row in dataframe:
-        release_date = row["release_date"].split("-")
-        movie_month = int(release_date[1])
-        if movie_month == month_number and row["status"] == "Released":
-            count += 1
+    counts = get_dataset()["aggregates"]["release"]["month"]
 
-    return count
+    return int(counts[month_number])
 
 
+@measured("count_movies_released_day")
 def count_movies_released_day(day: str) -> int:
-    """Count the number of movies released historically."""
+    """Count the number of movies released historically on a day of the week."""
 
     day_number = convert_day_to_number(day)
+    if day_number is None:
+        return 0
 
-    count = 0
-    dataframe = read_movies_data(path12)
-    for row in dataframe:
-        release_date = row["release_date"].split("-")
-        movie_day = int(release_date[2])
-        if movie_day == day_number and row["status"] == "Released":
-            count += 1
+    counts = get_dataset()["aggregates"]["release"]["weekday"]
 
-    return count
+    return int(counts[day_number])
 
 
+@measured("count_movies_released_year")
+def count_movies_released_year(year: int) -> list:
+    """Count the number of movies released on each month of a year."""
+
+    release = get_dataset()["aggregates"]["release"]
+    idx_year = year - release["first_year"]
+    if idx_year < 0 or idx_year >= len(release["year_month"]):
+        return [0] * 12
+
+    return release["year_month"][idx_year, 1:].tolist()
+
+
+@measured("movie_popularity")
+@cached("movie_popularity", data_version)
 def movie_popularity(movie: str) -> dict:
     """Check for the movie realese and popularity."""
     
@@ -103,19 +98,18 @@ def movie_popularity(movie: str) -> dict:
 
     info = {"title": [], "year": [], "popularity": []}
 
-    dataframe = read_movies_data(path3)
-    for row in dataframe:
-        title = row["title"]
-        title_normalized = normalize_string(title)
-        
-        if title_normalized == movie_name:
-            info["title"].append(title)
-            info["year"].append(row["release_year"])
-            info["popularity"].append(float(row["popularity"]))
+    dataset = get_dataset()
+    columns = dataset["columns"]
+    for idx_row in get_index(dataset, "title", movie_name):
+        info["title"].append(columns["title"][idx_row])
+        info["year"].append(csv_text(int(columns["release_year"][idx_row])))
+        info["popularity"].append(float(columns["popularity"][idx_row]))
     
     return info
 
 
+@measured("movie_vote")
+@cached("movie_vote", data_version)
 def movie_vote(movie: str) -> dict:
     """Check for the vote of the movie movie."""
     
@@ -123,94 +117,79 @@ def movie_vote(movie: str) -> dict:
 
     info = {"title": [], "year": [], "vote_total": [], "vote_average": []}
 
-    dataframe = read_movies_data(path4)
-    for row in dataframe:
-        title = row["title"]
-        title_normalized = normalize_string(title)
+    dataset = get_dataset()
+    columns = dataset["columns"]
+    for idx_row in get_index(dataset, "title", movie_name):
+        vote_count = float(columns["vote_count"][idx_row])
+        info["title"].append(columns["title"][idx_row])
+        info["year"].append(csv_text(int(columns["release_year"][idx_row])))
+        info["vote_total"].append(vote_count)
         
-        if title_normalized == movie_name:
-            info["title"].append(title)
-            info["year"].append(row["release_year"])
-            info["vote_total"].append(float(row["vote_count"]))
-            
-            if float(row["vote_count"]) >= 2000:
-                info["vote_average"].append(row["vote_average"])
-            else:
-                info["vote_average"].append("La filmación posee menos de 2000 valoraciones")
+        if vote_count >= 2000:
+            info["vote_average"].append(csv_text(float(columns["vote_average"][idx_row])))
+        else:
+            info["vote_average"].append("La filmación posee menos de 2000 valoraciones")
     
     return info
 
 
+@measured("actor_info")
+@cached("actor_info", data_version)
 def actor_info(actor: str) -> dict:
     """Check information of the actor."""
     
     actor_name = normalize_string(actor)
 
-    info = {"name": [], "movies_total": [], "return_total": [], "return_average": []}
-    movies_acted = []
-    return_total = 0
-
-    dataframe = read_movies_data(path5)
-    for row in dataframe:
-        actors_list = ast.literal_eval(row["actor_name"])
-        for actor_in_list in actors_list:
-            actor_normalized = normalize_string(actor_in_list)
-            if actor_normalized == actor_name:
-                info["name"] = actor_in_list
-                movies_acted.append(row["id"])
-                return_total += float(row["return"])
-    
-    
-    movie_count = len(movies_acted)
-    return_average = return_total/movie_count
-    
-    info["movies_total"] = movie_count
-    info["return_total"] = return_total
-    info["return_average"] = return_average
+    info = {"name": [], "movies_total": 0, "return_total": 0, "return_average": 0}
+
+    dataset = get_dataset()
+    index = dataset["indexes"]["actor"]
+    slot = index["slots"].get(actor_name)
+    if slot is None:
+        return info
+
+    aggregates = dataset["aggregates"]["actor"]
+    info["name"] = index["names"][actor_name]
+    info["movies_total"] = int(aggregates["movies_total"][slot])
+    info["return_total"] = float(aggregates["return_total"][slot])
+    info["return_average"] = float(aggregates["return_average"][slot])
     
     return info
 
 
+@measured("director_info")
+@cached("director_info", data_version)
 def director_info(director: str) -> dict:
     """Check information of the director."""
     
     director_name = normalize_string(director)
 
-    info = {"name": [], "return_total": [], "movies_total": [], "release_date": [],
+    info = {"name": [], "return_total": 0, "movies_total": [], "release_date": [],
             "return_movie": [], "budget_movie": [], "revenue_movie": []}
 
-    return_total = 0
-    movies_directed = []
-    movie_date = []
-    movie_return = []
-    movie_budget = []
-    movie_revenue = []
+    dataset = get_dataset()
+    index = dataset["indexes"]["director"]
+    slot = index["slots"].get(director_name)
+    if slot is None:
+        return info
+
+    aggregates = dataset["aggregates"]["director"]
+    movies = slice(index["starts"][slot], index["ends"][slot])
+    vectors = aggregates["vectors"]
+
+    info["name"] = index["names"][director_name]
+    info["return_total"] = float(aggregates["return_total"][slot])
+    info["movies_total"] = vectors["title"][movies].tolist()
+    info["release_date"] = vectors["release_date"][movies].tolist()
+    info["return_movie"] = [csv_text(value) for value in vectors["return"][movies].tolist()]
+    info["budget_movie"] = [csv_text(value) for value in vectors["budget"][movies].tolist()]
+    info["revenue_movie"] = [csv_text(value) for value in vectors["revenue"][movies].tolist()]
+    
+    return info
 
-    dataframe = read_movies_data(path6)
 
-    for row in dataframe:
-        directors_list = ast.literal_eval(row["crew_name"])
-        
-        for idx_director, director_in_list in enumerate(directors_list):
-            director_normalized = normalize_string(director_in_list)
-            
-            if director_normalized == director_name:
-                departments = ast.literal_eval(row["crew_job"])
-                
-                if departments[idx_director] == "Director":
-                    info["name"] = director_in_list
-                    return_total += float(row["return"])
-                    movies_directed.append(row["title"])
-                    movie_date.append(row["release_date"])
-                    movie_return.append(row["return"])
-                    movie_budget.append(row["budget"])
-                    movie_revenue.append(row["revenue"])
-
-    info["return_total"] = return_total
-    info["movies_total"] = movies_directed
-    info["release_date"] = movie_date
-    info["return_movie"] = movie_return
-    info["budget_movie"] = movie_budget
-    info["revenue_movie"] = movie_revenue
-    
-    return info
\ No newline at end of file
+@measured("search_names")
+def search_names(query: str, limit: int = 10, kind: str = None) -> list:
+    """Search the titles, actors and directors that start with the query or have a similar spelling."""
+
+    return search(get_dataset()["indexes"]["search"], query, limit, kind)
@@ -0,0 +1,218 @@
+"""
+This module provides the metrics of the API, exposed in the Prometheus text format.
+
+The stages of the data load (reading the files, evaluating the lists, normalizing
+the names, building the indexes), the helpers, the recommender and the requests
+are timed into histograms, and the requests and the cache lookups are counted.
+Recording a value is a dictionary update under a lock, so the overhead is a few
+microseconds. When the metrics are disabled, the decorators return the function
+unchanged and the stages are a shared no-op context, so there is no overhead.
+
+The metrics are stored per process: the work of the process pool (see executor.py)
+returns the histograms and counters recorded by the worker (`drain_metrics`) with
+its result, and the API adds them to its own (`merge_metrics`), so /metrics
+includes the stages of the recommendations scored in the pool. The gauges of the
+workers are not exported.
+
+Settings (environment variables):
+- METRICS_ENABLED: "0" disables the metrics (default "1").
+
+Available Functions:
+- stage: Context manager that times a stage.
+- measured: Decorator that times a function.
+- observe: Record a value in a histogram.
+- increment: Increment a counter.
+- set_gauge: Set the value of a gauge.
+- drain_metrics: Return the histograms and counters recorded by this process and reset them.
+- merge_metrics: Add the histograms and counters recorded by another process.
+- counter_total: Return the sum of the series of a counter with some labels.
+- render_metrics: Return every metric in the Prometheus text format.
+"""
+
+import bisect
+import contextlib
+import functools
+import os
+import threading
+import time
+
+metrics_enabled = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+prefix = "movies_api_"
+
+# Upper bounds (seconds) of the buckets of the histograms
+buckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Type and description of each metric
+definitions = {
+    "stage_duration_seconds": ("histogram", "Duration of each stage of the data load and of the requests."),
+    "function_duration_seconds": ("histogram", "Duration of each helper and of the recommender."),
+    "http_request_duration_seconds": ("histogram", "Duration of the requests by route."),
+    "http_requests_total": ("counter", "Requests by route, method and status code."),
+    "cache_requests_total": ("counter", "Lookups of the cache by endpoint and result (hit or miss)."),
+    "cache_evictions_total": ("counter", "Entries evicted from the cache."),
+    "cache_hit_rate": ("gauge", "Hits divided by the lookups of the cache."),
+    "component_load_seconds": ("gauge", "Load time of each component of the API."),
+    "component_ready": ("gauge", "1 if the component of the API is loaded."),
+    "reloads_total": ("counter", "Checks of the reloader that loaded a new version or failed, by component."),
+}
+
+_metrics = {"histograms": {}, "counters": {}, "gauges": {}}
+_lock = threading.Lock()
+_disabled_stage = contextlib.nullcontext()
+
+
+def label_key(labels):
+    """Labels as a hashable and sorted tuple."""
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Record a value in a histogram."""
+    if not metrics_enabled:
+        return
+    key = (name, label_key(labels))
+    with _lock:
+        histogram = _metrics["histograms"].get(key)
+        if histogram is None:
+            histogram = _metrics["histograms"][key] = {"buckets": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+        histogram["buckets"][bisect.bisect_left(buckets, value)] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def increment(name, value=1, **labels):
+    """Increment a counter."""
+    if not metrics_enabled:
+        return
+    key = (name, label_key(labels))
+    with _lock:
+        _metrics["counters"][key] = _metrics["counters"].get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Set the value of a gauge."""
+    if not metrics_enabled:
+        return
+    with _lock:
+        _metrics["gauges"][(name, label_key(labels))] = value
+
+
+def drain_metrics():
+    """Return the histograms and counters recorded since the last call and reset them (e.g. in a worker process)."""
+    with _lock:
+        drained = {"histograms": _metrics["histograms"], "counters": _metrics["counters"]}
+        _metrics["histograms"], _metrics["counters"] = {}, {}
+    return drained
+
+
+def merge_metrics(drained):
+    """Add the histograms and counters recorded by another process (see drain_metrics)."""
+    if not metrics_enabled or not drained:
+        return
+    with _lock:
+        for key, value in drained["histograms"].items():
+            histogram = _metrics["histograms"].get(key)
+            if histogram is None:
+                histogram = _metrics["histograms"][key] = {"buckets": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+            histogram["buckets"] = [total + count for total, count in zip(histogram["buckets"], value["buckets"])]
+            histogram["sum"] += value["sum"]
+            histogram["count"] += value["count"]
+        for key, value in drained["counters"].items():
+            _metrics["counters"][key] = _metrics["counters"].get(key, 0) + value
+
+
+def counter_total(name, **labels):
+    """Return the sum of the series of a counter that have these labels (every series without labels)."""
+    wanted = set(labels.items())
+    with _lock:
+        return sum(value for (counter_name, key), value in _metrics["counters"].items()
+                   if counter_name == name and wanted <= set(key))
+
+
+@contextlib.contextmanager
+def timed_stage(name):
+    """Time a stage into the stage histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - start, stage=name)
+
+
+def stage(name):
+    """Context manager that times a stage (e.g. "store.read_columnar"), a no-op when the metrics are disabled."""
+    if not metrics_enabled:
+        return _disabled_stage
+    return timed_stage(name)
+
+
+def measured(function_name):
+    """Decorator that times every call of a function, it returns the function unchanged when the metrics are disabled."""
+    def decorator(function):
+        if not metrics_enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe("function_duration_seconds", time.perf_counter() - start, function=function_name)
+
+        return wrapper
+    return decorator
+
+
+def format_labels(labels):
+    """Labels in the Prometheus text format, e.g. {stage="store.read_columnar"}."""
+    if not labels:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for name, value in labels]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    """Number in the Prometheus text format."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """Return every metric in the Prometheus text format (version 0.0.4)."""
+    with _lock:
+        histograms = {key: {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+                      for key, value in _metrics["histograms"].items()}
+        counters = dict(_metrics["counters"])
+        gauges = dict(_metrics["gauges"])
+
+    series = {}
+    for (name, labels), value in counters.items():
+        series.setdefault(name, []).append((labels, value))
+    for (name, labels), value in gauges.items():
+        series.setdefault(name, []).append((labels, value))
+    for (name, labels), value in histograms.items():
+        series.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(series):
+        metric_type, description = definitions.get(name, ("untyped", name))
+        full_name = prefix + name
+        lines.append(f"# HELP {full_name} {description}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+        for labels, value in sorted(series[name], key=lambda item: item[0]):
+            if metric_type != "histogram":
+                lines.append(f"{full_name}{format_labels(labels)} {format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (float("inf"),), value["buckets"]):
+                cumulative += count
+                bucket_labels = labels + (("le", format_value(bound)),)
+                lines.append(f"{full_name}_bucket{format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{full_name}_sum{format_labels(labels)} {format_value(value['sum'])}")
+            lines.append(f"{full_name}_count{format_labels(labels)} {value['count']}")
+
+    return "\n".join(lines) + "\n"
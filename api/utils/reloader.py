@@ -0,0 +1,120 @@
+"""
+This module provides the background reloader of the data and the model.
+
+A thread checks every few seconds if the version of the files on disk changed (the
+version of their manifests). When it changed, the new version is verified and loaded
+next to the live one and swapped in, so the API keeps serving during the reload and
+the requests in progress finish with the version they started with.
+
+The versions used by a request are recorded while it runs (track_versions and
+record_version, called when the dataset or the model is read), so its response
+reports the versions it was computed with, even if a new one was swapped in meanwhile.
+
+Settings (environment variables):
+- RELOAD_INTERVAL: Seconds between two checks, 0 disables the reloader (default 30).
+
+Available Functions:
+- check_components: Reload the components whose files changed.
+- start_reloader: Start the background reloader.
+- stop_reloader: Stop the background reloader.
+- reloader_state: Return the checks, reloads and last error of each component.
+- track_versions: Record the versions of the components used by the current request.
+- record_version: Record the version of a component used by the current request.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from api.utils.metrics import increment
+
+reload_interval = float(os.environ.get("RELOAD_INTERVAL", 30))
+
+_reloader = {"thread": None, "stop": threading.Event(), "components": {}}
+
+# Versions used by the current request, filled by record_version (None outside a request)
+_request_versions = contextvars.ContextVar("request_versions", default=None)
+
+
+def check_components(components):
+    """
+    Reload the components whose files changed. A component that fails keeps its live
+    version and is checked again in the next interval.
+
+    Parameters:
+    - components: A list of (name, function) pairs, the function returns True if it
+                  loaded a new version.
+    """
+    for name, reload in components:
+        state = _reloader["components"].setdefault(name, {"checks": 0, "reloads": 0, "seconds": None,
+                                                          "error": None})
+        state["checks"] += 1
+        start = time.perf_counter()
+        try:
+            reloaded = reload()
+        except Exception as error:
+            state["error"] = f"{type(error).__name__}: {error}"
+            increment("reloads_total", component=name, result="error")
+            continue
+        state["error"] = None
+        if reloaded:
+            state["reloads"] += 1
+            state["seconds"] = round(time.perf_counter() - start, 3)
+            increment("reloads_total", component=name, result="reloaded")
+
+
+def start_reloader(components, interval=reload_interval):
+    """
+    Start the background reloader.
+
+    Parameters:
+    - components: A list of (name, function) pairs, checked in order (see check_components).
+    - interval (optional): Seconds between two checks, 0 doesn't start the reloader.
+    """
+    if _reloader["thread"] is not None or interval <= 0:
+        return _reloader["thread"]
+
+    stop = _reloader["stop"]
+    stop.clear()
+
+    def run():
+        while not stop.wait(interval):
+            check_components(components)
+
+    thread = threading.Thread(target=run, name="reloader", daemon=True)
+    _reloader["thread"] = thread
+    thread.start()
+    return thread
+
+
+def stop_reloader():
+    """Stop the background reloader."""
+    thread = _reloader["thread"]
+    _reloader["thread"] = None
+    if thread is not None:
+        _reloader["stop"].set()
+        thread.join()
+
+
+def reloader_state():
+    """Return the checks, the reloads, the last reload time and the last error of each component."""
+    return {name: dict(state) for name, state in _reloader["components"].items()}
+
+
+def track_versions():
+    """
+    Record the versions of the components used by the current request (and the tasks it starts).
+
+    Returns:
+        versions: A dictionary filled with the version of each component as it's used.
+    """
+    versions = {}
+    _request_versions.set(versions)
+    return versions
+
+
+def record_version(name, version):
+    """Record the version of a component used by the current request, if its versions are tracked."""
+    versions = _request_versions.get()
+    if versions is not None:
+        versions[name] = version
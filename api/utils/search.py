@@ -0,0 +1,145 @@
+"""
+This module provides the search of titles and names by prefix or similar spelling (typeahead).
+
+The entries (a title, actor or director of the indexes of the store) are folded
+with `fold_string`, so the search ignores the case, the accents and diacritics
+(e.g. "ñ", "ü") and the punctuation. The search index is built once with the
+dataset and has two structures:
+- The folded keys sorted, so the entries that start with the query are a range
+  found with a binary search.
+- The postings of every character trigram of the keys (the entries that contain
+  it), so the entries with a similar spelling are scored by the trigrams they
+  share with the query, counted with array operations.
+
+The candidates are ranked by match (exact, prefix, then similar spelling), by the
+similarity of the spelling (Dice coefficient of the trigrams) and by the number of
+movies of the entry.
+
+Available Functions:
+- trigrams: Return the character trigrams of a folded text.
+- build_search_index: Build the search index of a list of entries.
+- search: Return the entries that best match a query.
+"""
+
+import bisect
+import numpy as np
+from api.utils.text import fold_string
+
+# Kinds of entries, in the order of their codes
+kinds = ("titulo", "actor", "director")
+
+# Minimum similarity of the spelling of the entries that don't start with the query
+min_similarity = 0.3
+
+# Bonus of the score of the entries equal to the query and of the entries that start with it
+exact_bonus = 2.0
+prefix_bonus = 1.0
+
+
+def trigrams(key):
+    """Return the character trigrams of a folded text, padded so the start and end of the words count."""
+    padded = f"  {key} "
+    return {padded[idx:idx + 3] for idx in range(len(padded) - 2)}
+
+
+def build_search_index(entries):
+    """
+    Build the search index of a list of entries.
+
+    Parameters:
+    - entries: An iterable of (kind, name, movies) items, kind is one of `kinds`, name the
+               title or name as it's shown and movies the number of movies of the entry.
+
+    Returns:
+        index: A dictionary with the arrays of the entries ("keys", "names", "kinds" and
+               "movies"), the number of trigrams of each key ("lengths"), the "postings"
+               of every trigram and the keys sorted ("sorted_keys", "sorted_entries").
+    """
+    keys, names, entry_kinds, movies = [], [], [], []
+    seen = set()
+    for kind, name, count in entries:
+        key = fold_string(name)
+        if not key or (kind, key) in seen:
+            continue
+        seen.add((kind, key))
+        keys.append(key)
+        names.append(name)
+        entry_kinds.append(kinds.index(kind))
+        movies.append(count)
+
+    postings = {}
+    lengths = np.zeros(len(keys), dtype=np.int32)
+    for entry, key in enumerate(keys):
+        grams = trigrams(key)
+        lengths[entry] = len(grams)
+        for gram in grams:
+            postings.setdefault(gram, []).append(entry)
+
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return {
+        "keys": np.array(keys, dtype=object),
+        "names": np.array(names, dtype=object),
+        "kinds": np.array(entry_kinds, dtype=np.int8),
+        "movies": np.array(movies, dtype=np.int32),
+        "lengths": lengths,
+        "postings": {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()},
+        "sorted_keys": [keys[entry] for entry in order],
+        "sorted_entries": np.array(order, dtype=np.int32),
+    }
+
+
+def search(index, query, limit=10, kind=None):
+    """
+    Return the entries that best match a query.
+
+    Parameters:
+    - index: The search index (see build_search_index).
+    - query: The text typed by the user, complete or the start of it.
+    - limit (optional): Maximum number of entries.
+    - kind (optional): Only return the entries of this kind (one of `kinds`).
+
+    Returns:
+        results: A list of dictionaries with the "name", "kind", "movies" and "score" of each
+                 entry, the best match first.
+    """
+    key = fold_string(query)
+    if not key or limit <= 0:
+        return []
+
+    # Entries that start with the query
+    start = bisect.bisect_left(index["sorted_keys"], key)
+    end = bisect.bisect_left(index["sorted_keys"], key + "\uffff", start)
+    prefix_entries = index["sorted_entries"][start:end]
+
+    # Entries that share trigrams with the query
+    grams = trigrams(key)
+    gram_postings = [index["postings"][gram] for gram in grams if gram in index["postings"]]
+    if gram_postings:
+        shared_entries, shared = np.unique(np.concatenate(gram_postings), return_counts=True)
+    else:
+        shared_entries, shared = np.array([], dtype=np.int32), np.array([], dtype=np.int64)
+
+    entries = np.union1d(prefix_entries, shared_entries).astype(np.int32)
+    shared_all = np.zeros(len(entries), dtype=np.float64)
+    shared_all[np.searchsorted(entries, shared_entries)] = shared
+    similarity = 2 * shared_all / (len(grams) + index["lengths"][entries])
+
+    is_prefix = np.isin(entries, prefix_entries)
+    selected = is_prefix | (similarity >= min_similarity)
+    if kind is not None:
+        selected &= index["kinds"][entries] == kinds.index(kind)
+    entries, similarity, is_prefix = entries[selected], similarity[selected], is_prefix[selected]
+
+    is_exact = index["keys"][entries] == key
+    score = similarity + prefix_bonus * is_prefix + exact_bonus * is_exact
+
+    if len(entries) > limit:
+        # Only the best candidates (and the ones tied with the last of them) are sorted
+        last_score = -np.partition(-score, limit - 1)[limit - 1]
+        best = score >= last_score
+        entries, score = entries[best], score[best]
+    order = np.lexsort((-index["movies"][entries], -score))[:limit]
+
+    return [{"name": index["names"][entry], "kind": kinds[index["kinds"][entry]],
+             "movies": int(index["movies"][entry]), "score": round(float(score[position]), 3)}
+            for position, entry in zip(order, entries[order])]
@@ -0,0 +1,596 @@
+"""
+This module provides the in-memory store with the movies data.
+
+The data is a single dataset with a row per movie, read only once per process and
+kept as typed columns (NumPy arrays) instead of a list of dictionaries per row.
+
+The dataset is read from the binary columnar folder created by the ETL
+("api/data/movies", see validation.save_columnar): the numeric and date columns are
+memory-mapped, so they load instantly and the pages are shared by every worker, and
+the lists are stored natively. The folder is verified against its manifest before
+serving (see artifacts.py). If the folder doesn't exist, the api_data csv files
+are read instead (compatibility loader), they have the same rows in the same order.
+
+Column types:
+- "int" / "float": numeric arrays.
+- "date": datetime64[D] array.
+- "category": int codes, the values are stored in the categories of the dataset.
+- "str": object array with interned strings.
+- "list": lists of strings, stored in the lists of the dataset as "offsets" (start of
+          each row), "values" (code of each item) and "dictionary" (value of each code).
+
+The indexes of the dataset are built when it's loaded. Each index maps a normalized
+title or name to the rows where it appears (posting list), so a lookup doesn't
+normalize any row. Actors and directors are indexed from the cast and crew edge
+tables (movie -> person, job) created by the ETL or from the lists of the dataset,
+so the list columns of the csv files are only evaluated when neither exists.
+The search index (typeahead of titles and names with any spelling) is built from
+the other indexes.
+
+The aggregates of the dataset (e.g. released movies per month, return of each actor
+and director) are also computed when it's loaded.
+
+The dataset keeps the version of the files it was read from (the version of the
+manifest of the columnar folder, or of the csv files).
+When the files change, `reload_store` builds the dataset of the new version next to
+the live one and swaps it in with a single assignment: the requests that already
+have the old dataset finish with it, the next ones get the new one.
+
+Settings (environment variables):
+- API_DATA_DIR: Folder of the data files (default "api/data").
+
+Available Functions:
+- read_columns: Read a csv file into typed columns.
+- read_csv_files: Read the dataset from the api_data csv files.
+- read_columnar: Read the dataset from the binary columnar folder.
+- get_dataset: Return the dataset, loading it the first time.
+- load_store: Load the dataset.
+- verify_store: Verify the binary columnar folder against its manifest.
+- data_version: Version of the loaded dataset.
+- files_version: Version of the data files on disk.
+- reload_store: Load the dataset of a new data version and swap it in.
+- build_index: Build an index from (key, row, name) items.
+- load_edges: Load a cast or crew edge table created by the ETL.
+- person_index: Build an index of persons from an edge table.
+- search_index: Build the search index of titles and names (see search.py).
+- release_aggregates: Count the released movies per month, weekday and year x month.
+- person_aggregates: Aggregate the return of the movies of every person.
+- get_index: Return the rows of a key in an index.
+- category_code: Return the code of a value in a category column.
+"""
+
+import ast
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import numpy as np
+from api.utils.artifacts import read_manifest, verify_manifest
+from api.utils.metrics import stage
+from api.utils.reloader import record_version
+from api.utils.search import build_search_index
+from api.utils.text import normalize_string
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.environ.get("API_DATA_DIR", os.path.join(script_dir, "..", "data"))
+columnar_dir = os.path.join(data_dir, "movies")
+
+# Columns and type of each csv file (compatibility loader)
+schemas = {
+    "api_data12": {"release_date": "date", "status": "category"},
+    "api_data3": {"title": "str", "release_year": "int", "popularity": "float"},
+    "api_data4": {"title": "str", "release_year": "int", "vote_count": "float", "vote_average": "float"},
+    "api_data5": {"id": "int", "return": "float", "actor_name": "str"},
+    "api_data6": {"title": "str", "release_date": "date", "return": "float", "revenue": "float",
+                  "budget": "float", "crew_name": "str", "crew_job": "str"},
+}
+
+_empty_rows = np.array([], dtype=np.int32)
+
+_datasets = {}
+_lock = threading.RLock()
+
+
+def to_column(values, column_type):
+    """Convert a list of csv values to an array of the given type."""
+    if column_type == "float":
+        return np.array([float(value) if value != "" else np.nan for value in values], dtype=np.float64)
+    if column_type == "int":
+        return np.array([int(float(value)) if value != "" else 0 for value in values], dtype=np.int64)
+    if column_type == "date":
+        return np.array([value if value != "" else "NaT" for value in values], dtype="datetime64[D]")
+    if column_type == "category":
+        categories, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+        return codes.astype(np.int32), categories
+    if column_type == "str":
+        return np.array([sys.intern(value) for value in values], dtype=object)
+    raise ValueError(f"Unknown column type: {column_type}")
+
+
+def read_columns(path, schema):
+    """
+    Read a csv file into typed columns.
+
+    Parameters:
+    - path: Path of the csv file.
+    - schema: A dictionary with the name and type of the columns to keep.
+
+    Returns:
+        dataset: A dictionary with the "columns", the "categories" and the number of "rows".
+    """
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        raw_columns = list(zip(*reader))
+
+    dataset = {"columns": {}, "categories": {}, "rows": len(raw_columns[0]) if raw_columns else 0}
+    for column_name, column_type in schema.items():
+        values = raw_columns[header.index(column_name)] if raw_columns else ()
+        column = to_column(values, column_type)
+        if column_type == "category":
+            column, dataset["categories"][column_name] = column
+        dataset["columns"][column_name] = column
+
+    return dataset
+
+
+def read_csv_files(folder=data_dir):
+    """
+    Read the dataset from the api_data csv files.
+    Every file has the same rows in the same order, their columns are joined.
+    """
+    dataset = {"columns": {}, "categories": {}, "lists": {}, "rows": None}
+    for name, schema in schemas.items():
+        file_dataset = read_columns(os.path.join(folder, f"{name}.csv"), schema)
+        if dataset["rows"] is not None and file_dataset["rows"] != dataset["rows"]:
+            raise ValueError(f"{name}.csv doesn't have the same rows as the other files")
+        dataset["rows"] = file_dataset["rows"]
+        dataset["columns"].update(file_dataset["columns"])
+        dataset["categories"].update(file_dataset["categories"])
+    return dataset
+
+
+def decode_strings(data, offsets):
+    """Decode a utf-8 buffer and the offsets of each string into an array of interned strings."""
+    data = np.asarray(data).tobytes()
+    offsets = np.asarray(offsets).tolist()
+    return np.array([sys.intern(data[start:end].decode("utf-8")) for start, end in zip(offsets[:-1], offsets[1:])],
+                    dtype=object)
+
+
+def read_columnar(folder=columnar_dir):
+    """
+    Read the dataset from the binary columnar folder created by the ETL (validation.save_columnar).
+    The numeric, date and list arrays are memory-mapped.
+    """
+    with open(os.path.join(folder, "schema.json"), "r", encoding="utf-8") as file:
+        schema = json.load(file)
+
+    def load(name, mmap_mode="r"):
+        return np.load(os.path.join(folder, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    dataset = {"columns": {}, "categories": {}, "lists": {}, "rows": schema["rows"]}
+    for column_name, column_type in schema["columns"].items():
+        if column_type in ("int", "float", "date"):
+            dataset["columns"][column_name] = load(column_name)
+        elif column_type == "category":
+            dataset["columns"][column_name] = load(column_name)
+            dataset["categories"][column_name] = load(f"{column_name}.categories", None).astype(object)
+        elif column_type == "str":
+            dataset["columns"][column_name] = decode_strings(load(f"{column_name}.bytes"),
+                                                             load(f"{column_name}.offsets"))
+        elif column_type == "list":
+            dataset["lists"][column_name] = {
+                "offsets": load(f"{column_name}.offsets"),
+                "values": load(f"{column_name}.values"),
+                "dictionary": decode_strings(load(f"{column_name}.dictionary.bytes"),
+                                             load(f"{column_name}.dictionary.offsets")),
+            }
+        else:
+            raise ValueError(f"Unknown column type: {column_type}")
+
+    return dataset
+
+
+def build_index(items):
+    """
+    Build an index from (key, row, name) items.
+
+    Returns:
+        index: A dictionary with the "postings" (key -> array of rows) and
+               the "names" (key -> last name found for the key).
+    """
+    postings = {}
+    names = {}
+    for key, row, name in items:
+        postings.setdefault(key, []).append(row)
+        names[key] = name
+
+    postings = {key: np.array(rows, dtype=np.int32) for key, rows in postings.items()}
+    return {"postings": postings, "names": names}
+
+
+def title_items(dataset):
+    """Items of the title index."""
+    for row, title in enumerate(dataset["columns"]["title"]):
+        yield normalize_string(title), row, title
+
+
+def title_index(dataset):
+    """Index of normalized titles."""
+    return build_index(title_items(dataset))
+
+
+def load_edges(name, ids):
+    """
+    Load an edge table created by the ETL (validation.extract_edges and validation.save_edges).
+    The arrays are .npy files of the columnar folder (<name>.<column>.npy), memory-mapped.
+
+    Parameters:
+    - name: Name of the table (e.g. "cast_edges").
+    - ids: The "id" column of the dataset, used to join the movies to the rows.
+
+    Returns:
+        edges: A dictionary with the "movie_row" and "person" of each edge, the "names"
+               of the persons and, for the crew, the "job" codes and the "jobs" names.
+               None if the file doesn't exist.
+    """
+    if not os.path.exists(os.path.join(columnar_dir, f"{name}.movie_id.npy")):
+        return None
+
+    arrays = {}
+    for column_name in ("movie_id", "person_id", "person_ids", "person_names", "job", "jobs"):
+        path = os.path.join(columnar_dir, f"{name}.{column_name}.npy")
+        if os.path.exists(path):
+            arrays[column_name] = np.load(path, mmap_mode="r")
+
+    order = np.argsort(ids, kind="stable")
+    position = np.searchsorted(ids[order], arrays["movie_id"]).clip(0, max(len(ids) - 1, 0))
+    found = (ids[order][position] == arrays["movie_id"]) if len(ids) else np.zeros(len(position), dtype=bool)
+
+    edges = {
+        "movie_row": order[position[found]].astype(np.int32),
+        "person": np.searchsorted(arrays["person_ids"], arrays["person_id"][found]).astype(np.int32),
+        "names": arrays["person_names"].astype(object),
+    }
+    if "job" in arrays:
+        edges["job"] = arrays["job"][found]
+        edges["jobs"] = arrays["jobs"]
+    return edges
+
+
+def edges_from_columns(dataset, names_column, jobs_column=None):
+    """
+    Build the edges from the list columns of the csv files, when the ETL didn't create them.
+    The lists are evaluated only once, when the dataset is loaded.
+    """
+    columns = dataset["columns"]
+    movie_rows = []
+    persons = []
+    jobs = []
+    person_codes = {}
+
+    with stage("store.literal_eval"):
+        for row, names in enumerate(columns[names_column]):
+            names = ast.literal_eval(names)
+            row_jobs = ast.literal_eval(columns[jobs_column][row]) if jobs_column else names
+            for name, job in zip(names, row_jobs):
+                movie_rows.append(row)
+                persons.append(person_codes.setdefault(name, len(person_codes)))
+                jobs.append(job)
+
+    edges = {
+        "movie_row": np.array(movie_rows, dtype=np.int32),
+        "person": np.array(persons, dtype=np.int32),
+        "names": np.array(list(person_codes), dtype=object),
+    }
+    if jobs_column:
+        edges["jobs"], edges["job"] = np.unique(np.array(jobs, dtype=object), return_inverse=True)
+    return edges
+
+
+def edges_from_lists(dataset, names_column, jobs_column=None):
+    """Build the edges from the lists of the binary columnar dataset, without evaluating any text."""
+    names = dataset["lists"][names_column]
+    offsets = np.asarray(names["offsets"])
+
+    edges = {
+        "movie_row": np.repeat(np.arange(dataset["rows"], dtype=np.int32), np.diff(offsets)),
+        "person": np.asarray(names["values"]),
+        "names": names["dictionary"],
+    }
+    if jobs_column:
+        jobs = dataset["lists"][jobs_column]
+        edges["job"] = np.asarray(jobs["values"])
+        edges["jobs"] = jobs["dictionary"]
+    return edges
+
+
+def dataset_edges(dataset, name, names_column, jobs_column=None):
+    """Edges of the cast or crew: from the ETL edge table, the lists of the dataset or the csv files."""
+    edges = load_edges(name, dataset["columns"]["id"])
+    if edges is not None:
+        return edges
+    if names_column in dataset["lists"]:
+        return edges_from_lists(dataset, names_column, jobs_column)
+    return edges_from_columns(dataset, names_column, jobs_column)
+
+
+def person_index(edges, job=None):
+    """
+    Index of normalized person names, built with array operations over the edges.
+    Each name is normalized once, not once per movie.
+
+    Besides the postings, the index keeps the rows grouped by person ("rows"), the
+    group of each key ("slots") and where each group "starts" and "ends", so the
+    aggregates of every person can be computed at once.
+    """
+    movie_rows = edges["movie_row"]
+    persons = edges["person"]
+    if job is not None:
+        job_codes = np.flatnonzero(edges["jobs"] == job)
+        selected = np.isin(edges["job"], job_codes)
+        movie_rows = movie_rows[selected]
+        persons = persons[selected]
+
+    index = {"postings": {}, "names": {}, "slots": {}, "rows": _empty_rows,
+             "starts": _empty_rows, "ends": _empty_rows}
+    if len(persons) == 0:
+        return index
+
+    with stage("store.normalize"):
+        keys = np.array([normalize_string(name) for name in edges["names"]], dtype=object)
+    unique_keys, key_codes = np.unique(keys, return_inverse=True)
+
+    # Group the edges by key, keeping the order of the movies
+    edge_keys = key_codes[persons]
+    order = np.argsort(edge_keys, kind="stable")
+    edge_keys = edge_keys[order]
+    movie_rows = movie_rows[order]
+    persons = persons[order]
+
+    starts = np.flatnonzero(np.r_[True, edge_keys[1:] != edge_keys[:-1]])
+    ends = np.r_[starts[1:], len(edge_keys)]
+    for slot, (start, end) in enumerate(zip(starts, ends)):
+        key = unique_keys[edge_keys[start]]
+        index["postings"][key] = movie_rows[start:end]
+        index["names"][key] = edges["names"][persons[end - 1]]
+        index["slots"][key] = slot
+
+    index.update({"rows": movie_rows, "starts": starts, "ends": ends})
+    return index
+
+
+def actor_index(dataset):
+    """Index of actors, a row for each time the actor appears in the cast."""
+    return person_index(dataset_edges(dataset, "cast_edges", "actor_name"))
+
+
+def director_index(dataset):
+    """Index of directors, only crew members with the "Director" job."""
+    return person_index(dataset_edges(dataset, "crew_edges", "crew_name", "crew_job"), "Director")
+
+
+def search_entries(dataset):
+    """Entries of the search index: the titles, actors and directors of the other indexes."""
+    for kind, index_name in (("titulo", "title"), ("actor", "actor"), ("director", "director")):
+        index = dataset["indexes"][index_name]
+        for key, name in index["names"].items():
+            yield kind, name, len(index["postings"][key])
+
+
+def search_index(dataset):
+    """Search index of titles and names by prefix or similar spelling (see search.py)."""
+    return build_search_index(search_entries(dataset))
+
+
+# Indexes of the dataset, "search" is built from the previous ones
+index_builders = {
+    "title": title_index,
+    "actor": actor_index,
+    "director": director_index,
+    "search": search_index,
+}
+
+def release_aggregates(dataset):
+    """
+    Count the released movies per month, weekday and year x month.
+
+    Returns:
+        aggregates: A dictionary with the counts:
+            "month": array indexed by month number (1 = January).
+            "weekday": array indexed by ISO weekday (1 = Monday, 7 = Sunday).
+            "year_month": array (years x 13) indexed by [year - first_year, month].
+            "first_year": year of the first row of "year_month".
+    """
+    columns = dataset["columns"]
+    release_date = columns["release_date"]
+    released = (columns["status"] == category_code(dataset, "status", "Released")) & ~np.isnat(release_date)
+    release_date = release_date[released]
+
+    months = release_date.astype("datetime64[M]").astype(np.int64)
+    month = months % 12 + 1
+    year = months // 12 + 1970
+    # 1970-01-01 was a Thursday (ISO weekday 4)
+    weekday = (release_date.astype(np.int64) + 3) % 7 + 1
+
+    first_year = int(year.min()) if len(year) else 0
+    num_years = int(year.max()) - first_year + 1 if len(year) else 0
+    year_month = np.zeros((num_years, 13), dtype=np.int64)
+    np.add.at(year_month, (year - first_year, month), 1)
+
+    return {
+        "month": np.bincount(month, minlength=13),
+        "weekday": np.bincount(weekday, minlength=8),
+        "year_month": year_month,
+        "first_year": first_year,
+    }
+
+
+def person_aggregates(dataset, index_name, vector_columns=()):
+    """
+    Aggregate the return of the movies of every person of an index.
+
+    Parameters:
+    - dataset: The dataset with the "return" column and the index.
+    - index_name: Name of a person index (see person_index).
+    - vector_columns (optional): Columns to keep for each movie, in the order of the index.
+
+    Returns:
+        aggregates: A dictionary with an array per person ("return_total", "movies_total",
+                    "return_average", indexed by the slot of the person) and the
+                    "vectors" of each movie, sliced with the "starts" and "ends" of the index.
+    """
+    index = dataset["indexes"][index_name]
+    columns = dataset["columns"]
+    rows = index["rows"]
+    starts = index["starts"]
+
+    returns = columns["return"][rows]
+    return_total = np.add.reduceat(returns, starts) if len(rows) else np.zeros(0)
+    movies_total = index["ends"] - starts
+
+    vectors = {}
+    for column_name in vector_columns:
+        vector = columns[column_name][rows]
+        if np.issubdtype(vector.dtype, np.datetime64):
+            vector = np.datetime_as_string(vector).astype(object)
+        vectors[column_name] = vector
+
+    return {
+        "return_total": return_total,
+        "movies_total": movies_total,
+        "return_average": return_total / np.maximum(movies_total, 1),
+        "vectors": vectors,
+    }
+
+
+# Columns of each movie of a person, kept in the order of the index so a person is a slice
+person_vector_columns = ["title", "release_date", "return", "budget", "revenue"]
+
+# Aggregates of the dataset
+aggregate_builders = {
+    "release": release_aggregates,
+    "actor": lambda dataset: person_aggregates(dataset, "actor", person_vector_columns),
+    "director": lambda dataset: person_aggregates(dataset, "director", person_vector_columns),
+}
+
+# Columns only needed to build the indexes
+index_columns = ["actor_name", "crew_name", "crew_job"]
+
+
+def get_index(dataset, index_name, key):
+    """Return the rows of a key in an index of the dataset."""
+    return dataset["indexes"][index_name]["postings"].get(key, _empty_rows)
+
+
+def read_dataset():
+    """Read the dataset from the binary columnar folder, or from the csv files if it doesn't exist."""
+    if os.path.exists(os.path.join(columnar_dir, "schema.json")):
+        with stage("store.read_columnar"):
+            return read_columnar(columnar_dir)
+    with stage("store.read_csv_files"):
+        return read_csv_files(data_dir)
+
+
+def build_dataset():
+    """Read the dataset and build its indexes and aggregates."""
+    version = files_version()
+    dataset = read_dataset()
+    dataset["version"] = version
+    dataset["indexes"] = {}
+    for index_name, builder in index_builders.items():
+        with stage(f"store.index.{index_name}"):
+            dataset["indexes"][index_name] = builder(dataset)
+    dataset["aggregates"] = {}
+    for aggregate_name, builder in aggregate_builders.items():
+        with stage(f"store.aggregates.{aggregate_name}"):
+            dataset["aggregates"][aggregate_name] = builder(dataset)
+    for column_name in index_columns:
+        dataset["columns"].pop(column_name, None)
+    return dataset
+
+
+def get_dataset():
+    """Return the live dataset, reading it and building its indexes only the first time."""
+    dataset = _datasets.get("movies")
+    if dataset is None:
+        with _lock:
+            dataset = _datasets.get("movies")
+            if dataset is None:
+                dataset = build_dataset()
+                _datasets["movies"] = dataset
+    record_version("store", dataset["version"])
+    return dataset
+
+
+def files_version():
+    """
+    Version of the data files on disk: the version of the manifest of the columnar folder,
+    which covers the edge tables, or the name, size and modification time of the csv files.
+    """
+    manifest = read_manifest(columnar_dir)
+    if manifest is not None:
+        return manifest["version"]
+    stats = []
+    for name in sorted(os.listdir(data_dir)):
+        if name.endswith(".csv"):
+            stat = os.stat(os.path.join(data_dir, name))
+            stats.append((name, stat.st_size, stat.st_mtime_ns))
+    return hashlib.sha1(repr(stats).encode("utf-8")).hexdigest()[:12]
+
+
+def data_version():
+    """Version of the live dataset."""
+    return get_dataset()["version"]
+
+
+def reload_store():
+    """
+    Load the dataset of a new data version next to the live one and swap it in.
+    The new files are verified against their manifest first.
+
+    Returns:
+        True if a new version was loaded, False if the live dataset is up to date
+        (or not loaded yet).
+    """
+    live = _datasets.get("movies")
+    if live is None or live["version"] == files_version():
+        return False
+
+    with _lock:
+        verify_store()
+        with stage("store.reload"):
+            dataset = build_dataset()
+        _datasets["movies"] = dataset
+    return True
+
+
+def load_store():
+    """Load the dataset, so no request has to read a file."""
+    return get_dataset()
+
+
+def verify_store():
+    """
+    Verify the binary columnar folder against its manifest, before serving.
+    The csv files of the compatibility loader don't have a manifest.
+
+    Returns:
+        manifest: The manifest of the folder, None if the folder doesn't exist.
+    """
+    if not os.path.exists(os.path.join(columnar_dir, "schema.json")):
+        return None
+    with stage("store.verify"):
+        return verify_manifest(columnar_dir)
+
+
+def category_code(dataset, column_name, value):
+    """Return the code of a value in a category column, -1 if it doesn't exist."""
+    categories = dataset["categories"][column_name]
+    idx = np.searchsorted(categories, value)
+    if idx < len(categories) and categories[idx] == value:
+        return int(idx)
+    return -1
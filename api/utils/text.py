@@ -0,0 +1,29 @@
+"""Text functions shared by the store and the helpers."""
+
+import re
+import unicodedata
+
+# Letters without a decomposition in Unicode (NFKD doesn't remove their stroke)
+unfoldable_letters = str.maketrans({"ł": "l", "ø": "o", "đ": "d", "ħ": "h", "ı": "i", "æ": "ae", "œ": "oe",
+                                    "þ": "th", "ð": "d"})
+
+non_alphanumeric = re.compile(r"[\W_]+")
+
+
+def normalize_string(string) -> str:
+    """Normalize the text"""
+    string = string.lower().replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ó', 'o').replace('ú', 'u')
+    string = string.replace(" ", "-")
+    return string
+
+
+def fold_string(string) -> str:
+    """
+    Fold the text for the search: lowercase, without accents or diacritics (e.g. "ñ" -> "n",
+    "ü" -> "u", "ß" -> "ss") and only letters and digits separated by a single space.
+    """
+    string = string.casefold()
+    if not string.isascii():
+        decomposed = unicodedata.normalize("NFKD", string.translate(unfoldable_letters))
+        string = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return non_alphanumeric.sub(" ", string).strip()
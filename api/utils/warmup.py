@@ -0,0 +1,82 @@
+"""
+This module provides the warm-up of the API.
+
+The components of the API (e.g. the data store, the recommendation model, the
+process pool) are loaded in a background thread when the API starts, so the
+process accepts connections right away. The state and the load time of each
+component are kept, so a readiness endpoint can report them and the endpoints can
+refuse the requests until the components they need are ready.
+
+Component states: "pending", "loading", "ready" and "failed".
+
+Settings (environment variables):
+- WARMUP_WAIT: "1" makes the startup wait until every component is loaded (default "0").
+
+Available Functions:
+- start_warmup: Load the components in a background thread.
+- is_ready: Check if the given components are ready.
+- readiness: Return the state and the load time of every component.
+"""
+
+import os
+import threading
+import time
+
+warmup_wait = os.environ.get("WARMUP_WAIT", "0") == "1"
+
+_warmup = {"components": {}, "thread": None}
+
+
+def load_components(components):
+    """Load the components in order. A component that fails doesn't stop the next ones."""
+    for name, function in components:
+        component = _warmup["components"][name]
+        component["state"] = "loading"
+        start = time.perf_counter()
+        try:
+            function()
+        except Exception as error:
+            component.update({"state": "failed", "error": f"{type(error).__name__}: {error}"})
+        else:
+            component["state"] = "ready"
+        component["seconds"] = round(time.perf_counter() - start, 3)
+
+
+def start_warmup(components, wait=warmup_wait):
+    """
+    Load the components in a background thread.
+
+    Parameters:
+    - components: A list of (name, function) pairs, loaded in order.
+    - wait (optional): Wait until every component is loaded.
+
+    Returns:
+        thread: The thread of the warm-up.
+    """
+    if _warmup["thread"] is not None:
+        return _warmup["thread"]
+
+    for name, _ in components:
+        _warmup["components"][name] = {"state": "pending", "seconds": None, "error": None}
+
+    thread = threading.Thread(target=load_components, args=(components,), name="warmup", daemon=True)
+    _warmup["thread"] = thread
+    thread.start()
+    if wait:
+        thread.join()
+    return thread
+
+
+def is_ready(*names):
+    """Check if the given components (every component by default) are ready."""
+    components = _warmup["components"]
+    names = names or tuple(components)
+    return bool(components) and all(components.get(name, {}).get("state") == "ready" for name in names)
+
+
+def readiness():
+    """Return if the API is ready, and the state and the load time (in seconds) of every component."""
+    return {
+        "ready": is_ready(),
+        "components": {name: dict(component) for name, component in _warmup["components"].items()},
+    }
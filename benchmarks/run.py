@@ -0,0 +1,324 @@
+"""
+Benchmarks of the helpers, the recommender and the endpoints of the API.
+
+The benchmarks run over synthetic data (see synthetic.py), so they don't need the
+Git LFS data, and print the results as JSON to compare runs:
+- helpers: the time of the first call of each helper in a fresh state ("cold", it
+  includes loading the data or the model), the time of the next calls with the cache
+  cleared ("warm") and with the result in the cache ("cached").
+- ann_recall: with --ann-lists, the recall@k and the latency of the approximate
+  index of the recommender for each number of probed lists.
+- endpoints: the API is driven in-process with concurrent clients, the latency
+  percentiles, the throughput and the errors of each endpoint are measured.
+- peak RSS of the process and of the workers of the process pool.
+
+Usage (from the root of the repository):
+    python -m benchmarks.run [--rows 45000] [--repeat 50] [--clients 8] [--requests 400] [--output results.json]
+
+Available Functions:
+- summarize: Return the percentiles of a list of times.
+- benchmark_helpers: Time each helper cold, warm and cached.
+- benchmark_endpoints: Drive the endpoints with concurrent clients.
+- run_benchmarks: Generate the data, build the model and run every benchmark.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+months = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre",
+          "octubre", "noviembre", "diciembre"]
+days = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+
+
+def summarize(times):
+    """Return the number of samples, the mean and the percentiles (in milliseconds) of a list of times in seconds."""
+    if not times:
+        return {"n": 0}
+    milliseconds = np.asarray(times) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"n": len(times), "mean_ms": round(float(milliseconds.mean()), 4), "p50_ms": round(float(p50), 4),
+            "p95_ms": round(float(p95), 4), "p99_ms": round(float(p99), 4),
+            "max_ms": round(float(milliseconds.max()), 4)}
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident memory, in MB, of the process or of its finished children."""
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def timed(function, *args):
+    """Call a function and return the elapsed seconds."""
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def reset_state():
+    """Unload the data, the model and the cache, as in a new process."""
+    from api.utils import store
+    from api.utils.cache import clear_cache
+    from ML_model import model
+
+    store._datasets.clear()
+    model._model.clear()
+    clear_cache()
+
+
+def sample_queries(rng, count):
+    """Sample titles, actors and directors of the loaded data, with some misses."""
+    from api.utils.store import get_dataset
+
+    dataset = get_dataset()
+    titles = dataset["columns"]["title"]
+    actors = list(dataset["indexes"]["actor"]["names"].values())
+    directors = list(dataset["indexes"]["director"]["names"].values())
+
+    def sample(values):
+        values = [values[idx] for idx in rng.integers(0, len(values), count)] if len(values) else []
+        return values + ["no existe"]
+
+    return {"title": sample(titles), "actor": sample(actors), "director": sample(directors)}
+
+
+def helper_cases(queries):
+    """(name, function, queries) of every helper and of the recommender."""
+    from api.utils import helpers
+    from ML_model.model import movie_recommendation
+
+    return [
+        ("count_movies_released_month", helpers.count_movies_released_month, months),
+        ("count_movies_released_day", helpers.count_movies_released_day, days),
+        ("count_movies_released_year", helpers.count_movies_released_year, list(range(1920, 2020))),
+        ("movie_popularity", helpers.movie_popularity, queries["title"]),
+        ("movie_vote", helpers.movie_vote, queries["title"]),
+        ("actor_info", helpers.actor_info, queries["actor"]),
+        ("director_info", helpers.director_info, queries["director"]),
+        ("search_names", helpers.search_names, [name[:5] for name in queries["actor"] + queries["title"]]),
+        ("movie_recommendation", movie_recommendation, queries["title"]),
+        ("movie_recommendation_scan", lambda title: movie_recommendation(title, 50), queries["title"]),
+    ]
+
+
+def benchmark_helpers(queries, repeat=50):
+    """
+    Time each helper cold, warm and cached.
+
+    Parameters:
+    - queries: The titles, actors and directors (sample_queries).
+    - repeat (optional): Number of warm and cached calls of each helper.
+
+    Returns:
+        A dictionary with the "cold_ms" time and the "warm" and "cached" summaries of each helper.
+    """
+    from api.utils.cache import clear_cache
+
+    results = {}
+    for name, function, values in helper_cases(queries):
+        reset_state()
+        cold = timed(function, values[0])
+
+        warm = []
+        cached = []
+        for idx in range(repeat):
+            value = values[idx % len(values)]
+            clear_cache()
+            warm.append(timed(function, value))
+            cached.append(timed(function, value))
+
+        results[name] = {"cold_ms": round(cold * 1000, 4), "warm": summarize(warm), "cached": summarize(cached)}
+    return results
+
+
+def endpoint_cases(queries):
+    """(name, method, function that returns the path and the body of a request) of every endpoint."""
+    def pick(values):
+        return lambda rng: values[rng.integers(0, len(values))]
+
+    title, actor, director = pick(queries["title"]), pick(queries["actor"]), pick(queries["director"])
+    month, day = pick(months), pick(days)
+
+    def batch(values):
+        return lambda rng: {"consultas": [values(rng) for _ in range(20)]}
+
+    return [
+        ("/cantidad_filmaciones_mes", "GET", lambda rng: (f"/cantidad_filmaciones_mes/{month(rng)}", None)),
+        ("/cantidad_filmaciones_dia", "GET", lambda rng: (f"/cantidad_filmaciones_dia/{day(rng)}", None)),
+        ("/cantidad_filmaciones_anio", "GET",
+         lambda rng: (f"/cantidad_filmaciones_anio/{rng.integers(1920, 2020)}", None)),
+        ("/score_titulo", "GET", lambda rng: (f"/score_titulo/{title(rng)}", None)),
+        ("/votos_titulo", "GET", lambda rng: (f"/votos_titulo/{title(rng)}", None)),
+        ("/get_actor", "GET", lambda rng: (f"/get_actor/{actor(rng)}", None)),
+        ("/get_director", "GET", lambda rng: (f"/get_director/{director(rng)}", None)),
+        ("/buscar", "GET", lambda rng: (f"/buscar/{actor(rng)[:5]}", None)),
+        ("/recomendacion", "GET", lambda rng: (f"/recomendacion/{title(rng)}", None)),
+        ("/recomendacion?cantidad=50", "GET", lambda rng: (f"/recomendacion/{title(rng)}?cantidad=50", None)),
+        ("/recomendacion?peso_generos=2", "GET",
+         lambda rng: (f"/recomendacion/{title(rng)}?peso_generos=2", None)),
+        ("/recomendacion?anio_desde=2000&votos_minimos=100", "GET",
+         lambda rng: (f"/recomendacion/{title(rng)}?anio_desde=2000&votos_minimos=100", None)),
+        ("/score_titulos (20)", "POST", lambda rng: ("/score_titulos", batch(title)(rng))),
+        ("/recomendaciones (20)", "POST", lambda rng: ("/recomendaciones", batch(title)(rng))),
+        ("/ready", "GET", lambda rng: ("/ready", None)),
+    ]
+
+
+async def drive_endpoint(client, method, request, clients, requests, seed):
+    """Send the requests of an endpoint with concurrent clients, return the latencies, the errors and the time."""
+    latencies = []
+    errors = 0
+
+    async def run_client(idx_client):
+        nonlocal errors
+        rng = np.random.default_rng([seed, idx_client])
+        for _ in range(requests // clients):
+            path, body = request(rng)
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(idx_client) for idx_client in range(clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def benchmark_endpoints(queries, clients=8, requests=400, seed=0):
+    """
+    Drive the endpoints of the API in-process with concurrent clients.
+
+    Parameters:
+    - queries: The titles, actors and directors (sample_queries).
+    - clients (optional): Number of concurrent clients.
+    - requests (optional): Number of requests to each endpoint, split between the clients.
+    - seed (optional): Seed of the random requests.
+
+    Returns:
+        A dictionary with the latency summary, the throughput (requests per second) and the errors of each endpoint.
+    """
+    import httpx
+    import main
+
+    reset_state()
+    main.warm_up()
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name, method, request in endpoint_cases(queries):
+            latencies, errors, elapsed = await drive_endpoint(client, method, request, clients, requests, seed)
+            results[name] = {**summarize(latencies), "throughput_rps": round(len(latencies) / elapsed, 1),
+                             "errors": errors}
+
+    main.stop_workers()
+    return results
+
+
+def git_commit():
+    """Commit of the repository, to identify the run."""
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root_dir, capture_output=True,
+                                text=True, check=True)
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(folder, rows=45000, seed=0, repeat=50, clients=8, requests=400, output_format="columnar",
+                   ann_lists=0):
+    """
+    Generate the synthetic data, build the model and run every benchmark.
+
+    Parameters:
+    - folder: Folder of the synthetic data and the model artifacts.
+    - rows, seed (optional): Size and seed of the synthetic data.
+    - repeat (optional): Number of warm and cached calls of each helper.
+    - clients, requests (optional): Concurrent clients and requests to each endpoint.
+    - output_format (optional): Format of the API data, "columnar" or "csv".
+    - ann_lists (optional): Lists of the approximate index of the model, 0 uses the exact search. With an
+                            index, the recommender runs with RECOMMEND_MODE=ann and its recall is measured.
+
+    Returns:
+        results: A dictionary that can be saved as JSON.
+    """
+    data_dir = os.path.join(folder, "api", "data")
+    model_data_dir = os.path.join(folder, "ML_model", "data")
+    artifacts_dir = os.path.join(folder, "ML_model", "artifacts")
+
+    # The modules of the API read the folders when they are imported
+    os.environ["API_DATA_DIR"] = data_dir
+    os.environ["MODEL_ARTIFACTS_DIR"] = artifacts_dir
+    os.environ["WARMUP_WAIT"] = "1"
+    if ann_lists:
+        os.environ["RECOMMEND_MODE"] = "ann"
+    sys.path.insert(0, root_dir)
+
+    from benchmarks.synthetic import generate_movies, write_dataset
+    from ML_model.model import ann_recall, build_model, read_model
+
+    start = time.perf_counter()
+    write_dataset(generate_movies(rows, seed), data_dir, model_data_dir, output_format)
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_model(os.path.join(model_data_dir, "overview.csv"), artifacts_dir, ann_lists=ann_lists)
+    build_seconds = time.perf_counter() - start
+
+    queries = sample_queries(np.random.default_rng(seed), 200)
+
+    results = {
+        "config": {"rows": rows, "seed": seed, "format": output_format, "repeat": repeat, "clients": clients,
+                   "requests": requests, "ann_lists": ann_lists, "commit": git_commit(),
+                   "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "setup": {"generate_seconds": round(generate_seconds, 3), "build_model_seconds": round(build_seconds, 3)},
+        "helpers": benchmark_helpers(queries, repeat),
+        "endpoints": asyncio.run(benchmark_endpoints(queries, clients, requests, seed)),
+    }
+    if ann_lists:
+        results["ann_recall"] = ann_recall(read_model(artifacts_dir))
+    results["peak_rss_mb"] = {"process": peak_rss_mb(), "pool_workers": peak_rss_mb(resource.RUSAGE_CHILDREN)}
+    return results
+
+
+def main():
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark the helpers, the recommender and the endpoints.")
+    parser.add_argument("--rows", type=int, default=45000, help="Number of synthetic movies.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data and the requests.")
+    parser.add_argument("--format", default="columnar", choices=["csv", "columnar"], help="Format of the API data.")
+    parser.add_argument("--repeat", type=int, default=50, help="Number of warm and cached calls of each helper.")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent clients.")
+    parser.add_argument("--requests", type=int, default=400, help="Number of requests to each endpoint.")
+    parser.add_argument("--folder", default=None, help="Folder of the synthetic data (a temporary folder by default).")
+    parser.add_argument("--ann-lists", type=int, default=0,
+                        help="Lists of the approximate index of the model, 0 uses the exact search.")
+    parser.add_argument("--output", default=None, help="Path of the JSON results (stdout by default).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="movies-benchmark-") as temp_dir:
+        results = run_benchmarks(args.folder or temp_dir, args.rows, args.seed, args.repeat, args.clients,
+                                 args.requests, args.format, args.ann_lists)
+
+    text = json.dumps(results, indent=1)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
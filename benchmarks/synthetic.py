@@ -0,0 +1,174 @@
+"""
+This module generates synthetic movies data with the same schema as the output of
+the data transformation, so the benchmarks run without the Git LFS data.
+
+The columns and files are the ones of "Data transformation/pipeline.py": the
+api_data csv files, the "overview.csv", "genre.csv" and "collections.csv" files of
+the model and, with the "columnar" format, the binary columnar folder and the cast
+and crew edge tables of the API. The values are random but reproducible (seed):
+the persons, the words of the overviews and the genres follow a Zipf distribution,
+like the real credits and texts.
+
+Usage (from the root of the repository):
+    python -m benchmarks.synthetic <folder> [--rows 45000] [--seed 0] [--format columnar]
+
+Available Functions:
+- generate_movies: Generate a DataFrame of synthetic movies.
+- write_dataset: Write the data files of the API and the model.
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root_dir, "Data transformation"))
+
+import pipeline  # noqa: E402
+from utils import validation  # noqa: E402
+
+title_words = ["love", "war", "space", "night", "city", "king", "queen", "dream", "ghost", "river", "star",
+               "dead", "last", "secret", "story", "game", "road", "heart", "blood", "summer", "winter",
+               "canción", "corazón", "mañana", "niño", "über", "café", "amélie", "el", "la", "the", "of",
+               "return", "rise", "fall", "man", "woman", "island", "house", "fire", "ice", "shadow"]
+first_names = ["Tom", "Ana", "José", "María", "Sofía", "Iñigo", "Zoë", "Peter", "Jean", "Luc", "Kate",
+               "Ángel", "Renée", "Björn", "Chloé", "Raúl", "Mia", "John", "Hugh", "Penélope"]
+last_names = ["Hanks", "López", "Müller", "Núñez", "Smith", "Ríos", "Doe", "Brown", "Cruz", "Dupont",
+              "García", "Jackman", "Søren", "Ferrer", "Lee", "Martín", "Jones", "Kim", "Rossi", "Weber"]
+crew_jobs = ["Producer", "Screenplay", "Editor", "Original Music Composer", "Director of Photography"]
+statuses = ["Released"] * 18 + ["Rumored", "Post Production"]
+genres = ["Drama", "Comedy", "Thriller", "Romance", "Action", "Horror", "Crime", "Documentary", "Adventure",
+          "Science Fiction", "Family", "Mystery", "Fantasy", "Animation", "Foreign", "Music", "History", "War",
+          "Western", "TV Movie"]
+
+
+def person_names(count):
+    """Names of the persons, "first last" and a number when the combinations run out."""
+    names = [f"{first} {last}" for last in last_names for first in first_names]
+    return [names[idx % len(names)] + (f" {idx // len(names)}" if idx >= len(names) else "")
+            for idx in range(count)]
+
+
+def zipf_sample(rng, sizes, count, exponent):
+    """
+    Sample indexes in [0, count) with a Zipf-like distribution (weight 1 / rank ** exponent),
+    a list of indexes for each size.
+    """
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    values = rng.choice(count, int(np.sum(sizes)), p=weights / weights.sum())
+    return np.split(values, np.cumsum(sizes)[:-1])
+
+
+def generate_movies(rows=45000, seed=0):
+    """
+    Generate a DataFrame of synthetic movies.
+
+    Parameters:
+    - rows (optional): Number of movies.
+    - seed (optional): Seed of the random values.
+
+    Returns:
+        movies: DataFrame with the columns of the API ("pipeline.api_schema"), the person ids
+                of the cast and crew, the "overview", the "movie_genres" and the "collection_name".
+    """
+    rng = np.random.default_rng(seed)
+    persons = person_names(max(rows * 2, 400))
+    syllables = ["ka", "lo", "mi", "ne", "su", "ta", "ri", "ve"]
+    vocabulary = [f"{a}{b}{c}{d}" for a in syllables for b in syllables for c in syllables
+                  for d in ["n", "s", "r", "l", "t", "", "x", "m"]]
+
+    title_lengths = rng.integers(1, 5, rows)
+    release_dates = (np.datetime64("1920-01-01") + rng.integers(0, 100 * 365, rows)).astype("datetime64[D]")
+    budgets = np.where(rng.random(rows) < 0.6, 0.0, rng.integers(1, 200, rows) * 1e6)
+    revenues = np.where(rng.random(rows) < 0.6, 0.0, rng.integers(1, 900, rows) * 1e6)
+
+    actor_ids = [sorted(set(movie.tolist())) for movie in
+                 zipf_sample(rng, rng.integers(0, 12, rows), len(persons), 0.6)]
+    crew_ids = [sorted(set(movie.tolist())) for movie in
+                zipf_sample(rng, rng.integers(1, 7, rows), len(persons), 0.6)]
+    overview_words = zipf_sample(rng, rng.integers(10, 60, rows), len(vocabulary), 1.0)
+    movie_genres = [sorted(set(genres[genre] for genre in movie))
+                    for movie in zipf_sample(rng, rng.integers(0, 4, rows), len(genres), 1.0)]
+    # A tenth of the movies belong to a collection (a saga)
+    collections = np.where(rng.random(rows) < 0.1, rng.integers(0, max(rows // 30, 1), rows), -1)
+
+    titles = [" ".join(word.capitalize() for word in rng.choice(title_words, length)) for length in title_lengths]
+    jobs = [["Director"] + rng.choice(crew_jobs, len(movie) - 1).tolist() for movie in crew_ids]
+    overviews = [" ".join(vocabulary[word] for word in words) for words in overview_words]
+
+    movies = pd.DataFrame({
+        "id": np.arange(1, rows + 1, dtype=np.int64) * 7,
+        "title": titles,
+        "release_date": pd.to_datetime(release_dates),
+        "release_year": release_dates.astype("datetime64[Y]").astype(int) + 1970,
+        "status": rng.choice(statuses, rows),
+        "popularity": np.round(rng.exponential(3.0, rows), 6),
+        "vote_count": np.floor(rng.pareto(1.2, rows) * 50),
+        "vote_average": np.round(rng.uniform(0, 10, rows), 1),
+        "revenue": revenues,
+        "budget": budgets,
+        "actor_id": actor_ids,
+        "actor_name": [[persons[person] for person in movie] for movie in actor_ids],
+        "crew_id": crew_ids,
+        "crew_name": [[persons[person] for person in movie] for movie in crew_ids],
+        "crew_job": jobs,
+        "overview": overviews,
+        "movie_genres": movie_genres,
+        "collection_name": [[f"{title_words[collection % len(title_words)].capitalize()} {collection} Collection"]
+                            if collection >= 0 else [] for collection in collections],
+    })
+    movies["return"] = np.where((movies["revenue"] > 0) & (movies["budget"] > 0),
+                                movies["revenue"] / movies["budget"].where(movies["budget"] > 0, 1), 0.0)
+    return movies
+
+
+def write_dataset(movies, data_dir, model_data_dir, output_format="columnar"):
+    """
+    Write the data files of the API and the model, as the pipeline does.
+
+    Parameters:
+    - movies: DataFrame created by generate_movies.
+    - data_dir: Folder of the API data.
+    - model_data_dir: Folder of "overview.csv", "genre.csv" and "collections.csv".
+    - output_format (optional): "csv" writes the api_data csv files, "columnar" also writes
+                                the binary columnar folder and the edge tables.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(model_data_dir, exist_ok=True)
+
+    for name, columns in pipeline.api_files.items():
+        movies[columns].to_csv(os.path.join(data_dir, f"{name}.csv"), index=False)
+    movies[pipeline.overview_columns].to_csv(os.path.join(model_data_dir, "overview.csv"), index=False)
+    for name, columns in pipeline.label_files.items():
+        pipeline.with_labels(movies, columns[-1])[columns].to_csv(os.path.join(model_data_dir, f"{name}.csv"),
+                                                                   index=False)
+
+    if output_format == "columnar":
+        validation.save_edges(validation.extract_edges(movies, "id", "actor_name", "actor_id"),
+                              os.path.join(data_dir, "movies"), "cast_edges")
+        validation.save_edges(validation.extract_edges(movies, "id", "crew_name", "crew_id", "crew_job"),
+                              os.path.join(data_dir, "movies"), "crew_edges")
+        validation.save_columnar(movies, os.path.join(data_dir, "movies"), pipeline.api_schema)
+    elif output_format != "csv":
+        raise ValueError(f"Unknown format: {output_format}")
+
+
+def main():
+    """Generate the synthetic data from the command line."""
+    parser = argparse.ArgumentParser(description="Generate synthetic movies data for the benchmarks.")
+    parser.add_argument("folder", help="Output folder, the API data is written to <folder>/api/data and "
+                                       "the model data to <folder>/ML_model/data.")
+    parser.add_argument("--rows", type=int, default=45000, help="Number of movies.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random values.")
+    parser.add_argument("--format", default="columnar", choices=["csv", "columnar"], help="Format of the API data.")
+    args = parser.parse_args()
+
+    movies = generate_movies(args.rows, args.seed)
+    write_dataset(movies, os.path.join(args.folder, "api", "data"), os.path.join(args.folder, "ML_model", "data"),
+                  args.format)
+
+
+if __name__ == "__main__":
+    main()
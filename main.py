@@ -1,10 +1,23 @@
 """API para extraer información de la base de datos de películas"""
 
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
 from api.utils.helpers import director_info, count_movies_released_day
-from api.utils.helpers import actor_info, count_movies_released_month
-from api.utils.helpers import movie_popularity, movie_vote
-from ML_model.model import movie_recommendation
+from api.utils.helpers import actor_info, count_movies_released_month, count_movies_released_year
+from api.utils.helpers import movie_popularity, movie_vote, search_names
+from api.utils.metrics import metrics_enabled, observe, increment, set_gauge, counter_total
+from api.utils.metrics import render_metrics
+from api.utils.executor import start_pool, warm_pool, restart_pool, stop_pool, run_in_pool
+from api.utils.reloader import start_reloader, stop_reloader, reloader_state, track_versions, record_version
+from api.utils.search import kinds
+from api.utils.store import load_store, verify_store, reload_store, data_version
+from api.utils.warmup import start_warmup, is_ready, readiness
+from ML_model.model import movie_recommendation, load_model, needs_scan, verify_model, reload_model, model_version
+from ML_model.model import scored_recommendation
 
 app_description = """
         Los títulos de películas, los nombres de actores y directores pueden ir separados con espacio o '-'.
@@ -13,8 +26,186 @@ app_description = """
 
 app = FastAPI(title="Extracción de información de peliculas",description=app_description)
 
-@app.get("/cantidad_filmaciones_mes/{mes}")
-def cantidad_filmaciones_mes(mes: str):
+# Maximum number of items of a batch request
+batch_max_size = int(os.environ.get("BATCH_MAX_SIZE", 100))
+
+# Maximum number of results of a search
+search_max_size = int(os.environ.get("SEARCH_MAX_SIZE", 50))
+
+# Maximum number of movies of a recommendation
+recommend_max_size = int(os.environ.get("RECOMMEND_MAX_SIZE", 100))
+
+
+class Consultas(BaseModel):
+    """Lista de títulos o nombres de una consulta por lotes."""
+    consultas: list[str]
+
+
+def resolve_batch(consultas, resolve, not_found):
+    """
+    Resolve every item of a batch request, keeping the result or the error of each item.
+
+    Parameters:
+    - consultas: The list of titles or names.
+    - resolve: The function that creates the response of an item.
+    - not_found: The function that checks if the response of an item is empty.
+
+    Returns:
+        A dictionary with the "resultados" in the same order as the request.
+    """
+    if len(consultas) > batch_max_size:
+        raise HTTPException(status_code=413,
+                            detail=f"La consulta no puede tener más de {batch_max_size} elementos")
+
+    resultados = []
+    for consulta in consultas:
+        try:
+            resultado = resolve(consulta)
+        except Exception as error:
+            resultados.append({'consulta': consulta, 'error': str(error)})
+            continue
+
+        if not_found(resultado):
+            resultados.append({'consulta': consulta, 'error': "No se encontraron resultados"})
+        else:
+            resultados.append({'consulta': consulta, 'resultado': resultado})
+
+    return {'resultados': resultados}
+
+
+def load_data():
+    """Verify the data files against their manifest and load the data and its indexes."""
+    verify_store()
+    load_store()
+
+
+def load_recommendation_model():
+    """Verify the model artifacts against their manifest and load them."""
+    verify_model()
+    load_model()
+
+
+def start_workers():
+    """Start the process pool, each worker loads the recommendation model."""
+    if not is_ready("model"):
+        raise RuntimeError("The recommendation model isn't loaded")
+    start_pool(initializer=load_model)
+    warm_pool()
+
+
+def reload_recommendation_model():
+    """Load a new version of the model artifacts, and restart the process pool so its workers use it."""
+    if not reload_model():
+        return False
+    restart_pool(initializer=load_model)
+    return True
+
+
+def versiones():
+    """Version of the live data and model, None until they are loaded."""
+    return {'datos': data_version() if is_ready("store") else None,
+            'modelo': model_version() if is_ready("model") else None}
+
+
+def requiere(*componentes):
+    """Dependency that refuses the requests (503) until the given components are loaded."""
+    async def check():
+        if not is_ready(*componentes):
+            raise HTTPException(status_code=503, detail="La API se está iniciando, intente de nuevo",
+                                headers={"Retry-After": "1"})
+    return Depends(check)
+
+
+@app.on_event("startup")
+def warm_up():
+    """
+    Load the data, the recommendation model and the process pool in the background, so the API
+    accepts connections right away. The arrays are memory-mapped, so the workers share them.
+    """
+    start_warmup([
+        ("store", load_data),
+        ("model", load_recommendation_model),
+        ("pool", start_workers),
+    ])
+    start_reloader([
+        ("store", reload_store),
+        ("model", reload_recommendation_model),
+    ])
+
+
+@app.on_event("shutdown")
+def stop_workers():
+    """Stop the reloader and the process pool."""
+    stop_reloader()
+    stop_pool()
+
+
+@app.middleware("http")
+async def add_versions(request, call_next):
+    """
+    Report the version of the data and the model used by each response in the X-Data-Version and
+    X-Model-Version headers. The versions are recorded while the request runs, so a request that
+    gets a new version swapped in reports that one.
+    """
+    versions = track_versions()
+    response = await call_next(request)
+    if versions.get("store") is not None:
+        response.headers["X-Data-Version"] = versions["store"]
+    if versions.get("model") is not None:
+        response.headers["X-Model-Version"] = versions["model"]
+    return response
+
+
+if metrics_enabled:
+    @app.middleware("http")
+    async def measure_requests(request, call_next):
+        """Count and time every request by route template (not by path, to keep the number of series bounded)."""
+        start = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "sin_ruta"
+        observe("http_request_duration_seconds", time.perf_counter() - start, route=route_path)
+        increment("http_requests_total", route=route_path, method=request.method, status=response.status_code)
+        return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas de la API en formato de texto de Prometheus."""
+    if not metrics_enabled:
+        raise HTTPException(status_code=404, detail="Las métricas están desactivadas")
+
+    # From the counters, which include the lookups of the workers of the pool
+    lookups = counter_total("cache_requests_total")
+    set_gauge("cache_hit_rate", counter_total("cache_requests_total", result="hit") / lookups if lookups else 0.0)
+    for nombre, componente in readiness()["components"].items():
+        set_gauge("component_ready", int(componente["state"] == "ready"), component=nombre)
+        if componente["seconds"] is not None:
+            set_gauge("component_load_seconds", componente["seconds"], component=nombre)
+
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Estado de carga de cada componente de la API (datos, modelo y procesos) y el tiempo de carga en segundos,
+    la versión de los datos y del modelo, y las recargas de nuevas versiones.
+    Responde con el código 503 hasta que todos los componentes estén cargados.
+    """
+    estado = readiness()
+    componentes = {nombre: {'estado': componente["state"], 'segundos': componente["seconds"],
+                            'error': componente["error"]}
+                   for nombre, componente in estado["components"].items()}
+    respuesta = {'listo': estado["ready"], 'componentes': componentes, 'versiones': versiones(),
+                 'recargas': reloader_state()}
+    if not estado["ready"]:
+        return JSONResponse(status_code=503, content=respuesta)
+    return respuesta
+
+
+@app.get("/cantidad_filmaciones_mes/{mes}", dependencies=[requiere("store")])
+async def cantidad_filmaciones_mes(mes: str):
     """
     Ingresa el nombre del mes para ver la cantidad de peliculas que se han estrenado historicamente.
     El nombre del mes debe de ser en español.
@@ -24,8 +215,8 @@ def cantidad_filmaciones_mes(mes: str):
     return {'mes': mes, 'cantidad': cantidad}
 
 
-@app.get("/cantidad_filmaciones_dia/{dia}")
-def cantidad_filmaciones_dia(dia:str):
+@app.get("/cantidad_filmaciones_dia/{dia}", dependencies=[requiere("store")])
+async def cantidad_filmaciones_dia(dia:str):
     """
     Ingresa el nombre del día para ver la cantidad de peliculas que se han estrenado historicamente.
     El nombre de ser en español.
@@ -35,19 +226,41 @@ def cantidad_filmaciones_dia(dia:str):
     return {'dia':dia, 'cantidad': cantidad}
 
 
-@app.get('/score_titulo/{titulo}')
-def score_titulo(titulo:str):
+@app.get("/cantidad_filmaciones_anio/{anio}", dependencies=[requiere("store")])
+async def cantidad_filmaciones_anio(anio: int):
+    """
+    Ingresa el año para ver la cantidad de peliculas estrenadas en cada mes de ese año.
+    """
+    cantidad = count_movies_released_year(anio)
+    return {'anio': anio, 'cantidad_por_mes': cantidad}
+
+
+@app.get('/score_titulo/{titulo}', dependencies=[requiere("store")])
+async def score_titulo(titulo:str):
     """
     Ingresa el título de una filmación para ver el año de estreno y su calificación.
     Los espacios en el título de la película también pueden ir separados con '-'.
     No importa si está en mayusculas o minusculas, o si la vocal posee tilde.
     """
+    return score_response(titulo)
+
+
+@app.post('/score_titulos', dependencies=[requiere("store")])
+async def score_titulos(consultas: Consultas):
+    """
+    Ingresa una lista de títulos para ver el año de estreno y la calificación de cada uno.
+    """
+    return resolve_batch(consultas.consultas, score_response, lambda info: not info['titulo'])
+
+
+def score_response(titulo):
+    """Response of /score_titulo."""
     info = movie_popularity(titulo)
     return {'titulo':info["title"], 'anio':info["year"], 'popularidad':info["popularity"]}
 
 
-@app.get('/votos_titulo/{titulo}')
-def votos_titulo(titulo:str):
+@app.get('/votos_titulo/{titulo}', dependencies=[requiere("store")])
+async def votos_titulo(titulo:str):
     """
     Ingresa el título de una filmación para ver la cantidad de votos y el valor promedio de las votaciones.
     Si la cantidad de votos es menor a 2000, aparece un mensaje avisando que no cumple esta condición.
@@ -55,12 +268,25 @@ def votos_titulo(titulo:str):
     Los espacios en el título de la película también pueden ir separados con '-'.
     No importa si está en mayusculas o minusculas, o si la vocal posee tilde.
     """
+    return votos_response(titulo)
+
+
+@app.post('/votos_titulos', dependencies=[requiere("store")])
+async def votos_titulos(consultas: Consultas):
+    """
+    Ingresa una lista de títulos para ver la cantidad de votos y el valor promedio de las votaciones de cada uno.
+    """
+    return resolve_batch(consultas.consultas, votos_response, lambda info: not info['titulo'])
+
+
+def votos_response(titulo):
+    """Response of /votos_titulo."""
     info = movie_vote(titulo)
     return {'titulo':info["title"], 'anio':info["year"], 'voto_total':info["vote_total"], 
             'voto_promedio':info["vote_average"]}
 
-@app.get('/get_actor/{nombre_actor}')
-def get_actor(nombre_actor:str):
+@app.get('/get_actor/{nombre_actor}', dependencies=[requiere("store")])
+async def get_actor(nombre_actor:str):
     """
     Ingresa el nombre de un actor para ver el éxito de él medido a través del retorno.
     Adicional, se muestra la cantidad de películas que en las que ha participado y el promedio de retorno.
@@ -69,12 +295,25 @@ def get_actor(nombre_actor:str):
     No importa si está en mayusculas o minusculas, o si la vocal posee tilde.
 
     """
+    return actor_response(nombre_actor)
+
+
+@app.post('/get_actores', dependencies=[requiere("store")])
+async def get_actores(consultas: Consultas):
+    """
+    Ingresa una lista de nombres de actores para ver el retorno de cada uno.
+    """
+    return resolve_batch(consultas.consultas, actor_response, lambda info: not info['actor'])
+
+
+def actor_response(nombre_actor):
+    """Response of /get_actor."""
     info = actor_info(nombre_actor)
     return {'actor':info["name"], 'cantidad_filmaciones':info["movies_total"], 'retorno_total':info["return_total"], 
             'retorno_promedio':info["return_average"]}
 
-@app.get('/get_director/{nombre_director}')
-def get_director(nombre_director:str):
+@app.get('/get_director/{nombre_director}', dependencies=[requiere("store")])
+async def get_director(nombre_director:str):
     """
     Ingresa el nombre de un director para ver el éxito de él medido a través del retorno. 
     Adicional, se muestra el nombre de cada película que ha dirigido, su la fecha de lanzamiento, 
@@ -83,17 +322,98 @@ def get_director(nombre_director:str):
     Los espacios en el nombre del director también pueden ir separados con '-'.
     No importa si está en mayusculas o minusculas, o si la vocal posee tilde.
     """
+    return director_response(nombre_director)
+
+
+@app.post('/get_directores', dependencies=[requiere("store")])
+async def get_directores(consultas: Consultas):
+    """
+    Ingresa una lista de nombres de directores para ver el retorno y las películas de cada uno.
+    """
+    return resolve_batch(consultas.consultas, director_response, lambda info: not info['director'])
+
+
+def director_response(nombre_director):
+    """Response of /get_director."""
     info = director_info(nombre_director)
     return {'director':info["name"], 'retorno_total_director':info["return_total"], 'peliculas':info["movies_total"], 
             'anio':info["release_date"], 'retorno_pelicula':info["return_movie"], 'budget_pelicula':info["budget_movie"],
             'revenue_pelicula':info["revenue_movie"]}
 
 
+@app.get('/buscar/{texto}', dependencies=[requiere("store")])
+async def buscar(texto: str, limite: int = 10, tipo: str = None):
+    """
+    Ingresa el comienzo de un título o de un nombre para ver los títulos, actores y directores
+    que empiezan así o se escriben parecido, ordenados de mejor a peor coincidencia.
+    No importan las mayúsculas, las tildes ni otros signos (ñ, ü, ç...).
+    Con el parámetro "limite" se puede cambiar el número de resultados y con "tipo"
+    ("titulo", "actor" o "director") buscar solo un tipo.
+    El nombre de cada resultado se puede usar en las demás consultas.
+    """
+    if tipo is not None and tipo not in kinds:
+        raise HTTPException(status_code=400, detail=f"El tipo debe ser uno de: {', '.join(kinds)}")
+    if not 0 < limite <= search_max_size:
+        raise HTTPException(status_code=400, detail=f"El límite debe estar entre 1 y {search_max_size}")
+
+    resultados = search_names(texto, limite, tipo)
+    return {'consulta': texto, 'resultados': [{'nombre': resultado["name"], 'tipo': resultado["kind"],
+                                               'peliculas': resultado["movies"], 'puntaje': resultado["score"]}
+                                              for resultado in resultados]}
+
+
 # ML
-@app.get('/recomendacion/{titulo}')
-def recomendacion(titulo:str):
+@app.get('/recomendacion/{titulo}', dependencies=[requiere("model")])
+async def recomendacion(titulo:str, cantidad: int = 5, peso_resumen: float = None, peso_generos: float = None,
+                        peso_coleccion: float = None, anio_desde: int = None, anio_hasta: int = None,
+                        genero: str = None, votos_minimos: int = None):
     '''
     Ingresa el nombre de una pelicula para ver 5 películas similares.
+    Con el parámetro "cantidad" se puede cambiar el número de películas (hasta 100 por defecto).
+    La similitud combina el resumen, los géneros y la colección (saga) de las películas;
+    con los parámetros "peso_resumen", "peso_generos" y "peso_coleccion" se puede cambiar
+    el peso de cada uno (0 lo ignora).
+    Con los parámetros "anio_desde", "anio_hasta", "genero" y "votos_minimos" solo se
+    recomiendan las películas de esos años, de ese género o con esa cantidad de votos.
     '''
-    info = movie_recommendation(titulo)
+    if not 0 < cantidad <= recommend_max_size:
+        raise HTTPException(status_code=400, detail=f"La cantidad debe estar entre 1 y {recommend_max_size}")
+    pesos = tuple((bloque, peso) for bloque, peso in
+                  (("overview", peso_resumen), ("genres", peso_generos), ("collection", peso_coleccion))
+                  if peso is not None) or None
+    filtros = tuple((filtro, valor) for filtro, valor in
+                    (("year_from", anio_desde), ("year_to", anio_hasta), ("genre", genero), ("min_votes", votos_minimos))
+                    if valor is not None) or None
+    try:
+        scan = needs_scan(cantidad, pesos, filtros, titulo)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    if not scan:
+        return recomendacion_response(titulo, cantidad, filtros)
+
+    # Scoring against the whole catalogue runs in the process pool
+    try:
+        info, version = await run_in_pool(scored_recommendation, titulo, cantidad, pesos, filtros)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="La recomendación tardó demasiado")
+    # The worker may still have the previous model
+    record_version("model", version)
     return {'lista recomendada': info["movie_recommendations"]}
+
+
+@app.post('/recomendaciones', dependencies=[requiere("model")])
+async def recomendaciones(consultas: Consultas):
+    '''
+    Ingresa una lista de películas para ver 5 películas similares a cada una.
+    '''
+    return resolve_batch(consultas.consultas, recomendacion_response,
+                         lambda info: not info['lista recomendada'])
+
+
+def recomendacion_response(titulo, cantidad=5, filtros=None):
+    """Response of /recomendacion."""
+    info = movie_recommendation(titulo, cantidad, None, filtros)
+    return {'lista recomendada': info["movie_recommendations"]}
+
@@ -0,0 +1,38 @@
+"""Shared fixtures of the tests: the root of the repository is importable and the synthetic movies."""
+
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The ETL imports its modules from its own folder, as its scripts and notebook do
+sys.path.insert(0, os.path.join(root_dir, "Data transformation"))
+sys.path.insert(0, root_dir)
+
+# The API reads its settings when it's imported: the data and the model of the tests are written to a
+# temporary folder, the work of the process pool runs in a thread and nothing is reloaded in the background
+test_dir = tempfile.mkdtemp(prefix="movies-api-tests-")
+os.environ.update({
+    "API_DATA_DIR": os.path.join(test_dir, "api", "data"),
+    "MODEL_ARTIFACTS_DIR": os.path.join(test_dir, "ML_model", "artifacts"),
+    "PROCESS_POOL_SIZE": "0",
+    "RELOAD_INTERVAL": "0",
+    "WARMUP_WAIT": "1",
+    "CACHE_BACKEND": "memory",
+})
+
+from benchmarks.synthetic import generate_movies  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def remove_test_dir():
+    yield
+    shutil.rmtree(test_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def movies():
+    """A small catalogue of synthetic movies (see benchmarks/synthetic.py)."""
+    return generate_movies(600, seed=1)
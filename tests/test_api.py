@@ -0,0 +1,191 @@
+"""The endpoints of the API (main.py) over the synthetic movies, with a test client."""
+
+import ast
+import csv
+import os
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.synthetic import write_dataset
+
+
+@pytest.fixture(scope="module")
+def client(movies):
+    """A test client of the API, started with the synthetic data and model (see conftest.py)."""
+    model_data_dir = os.path.join(os.path.dirname(os.environ["MODEL_ARTIFACTS_DIR"]), "data")
+    write_dataset(movies, os.environ["API_DATA_DIR"], model_data_dir, "columnar")
+    from ML_model import model
+    model.build_model(os.path.join(model_data_dir, "overview.csv"), os.environ["MODEL_ARTIFACTS_DIR"])
+
+    import main
+    with TestClient(main.app) as test_client:
+        assert test_client.get("/ready").status_code == 200
+        yield test_client
+
+
+def test_versions_of_the_response(client, monkeypatch):
+    import main
+    from api.utils import store
+    from ML_model import model
+
+    response = client.get("/cantidad_filmaciones_mes/enero")
+    assert response.headers["X-Data-Version"] == store.data_version()
+    # The model isn't used
+    assert "X-Model-Version" not in response.headers
+    response = client.get(f"/recomendacion/{model.load_model()['titles'][0]}")
+    assert response.headers["X-Model-Version"] == model.model_version()
+
+    # A new version swapped in while the request runs is the version of the response
+    live = store.get_dataset()
+    count = main.count_movies_released_month
+
+    def swap_and_count(month):
+        monkeypatch.setitem(store._datasets, "movies", dict(live, version="new-version"))
+        return count(month)
+
+    monkeypatch.setattr(main, "count_movies_released_month", swap_and_count)
+    response = client.get("/cantidad_filmaciones_mes/enero")
+    assert response.status_code == 200
+    assert response.headers["X-Data-Version"] == "new-version"
+
+
+def test_versions_of_the_pool(client, monkeypatch):
+    import main
+    from ML_model import model
+
+    title = model.load_model()["titles"][0]
+
+    async def old_worker(function, *args, **kwargs):
+        info, _ = function(*args, **kwargs)
+        return info, "old-version"
+
+    monkeypatch.setattr(main, "run_in_pool", old_worker)
+    response = client.get(f"/recomendacion/{title}", params={"cantidad": 50})
+    assert response.status_code == 200
+    assert len(response.json()["lista recomendada"]) == 50
+    assert response.headers["X-Model-Version"] == "old-version"
+
+
+def test_batch(client, movies):
+    titles = movies["title"].tolist()[:3] + ["No existe"]
+    response = client.post("/score_titulos", json={"consultas": titles})
+    assert response.status_code == 200
+    resultados = response.json()["resultados"]
+    assert [resultado["consulta"] for resultado in resultados] == titles
+    assert all("resultado" in resultado for resultado in resultados[:3])
+    assert resultados[3]["error"] == "No se encontraron resultados"
+    # The same response as the endpoint of a single item
+    assert resultados[0]["resultado"] == client.get(f"/score_titulo/{titles[0]}").json()
+
+
+@pytest.mark.parametrize("path", ["/score_titulos", "/votos_titulos", "/get_actores", "/get_directores",
+                                  "/recomendaciones"])
+def test_batch_too_large(client, path):
+    import main
+
+    response = client.post(path, json={"consultas": ["Toy Story"] * (main.batch_max_size + 1)})
+    assert response.status_code == 413
+    response = client.post(path, json={"consultas": ["Toy Story"] * main.batch_max_size})
+    assert response.status_code == 200
+
+
+def test_not_ready(client, monkeypatch):
+    from api.utils import warmup
+
+    monkeypatch.setitem(warmup._warmup["components"], "model",
+                        {"state": "loading", "seconds": None, "error": None})
+    # The endpoints that need the model answer 503 until it's loaded, the others keep serving
+    response = client.get("/recomendacion/Toy Story")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.post("/recomendaciones", json={"consultas": ["Toy Story"]}).status_code == 503
+    assert client.get("/cantidad_filmaciones_mes/enero").status_code == 200
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["listo"] is False
+    assert response.json()["componentes"]["model"]["estado"] == "loading"
+    assert response.json()["versiones"]["modelo"] is None
+
+    monkeypatch.undo()
+    assert client.get("/ready").status_code == 200
+    assert client.get("/recomendacion/Toy Story").status_code == 200
+
+
+@pytest.mark.parametrize("params", [
+    {"cantidad": 0},
+    {"cantidad": -1},
+    {"cantidad": 10 ** 7},
+    {"peso_resumen": -1},
+    {"peso_resumen": 0, "peso_generos": 0, "peso_coleccion": 0},
+    {"genero": "No existe"},
+    {"anio_desde": 2000, "anio_hasta": 1990},
+    {"votos_minimos": -5},
+])
+def test_recommendation_bad_request(client, movies, params):
+    response = client.get(f"/recomendacion/{movies['title'][0]}", params=params)
+    assert response.status_code == 400
+    assert response.json()["detail"]
+
+
+def test_recommendation(client, movies):
+    import main
+
+    title = movies["title"][0]
+    assert len(client.get(f"/recomendacion/{title}").json()["lista recomendada"]) == 5
+    # More movies than the precomputed neighbours are scored in the pool
+    response = client.get(f"/recomendacion/{title}", params={"cantidad": main.recommend_max_size})
+    assert response.status_code == 200
+    assert len(response.json()["lista recomendada"]) == main.recommend_max_size
+
+    response = client.get(f"/recomendacion/{title}", params={"cantidad": 30, "genero": "Drama"})
+    assert response.status_code == 200
+    drama = set(movies["title"][movies["movie_genres"].map(lambda genres: "Drama" in genres)])
+    assert set(response.json()["lista recomendada"]) <= drama
+
+
+def read_rows(name):
+    with open(os.path.join(os.environ["API_DATA_DIR"], f"{name}.csv"), encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+def test_response_types(client, movies):
+    """The values keep the types of the csv reader the endpoints had before the store (strings)."""
+    votes = read_rows("api_data4")
+    for title in movies["title"][movies["vote_count"] >= 2000].tolist()[:5] + movies["title"].tolist()[:5]:
+        rows = [row for row in votes if row["title"] == title]
+        response = client.get(f"/votos_titulo/{title}").json()
+        assert response["anio"] == [row["release_year"] for row in rows]
+        assert response["voto_promedio"] == [row["vote_average"] if float(row["vote_count"]) >= 2000
+                                             else "La filmación posee menos de 2000 valoraciones" for row in rows]
+        assert client.get(f"/score_titulo/{title}").json()["anio"] == [row["release_year"] for row in rows]
+
+    directed = {}
+    for row in read_rows("api_data6"):
+        for name, job in zip(ast.literal_eval(row["crew_name"]), ast.literal_eval(row["crew_job"])):
+            if job == "Director":
+                directed.setdefault(name, []).append(row)
+    for name, rows in list(directed.items())[:10]:
+        response = client.get(f"/get_director/{name}").json()
+        expected = [(row["title"], row["release_date"], row["return"], row["budget"], row["revenue"]) for row in rows]
+        assert sorted(zip(response["peliculas"], response["anio"], response["retorno_pelicula"],
+                          response["budget_pelicula"], response["revenue_pelicula"])) == sorted(expected)
+
+
+def test_cache_metrics(client, monkeypatch):
+    from api.utils import metrics
+    from api.utils.cache import MemoryBackend
+
+    monkeypatch.setitem(metrics._metrics, "counters", {})
+    monkeypatch.setitem(metrics._metrics, "gauges", {})
+    backend = MemoryBackend(size=1, ttl=60)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    metrics.increment("cache_requests_total", endpoint="movie_vote", result="miss")
+    # The lookups of a worker of the pool count in the hit rate
+    metrics.merge_metrics({"histograms": {}, "counters": {
+        ("cache_requests_total", (("endpoint", "movie_vote"), ("result", "hit"))): 3}})
+
+    lines = client.get("/metrics").text.splitlines()
+    assert "# TYPE movies_api_cache_evictions_total counter" in lines
+    assert "movies_api_cache_evictions_total 1" in lines
+    assert "movies_api_cache_hit_rate 0.75" in lines
@@ -0,0 +1,44 @@
+"""The manifests of the ETL ("Data transformation/utils/artifacts.py") verified by the API (api/utils/artifacts.py)."""
+
+import numpy as np
+import pytest
+from api.utils import artifacts as api_artifacts
+from utils import artifacts as etl_artifacts
+
+
+def write_files(folder):
+    for name in ("a", "b"):
+        with etl_artifacts.atomic_write(str(folder / f"{name}.npy")) as file:
+            np.save(file, np.arange(10) if name == "a" else np.ones(3))
+
+
+def test_same_manifest(tmp_path):
+    etl_folder, api_folder = tmp_path / "etl", tmp_path / "api"
+    for folder in (etl_folder, api_folder):
+        folder.mkdir()
+        write_files(folder)
+    etl_manifest = etl_artifacts.write_manifest(str(etl_folder), rows=3)
+    assert etl_manifest == api_artifacts.write_manifest(str(api_folder), rows=3)
+    assert (etl_folder / "manifest.json").read_bytes() == (api_folder / "manifest.json").read_bytes()
+    assert api_artifacts.verify_manifest(str(etl_folder)) == etl_manifest
+
+
+def test_changed_file(tmp_path):
+    write_files(tmp_path)
+    etl_artifacts.write_manifest(str(tmp_path))
+    with open(tmp_path / "a.npy", "r+b") as file:
+        file.seek(-1, 2)
+        file.write(b"\xff")
+    with pytest.raises(ValueError):
+        api_artifacts.verify_manifest(str(tmp_path))
+
+
+def test_atomic_write_failure(tmp_path):
+    path = tmp_path / "a.json"
+    path.write_text("previous")
+    with pytest.raises(RuntimeError):
+        with etl_artifacts.atomic_write(str(path), "w") as file:
+            file.write("partial")
+            raise RuntimeError("failed")
+    assert path.read_text() == "previous"
+    assert [item.name for item in tmp_path.iterdir()] == ["a.json"]
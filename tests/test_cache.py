@@ -0,0 +1,127 @@
+"""The TTL and LRU eviction of the cache backends (api/utils/cache.py) and the cached decorator."""
+
+import os
+import pytest
+from api.utils import cache
+
+
+@pytest.fixture(params=["memory", "file"])
+def make_backend(request, tmp_path):
+    def make(size=2, ttl=60):
+        if request.param == "memory":
+            return cache.MemoryBackend(size, ttl)
+        return cache.FileBackend(size, ttl, str(tmp_path / "cache"), evict_every=1)
+    return make
+
+
+def touch(backend, key, when):
+    """Set the last access of an entry of the file backend (its modification time)."""
+    if isinstance(backend, cache.FileBackend):
+        os.utime(backend.path(key), (when, when))
+
+
+def test_get_and_set(make_backend):
+    backend = make_backend()
+    assert backend.get("a") is cache._missing
+    backend.set("a", {"value": 1})
+    assert backend.get("a") == {"value": 1}
+    backend.set("a", 2)
+    assert backend.get("a") == 2
+
+
+def test_expired_entries(make_backend):
+    backend = make_backend(ttl=-1)
+    backend.set("a", 1)
+    assert backend.get("a") is cache._missing
+    assert backend.evictions == 1
+    # The expired entry was removed
+    assert backend.get("a") is cache._missing
+    assert backend.evictions == 1
+
+
+def test_least_recently_used_evicted(make_backend):
+    backend = make_backend(size=2)
+    backend.set("a", 1)
+    touch(backend, "a", 1)
+    backend.set("b", 2)
+    touch(backend, "b", 2)
+    # "a" is used, so "b" is the least recently used
+    assert backend.get("a") == 1
+    backend.set("c", 3)
+    assert backend.get("b") is cache._missing
+    assert backend.get("a") == 1
+    assert backend.get("c") == 3
+    assert backend.evictions == 1
+
+
+def test_clear(make_backend):
+    backend = make_backend()
+    backend.set("a", 1)
+    backend.clear()
+    assert backend.get("a") is cache._missing
+
+
+def test_file_backend_evicts_every_writes(tmp_path):
+    backend = cache.FileBackend(4, 60, str(tmp_path), evict_every=3)
+    for idx in range(6):
+        backend.set(idx, idx)
+        touch(backend, idx, idx + 1)
+        # The folder is only listed every 3 writes, it can hold up to size + evict_every entries
+        assert len(backend.entries()) <= 4 + 3
+    assert len(backend.entries()) == 4
+    assert [backend.get(idx) for idx in range(6)] == [cache._missing] * 2 + [2, 3, 4, 5]
+
+
+def test_file_backend_missing_files(tmp_path):
+    backend = cache.FileBackend(2, 60, str(tmp_path), evict_every=1)
+    backend.set("a", 1)
+    # Another process removes the entry
+    os.remove(backend.path("a"))
+    assert backend.get("a") is cache._missing
+    backend.set("b", 2)
+    backend.set("c", 3)
+    backend.clear()
+    assert backend.entries() == []
+
+
+def test_cached(monkeypatch):
+    monkeypatch.setitem(cache._cache, "backend", cache.MemoryBackend(8, 60))
+    monkeypatch.setitem(cache._cache, "versions", {})
+    calls = []
+    version = {"value": 1}
+
+    @cache.cached("test", lambda: version["value"])
+    def function(query):
+        calls.append(query)
+        return len(calls)
+
+    # The normalized arguments share the entry
+    assert function("Toy Story") == 1
+    assert function("toy-story") == 1
+    assert calls == ["Toy Story"]
+
+    # A new version of the data clears the cache
+    version["value"] = 2
+    assert function("Toy Story") == 2
+    assert function("Toy Story") == 2
+
+
+def test_file_backend_private_folder(tmp_path):
+    folder = tmp_path / "shared"
+    folder.mkdir()
+    folder.chmod(0o777)
+    with pytest.raises(ValueError):
+        cache.FileBackend(2, 60, str(folder))
+    folder.chmod(0o700)
+    cache.FileBackend(2, 60, str(folder))
+
+
+def test_file_backend_invalid_entries(tmp_path):
+    backend = cache.FileBackend(2, 60, str(tmp_path))
+    # Files that aren't entries of this key are misses, they are never evaluated
+    with open(backend.path("a"), "wb") as file:
+        file.write(b"\x80\x04\x95 not json")
+    assert backend.get("a") is cache._missing
+    with open(backend.path("b"), "w", encoding="utf-8") as file:
+        file.write('{"expires": 1e300, "key": "\'other\'", "value": 1}')
+    assert backend.get("b") is cache._missing
@@ -0,0 +1,98 @@
+"""The bitsets of the filters (ML_model/filters.py) against a brute force comparison of every movie."""
+
+import numpy as np
+import pytest
+from ML_model.filters import build_filters, filter_mask, vote_tiers
+from ML_model.model import multi_hot
+
+
+@pytest.fixture(scope="module")
+def catalogue(movies):
+    years = movies["release_year"].to_numpy().copy()
+    # Some movies without a known year
+    years[::17] = 0
+    votes = movies["vote_count"].to_numpy()
+    genre_block, genres = multi_hot(movies["movie_genres"].tolist())
+    filters = build_filters(years, votes, genre_block.tocsc())
+    genre_sets = [set(movie) for movie in movies["movie_genres"]]
+    return filters, years, votes, genres, genre_sets
+
+
+def brute_force(years, votes, genre_sets, year_from=None, year_to=None, min_votes=None, genre=None):
+    mask = np.ones(len(years), dtype=bool)
+    if year_from is not None or year_to is not None:
+        mask &= years > 0
+    if year_from is not None:
+        mask &= years >= year_from
+    if year_to is not None:
+        mask &= years <= year_to
+    if min_votes is not None:
+        mask &= votes >= min_votes
+    if genre is not None:
+        mask &= np.array([genre in movie for movie in genre_sets])
+    return mask
+
+
+def test_no_filters(catalogue):
+    assert filter_mask(catalogue[0]) is None
+
+
+@pytest.mark.parametrize("year_from, year_to", [
+    (1950, 1990),
+    (None, 1960),
+    (1995, None),
+    (1990, 1990),
+    # Years before, after and around the catalogue
+    (1800, None),
+    (None, 1800),
+    (2100, None),
+    (2100, 2200),
+    (1800, 2200),
+])
+def test_years(catalogue, year_from, year_to):
+    filters, years, votes, _, genre_sets = catalogue
+    expected = brute_force(years, votes, genre_sets, year_from, year_to)
+    np.testing.assert_array_equal(filter_mask(filters, year_from, year_to), expected)
+
+
+def test_years_without_movies(catalogue):
+    # A year inside the range of the catalogue without any movie released in it
+    filters, years, votes, _, genre_sets = catalogue
+    missing = sorted(set(range(years[years > 0].min(), years.max())) - set(years.tolist()))
+    if not missing:
+        pytest.skip("every year of the catalogue has a movie")
+    year = missing[0]
+    for year_from, year_to in ((year, year), (year, None), (None, year)):
+        np.testing.assert_array_equal(filter_mask(filters, year_from, year_to),
+                                      brute_force(years, votes, genre_sets, year_from, year_to))
+
+
+@pytest.mark.parametrize("min_votes", list(vote_tiers) + [0, 1, 50, 250.5, 10 ** 7])
+def test_votes(catalogue, min_votes):
+    filters, years, votes, _, genre_sets = catalogue
+    np.testing.assert_array_equal(filter_mask(filters, min_votes=min_votes),
+                                  brute_force(years, votes, genre_sets, min_votes=min_votes))
+
+
+def test_genres(catalogue):
+    filters, years, votes, genres, genre_sets = catalogue
+    for column, genre in enumerate(genres):
+        np.testing.assert_array_equal(filter_mask(filters, genre=column),
+                                      brute_force(years, votes, genre_sets, genre=genre))
+
+
+def test_combined(catalogue):
+    filters, years, votes, genres, genre_sets = catalogue
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        year_from = int(rng.integers(1910, 2030)) if rng.random() < 0.7 else None
+        year_to = int(rng.integers(year_from or 1910, 2030)) if rng.random() < 0.7 else None
+        min_votes = float(rng.choice(list(vote_tiers) + [5, 75])) if rng.random() < 0.7 else None
+        genre = int(rng.integers(len(genres))) if rng.random() < 0.7 else None
+        mask = filter_mask(filters, year_from, year_to, min_votes, genre)
+        expected = brute_force(years, votes, genre_sets, year_from, year_to, min_votes,
+                               genres[genre] if genre is not None else None)
+        if mask is None:
+            assert expected.all()
+        else:
+            np.testing.assert_array_equal(mask, expected)
@@ -0,0 +1,72 @@
+"""The incremental update of the model (add_movies) against a full rebuild of its neighbours and filters."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import write_dataset
+from ML_model import model as recommender
+from ML_model.filters import build_filters
+
+first_rows = 500
+
+
+@pytest.fixture(scope="module")
+def updated(movies, tmp_path_factory):
+    """A model built with the first movies of the catalogue and updated with the rest."""
+    folder = tmp_path_factory.mktemp("model")
+    write_dataset(movies.iloc[:first_rows], str(folder / "api"), str(folder / "data"), "csv")
+    artifacts = str(folder / "artifacts")
+    recommender.build_model(str(folder / "data" / "overview.csv"), artifacts)
+    before = recommender.read_model(artifacts)
+
+    # The movies already in the model are skipped
+    new_movies = pd.concat([movies.iloc[first_rows:], movies.iloc[first_rows - 20:first_rows]])
+    new_movies.to_csv(folder / "new_movies.csv", index=False)
+    manifest = recommender.add_movies(str(folder / "new_movies.csv"), artifacts, block=32)
+    return {"before": before, "after": recommender.read_model(artifacts), "manifest": manifest,
+            "artifacts": artifacts}
+
+
+def test_manifest(updated, movies):
+    before, after = updated["before"], updated["after"]
+    assert updated["manifest"]["generation"] == 1
+    assert updated["manifest"]["rows_added"] == len(movies) - first_rows
+    assert after["matrix"].shape[0] == len(movies)
+    assert after["titles"] == movies["title"].tolist()
+    assert after["version"] != before["version"]
+    recommender.verify_model(updated["artifacts"])
+
+
+def test_existing_rows_unchanged(updated):
+    before, after = updated["before"], updated["after"]
+    assert (after["matrix"][:first_rows] != before["matrix"]).nnz == 0
+
+
+def test_neighbours_match_full_rebuild(updated):
+    after = updated["after"]
+    neighbours, scores = np.asarray(after["neighbours"]), np.asarray(after["scores"])
+    weights = recommender.column_weights(after["blocks"], after["weights"])
+    full_neighbours, full_scores = recommender.build_neighbours(after["matrix"], neighbours.shape[1], weights=weights)
+    np.testing.assert_allclose(scores, full_scores, rtol=1e-5, atol=1e-6)
+
+    # The same neighbours, except the ties (their order, and which of them fill the last places)
+    matrix = after["matrix"]
+    similarity = (recommender.scale_columns(matrix, weights) @ matrix.T).toarray()
+    np.testing.assert_allclose(np.take_along_axis(similarity, neighbours.astype(np.int64), axis=1), scores,
+                               rtol=1e-5, atol=1e-6)
+    assert not np.any(neighbours == np.arange(len(neighbours))[:, None])
+    assert all(len(set(row)) == len(row) for row in neighbours.tolist())
+    for row in np.flatnonzero((neighbours != full_neighbours).any(axis=1)):
+        above = scores[row] > scores[row, -1] + 1e-6
+        assert set(neighbours[row][above]) == set(full_neighbours[row][above])
+
+def test_filters_match_full_rebuild(updated, movies):
+    after = updated["after"]
+    start, end = after["blocks"]["genres"]
+    expected = build_filters(movies["release_year"], movies["vote_count"], after["matrix"][:, start:end].tocsc())
+    for name, array in expected.items():
+        np.testing.assert_array_equal(np.asarray(after["filters"][name]), array, err_msg=name)
+
+    genres = after["labels"]["genres"]
+    for row, movie_genres in enumerate(movies["movie_genres"]):
+        assert set(movie_genres) == {genres[column] for column in after["matrix"][row, start:end].indices}
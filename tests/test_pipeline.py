@@ -0,0 +1,121 @@
+"""The chunked ETL pipeline ("Data transformation/pipeline.py") over raw files built from the synthetic movies."""
+
+import filecmp
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import pipeline
+from api.utils.artifacts import verify_manifest
+from api.utils.store import read_columnar
+
+
+@pytest.fixture(scope="module")
+def raw_files(movies, tmp_path_factory):
+    """The movies and credits of the synthetic movies in the format of the raw data, with duplicates and errors."""
+    folder = tmp_path_factory.mktemp("raw")
+    movies = movies.iloc[:150]
+
+    def names(values, key="name", **fields):
+        return repr([{"id": idx, key: value, **fields} for idx, value in enumerate(values)])
+
+    raw = pd.DataFrame({
+        "id": movies["id"].astype(str),
+        "title": movies["title"],
+        "release_date": movies["release_date"].dt.strftime("%Y-%m-%d"),
+        "revenue": movies["revenue"],
+        "budget": movies["budget"],
+        "spoken_languages": [repr([{"iso_639_1": "en", "name": "English"}])] * len(movies),
+        "production_countries": [repr([{"iso_3166_1": "US", "name": "USA"}])] * len(movies),
+        "production_companies": [names(["Company"])] * len(movies),
+        "genres": [names(genres) for genres in movies["movie_genres"]],
+        "belongs_to_collection": [repr({"id": 1, "name": collection[0]}) if collection else np.nan
+                                  for collection in movies["collection_name"]],
+        "original_language": "en",
+        "overview": movies["overview"],
+        "status": movies["status"],
+        "tagline": np.nan,
+        "popularity": movies["popularity"],
+        "vote_count": movies["vote_count"],
+        "vote_average": movies["vote_average"],
+        "runtime": 90,
+        "video": False, "imdb_id": "x", "adult": False, "original_title": "x", "poster_path": "x", "homepage": "x",
+    })
+    # A duplicated movie, an invalid id and a movie without a release date
+    raw = pd.concat([raw, raw.iloc[[4]]], ignore_index=True)
+    raw.loc[len(raw)] = raw.iloc[5].copy()
+    raw.loc[len(raw) - 1, "id"] = "1997-08-20"
+    raw.loc[10, "release_date"] = np.nan
+    raw.to_csv(folder / "movies.csv", index=False)
+
+    credits = pd.DataFrame({
+        "id": movies["id"],
+        "cast": [repr([{"id": int(person), "name": name, "gender": 1, "character": "c"}
+                       for person, name in zip(ids, actors)]) for ids, actors in zip(movies["actor_id"],
+                                                                                      movies["actor_name"])],
+        "crew": [repr([{"id": int(person), "name": name, "gender": 1, "department": "d", "job": job}
+                       for person, name, job in zip(ids, crew, jobs)])
+                 for ids, crew, jobs in zip(movies["crew_id"], movies["crew_name"], movies["crew_job"])],
+    })
+    # Duplicated credits in the same and in other chunks, credits of unknown movies and movies without credits
+    credits = pd.concat([credits.iloc[::-1], credits.iloc[[0, 1, 2]], credits.iloc[[3]]], ignore_index=True)
+    credits.loc[len(credits)] = [999999, "[]", "[]"]
+    credits = credits[~credits["id"].isin(movies["id"].iloc[20:25])]
+    credits.to_csv(folder / "credits.csv", index=False)
+    return str(folder / "movies.csv"), str(folder / "credits.csv")
+
+
+def run(raw_files, folder, chunk_size, workers=1):
+    outputs = [os.path.join(folder, name) for name in ("api", "model", "eda")]
+    reports = pipeline.run_pipeline(chunk_size, *raw_files, *outputs, workers=workers)
+    return outputs, reports
+
+
+def same_files(first, second):
+    comparison = filecmp.dircmp(first, second)
+    assert not comparison.left_only and not comparison.right_only
+    assert filecmp.cmpfiles(first, second, comparison.common_files, shallow=False)[0] == comparison.common_files
+    for name in comparison.common_dirs:
+        same_files(os.path.join(first, name), os.path.join(second, name))
+
+
+@pytest.fixture(scope="module")
+def single_chunk(raw_files, tmp_path_factory):
+    return run(raw_files, str(tmp_path_factory.mktemp("single")), 10 ** 6)
+
+
+def test_chunks_same_output(raw_files, single_chunk, tmp_path):
+    outputs, reports = run(raw_files, str(tmp_path), 7)
+    for first, second in zip(outputs, single_chunk[0]):
+        same_files(first, second)
+    assert sum(report["error_count"] for report in reports) == 0
+
+
+def test_workers_same_output(raw_files, single_chunk, tmp_path):
+    # A single process pool is shared by every column and chunk
+    outputs, _ = run(raw_files, str(tmp_path), 40, workers=2)
+    for first, second in zip(outputs, single_chunk[0]):
+        same_files(first, second)
+
+
+def test_output(single_chunk, movies):
+    api_output = single_chunk[0][0]
+    expected = movies.iloc[:150].drop(index=10)
+    verify_manifest(os.path.join(api_output, "movies"))
+    dataset = read_columnar(os.path.join(api_output, "movies"))
+    columns, lists = dataset["columns"], dataset["lists"]
+    # A row per movie, without the duplicated, invalid and undated ones
+    assert dataset["rows"] == len(expected)
+    assert sorted(columns["id"].tolist()) == sorted(expected["id"].tolist())
+
+    rows = {movie_id: row for row, movie_id in enumerate(columns["id"].tolist())}
+    actors = lists["actor_name"]
+    for _, movie in expected.iterrows():
+        row = rows[movie["id"]]
+        names = actors["dictionary"][actors["values"][actors["offsets"][row]:actors["offsets"][row + 1]]].tolist()
+        # The movies without credits have empty lists
+        assert names == ([] if movie["id"] in set(movies["id"].iloc[20:25]) else movie["actor_name"])
+        assert columns["title"][row] == movie["title"]
+
+    overview = pd.read_csv(os.path.join(single_chunk[0][1], "overview.csv"))
+    assert sorted(overview["id"].tolist()) == sorted(expected["id"].tolist())
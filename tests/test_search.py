@@ -0,0 +1,77 @@
+"""The folding of the text and the search of titles and names (api/utils/search.py)."""
+
+import pytest
+from api.utils.search import build_search_index, search, trigrams
+from api.utils.text import fold_string
+
+
+@pytest.mark.parametrize("text, folded", [
+    ("Toy Story", "toy story"),
+    ("  El Niño!  ", "el nino"),
+    ("Über-Café", "uber cafe"),
+    ("Amélie", "amelie"),
+    ("Straße", "strasse"),
+    ("Søren Łukasz", "soren lukasz"),
+    ("Penélope Cruz", "penelope cruz"),
+    ("WALL·E", "wall e"),
+    ("Ocean's Eleven", "ocean s eleven"),
+    ("", ""),
+])
+def test_fold_string(text, folded):
+    assert fold_string(text) == folded
+
+
+def test_trigrams():
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+
+@pytest.fixture(scope="module")
+def index():
+    return build_search_index([
+        ("titulo", "Toy Story", 1),
+        ("titulo", "Toy Story 2", 1),
+        ("titulo", "El Niño", 1),
+        ("titulo", "Amélie", 1),
+        ("actor", "Tom Hanks", 30),
+        ("actor", "Tom Holland", 10),
+        ("actor", "Penélope Cruz", 20),
+        ("director", "Tom Hanks", 2),
+        # Duplicates of the same kind and folded key are indexed once
+        ("actor", "TOM HANKS", 30),
+    ])
+
+
+def names(results):
+    return [(result["name"], result["kind"]) for result in results]
+
+
+def test_prefix(index):
+    assert names(search(index, "toy st")) == [("Toy Story", "titulo"), ("Toy Story 2", "titulo")]
+    # The most popular entries first among the prefixes with the same spelling score
+    assert names(search(index, "tom h"))[0] == ("Tom Hanks", "actor")
+
+
+def test_exact_first(index):
+    assert names(search(index, "toy story 2"))[0] == ("Toy Story 2", "titulo")
+    assert search(index, "Toy Story")[0]["score"] > search(index, "Toy Story")[1]["score"]
+
+
+def test_accents(index):
+    assert names(search(index, "el nino"))[0] == ("El Niño", "titulo")
+    assert names(search(index, "AMELIE"))[0] == ("Amélie", "titulo")
+    assert names(search(index, "penelope"))[0] == ("Penélope Cruz", "actor")
+
+
+def test_similar_spelling(index):
+    results = search(index, "tom hnaks")
+    assert ("Tom Hanks", "actor") in names(results)
+    assert all(result["score"] > 0 for result in results)
+    assert search(index, "zzzzzz") == []
+
+
+def test_kind_and_limit(index):
+    assert names(search(index, "tom hanks", kind="director")) == [("Tom Hanks", "director")]
+    assert len(search(index, "t", limit=2)) == 2
+    assert search(index, "toy", limit=0) == []
+    assert search(index, "  !! ") == []
+    assert sum(name == ("Tom Hanks", "actor") for name in names(search(index, "tom hanks"))) == 1
@@ -0,0 +1,80 @@
+"""The aggregates of the store (api/utils/store.py) against pandas, over the binary columnar dataset."""
+
+import numpy as np
+import pytest
+from benchmarks.synthetic import write_dataset
+from api.utils import store
+
+
+@pytest.fixture(scope="module")
+def dataset(movies, tmp_path_factory):
+    folder = tmp_path_factory.mktemp("store")
+    write_dataset(movies, str(folder / "api"), str(folder / "model"), "columnar")
+    return store.read_columnar(str(folder / "api" / "movies"))
+
+
+@pytest.fixture(scope="module")
+def released(movies):
+    return movies[(movies["status"] == "Released") & movies["release_date"].notna()]
+
+
+def test_release_weekday(dataset, released):
+    weekday = store.release_aggregates(dataset)["weekday"]
+    # ISO weekday, 1 = Monday
+    expected = np.bincount(released["release_date"].dt.dayofweek + 1, minlength=8)
+    np.testing.assert_array_equal(weekday, expected)
+    assert weekday[0] == 0
+
+
+@pytest.mark.parametrize("day, weekday", [("1970-01-01", 4), ("1969-12-29", 1), ("1969-12-28", 7),
+                                          ("2000-01-01", 6), ("1900-03-05", 1)])
+def test_weekday_before_and_after_epoch(day, weekday):
+    dataset = {"columns": {"release_date": np.array([day], dtype="datetime64[D]"), "status": np.array([0])},
+               "categories": {"status": np.array(["Released"], dtype=object)}}
+    assert store.release_aggregates(dataset)["weekday"].tolist() == [int(idx == weekday) for idx in range(8)]
+
+
+def test_release_months(dataset, released):
+    aggregates = store.release_aggregates(dataset)
+    np.testing.assert_array_equal(aggregates["month"], np.bincount(released["release_date"].dt.month, minlength=13))
+
+    years = released["release_date"].dt.year
+    assert aggregates["first_year"] == years.min()
+    for year in (years.min(), years.median(), years.max()):
+        counts = released[years == int(year)]["release_date"].dt.month.value_counts()
+        expected = [int(counts.get(month, 0)) for month in range(1, 13)]
+        assert aggregates["year_month"][int(year) - aggregates["first_year"], 1:].tolist() == expected
+
+
+@pytest.mark.parametrize("index_name, names_column, jobs_column, job", [
+    ("actor", "actor_name", None, None),
+    ("director", "crew_name", "crew_job", "Director"),
+])
+def test_person_aggregates(dataset, movies, index_name, names_column, jobs_column, job):
+    index = store.person_index(store.edges_from_lists(dataset, names_column, jobs_column), job)
+    aggregates = store.person_aggregates(dict(dataset, indexes={index_name: index}), index_name,
+                                         store.person_vector_columns)
+
+    # The movies of every person, in the order of the catalogue
+    persons = {}
+    for row, movie in enumerate(movies.itertuples()):
+        names = getattr(movie, names_column)
+        jobs = getattr(movie, jobs_column) if jobs_column else [None] * len(names)
+        for name, movie_job in zip(names, jobs):
+            if job is None or movie_job == job:
+                persons.setdefault(store.normalize_string(name), []).append(row)
+
+    assert set(index["slots"]) == set(persons)
+    for key, rows in list(persons.items())[:200]:
+        slot = index["slots"][key]
+        person_movies = movies.iloc[rows]
+        assert aggregates["movies_total"][slot] == len(rows)
+        assert aggregates["return_total"][slot] == pytest.approx(person_movies["return"].sum())
+        assert aggregates["return_average"][slot] == pytest.approx(person_movies["return"].mean())
+
+        movie_slice = slice(index["starts"][slot], index["ends"][slot])
+        vectors = {name: vector[movie_slice].tolist() for name, vector in aggregates["vectors"].items()}
+        assert vectors["title"] == person_movies["title"].tolist()
+        assert vectors["release_date"] == person_movies["release_date"].dt.strftime("%Y-%m-%d").tolist()
+        for column_name in ("return", "budget", "revenue"):
+            assert vectors[column_name] == pytest.approx(person_movies[column_name].tolist())
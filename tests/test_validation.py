@@ -0,0 +1,197 @@
+"""The extraction of the nested columns of the ETL ("Data transformation/utils/validation.py")."""
+
+import ast
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+import pipeline
+from api.utils.artifacts import verify_manifest
+from api.utils.store import read_columnar
+from utils import validation
+
+
+@pytest.fixture(scope="module")
+def raw_genres(movies):
+    """The genres of the synthetic movies as the raw column, with blank and malformed values."""
+    values = [repr([{"id": idx, "name": genre} for idx, genre in enumerate(genres)]) for genres in movies["movie_genres"]]
+    values[3] = ""
+    values[5] = np.nan
+    values[7] = "[{'id': 1, 'name': 'Drama'"
+    values[11] = "not python"
+    return pd.DataFrame({"id": movies["id"], "genres": values}, index=movies.index * 3)
+
+
+def reference_lists(values, keys):
+    """Evaluate and extract every row on its own, as the notebook did before the bulk extraction."""
+    rows = {key: [] for key in keys}
+    for value in values:
+        try:
+            value = ast.literal_eval(value) if isinstance(value, str) and value else []
+        except (ValueError, SyntaxError):
+            value = []
+        for key in keys:
+            rows[key].append([item.get(key) for item in value])
+    return rows
+
+
+def test_extract_values(raw_genres):
+    dataset, report = validation.extract_values(raw_genres.copy(), "genres", ["id", "name"],
+                                                ["genre_ids", "genre_names"], report=True)
+    expected = reference_lists(raw_genres["genres"], ["id", "name"])
+    assert dataset["genre_ids"].tolist() == expected["id"]
+    assert dataset["genre_names"].tolist() == expected["name"]
+    assert dataset.index.equals(raw_genres.index)
+
+    # Blank and NaN values are empty lists, not errors; the errors keep the index of their rows
+    assert report["column"] == "genres"
+    assert report["evaluated_count"] == len(raw_genres) - 2
+    assert report["error_count"] == 2
+    assert [error["index"] for error in report["errors"]] == [raw_genres.index[7], raw_genres.index[11]]
+    assert report["errors"][0]["value"] == raw_genres["genres"].iloc[7]
+
+
+def test_extract_values_keys():
+    dataset = pd.DataFrame({"cast": ["[{'id': 1, 'name': 'A'}, {'id': 1, 'name': 'A'}, 3, {'name': 'B'}]"]})
+    dataset = validation.extract_values(dataset, "cast", ["id", "name"], ["cast_id", "cast_name"])
+    # Duplicated dictionaries are removed, missing keys and items that aren't dictionaries are None
+    assert dataset["cast_id"].tolist() == [[1, None, None]]
+    assert dataset["cast_name"].tolist() == [["A", None, "B"]]
+    with pytest.raises(ValueError):
+        validation.extract_values(dataset, "cast", ["id", "name"], ["cast_id"])
+
+
+def test_extract_dict_values():
+    dataset = pd.DataFrame({"collection": ["{'id': 10, 'name': 'Saga'}", "", np.nan, "{'other': 1}", "{'id': 2",
+                                           "{'name': 'Named'}"]})
+    dataset, report = validation.extract_dict_values(dataset, "collection", ["id", "name"],
+                                                     ["collection_id", "collection_name"], report=True)
+    assert dataset["collection_id"].tolist() == [[10], None, None, None, None, [None]]
+    assert dataset["collection_name"].tolist() == [["Saga"], None, None, None, None, ["Named"]]
+    assert report["error_count"] == 1
+    assert report["errors"][0]["index"] == 4
+
+
+def reference_duplicates(directories, keys):
+    """The indexes of the duplicated directories, comparing every directory with the previous ones (O(n²))."""
+    duplicates = []
+    for idx, directory in enumerate(directories):
+        if not isinstance(directory, dict):
+            continue
+        values = [directory.get(key) for key in keys]
+        if any(isinstance(previous, dict) and [previous.get(key) for key in keys] == values
+               for previous in directories[:idx]):
+            duplicates.append(idx)
+    return duplicates
+
+
+def test_directories_duplicates():
+    directories = [
+        {"id": 1, "name": "A"},
+        {"id": 1, "name": "A", "job": "other keys are ignored"},
+        {"id": 2, "name": "A"},
+        "not a dictionary",
+        "not a dictionary",
+        None,
+        {"id": [1, 2], "name": "unhashable"},
+        {"id": [1, 2], "name": "unhashable"},
+        {"id": [1, 3], "name": "unhashable"},
+        {"id": {"nested": 1}, "name": "unhashable"},
+        {"id": {"nested": 1}, "name": "unhashable"},
+        {"name": "missing id"},
+        {"id": None, "name": "missing id"},
+        {"id": 2, "name": "A"},
+    ]
+    keys = ["id", "name"]
+    duplicates = reference_duplicates(directories, keys)
+    assert duplicates == [1, 7, 10, 12, 13]
+
+    kept, summary = validation.directories_duplicates(list(directories), keys, delete_duplicates=True, summary=True)
+    assert kept == [directory for idx, directory in enumerate(directories) if idx not in duplicates]
+    assert summary == f"Total duplicates found: {len(duplicates)} Duplicates have been deleted."
+
+    kept, summary = validation.directories_duplicates(list(directories), keys, summary=True)
+    assert kept == directories
+    assert summary == f"Total duplicates found: {len(duplicates)} Duplicates have not been deleted."
+    assert validation.directories_duplicates([{"id": 1}], keys, True) == [{"id": 1}]
+
+
+def test_directories_duplicates_random():
+    rng = np.random.default_rng(0)
+    values = [1, 2, "a", None, (1, 2), [1, 2], {"x": 1}]
+    for _ in range(200):
+        directories = [{"id": values[rng.integers(len(values))], "name": values[rng.integers(3)]}
+                       if rng.random() < 0.9 else "text" for _ in range(rng.integers(0, 12))]
+        duplicates = set(reference_duplicates(directories, ["id", "name"]))
+        kept = validation.directories_duplicates(list(directories), ["id", "name"], True)
+        assert kept == [directory for idx, directory in enumerate(directories) if idx not in duplicates]
+
+
+def error_types(report):
+    """The report with the type of each error instead of its message (which can have memory addresses)."""
+    return dict(report, errors=[dict(error, error=error["error"].split("(")[0]) for error in report["errors"]])
+
+
+@pytest.mark.parametrize("extract, column", [(validation.extract_values, "genres"),
+                                             (validation.extract_dict_values, "collection")])
+def test_extract_workers(raw_genres, extract, column):
+    dataset = raw_genres.copy()
+    dataset["collection"] = [repr({"id": idx, "name": f"Saga {idx}"}) if idx % 4 else "{'id': 1"
+                             for idx in range(len(dataset))]
+    columns = ["first", "second"]
+    expected, expected_report = extract(dataset.copy(), column, ["id", "name"], columns, report=True)
+    for workers in (2, 3):
+        result, report = extract(dataset.copy(), column, ["id", "name"], columns, report=True, workers=workers)
+        pd.testing.assert_frame_equal(result, expected)
+        assert error_types(report) == error_types(expected_report)
+
+    # A pool shared by several calls gives the same output
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        for _ in range(2):
+            result, report = extract(dataset.copy(), column, ["id", "name"], columns, report=True, workers=2,
+                                     executor=executor)
+            pd.testing.assert_frame_equal(result, expected)
+            assert error_types(report) == error_types(expected_report)
+
+
+def test_columnar_chunks(movies, tmp_path):
+    dataset = movies.copy()
+    dataset.loc[0, "title"] = ""
+    dataset.loc[1, "title"] = "Amélie über 東京"
+    dataset.at[2, "actor_name"] = []
+
+    validation.save_columnar(dataset, str(tmp_path / "single"), pipeline.api_schema)
+    writer = validation.open_columnar(str(tmp_path / "chunks"), pipeline.api_schema)
+    for start in range(0, len(dataset), 97):
+        validation.append_columnar(writer, dataset.iloc[start:start + 97])
+    validation.close_columnar(writer, block=1000)
+
+    # The same files, whatever the chunks and the blocks
+    names = sorted(os.listdir(tmp_path / "single"))
+    assert names == sorted(os.listdir(tmp_path / "chunks"))
+    assert not [name for name in names if name.endswith((".part", ".tmp"))]
+    for name in names:
+        assert (tmp_path / "single" / name).read_bytes() == (tmp_path / "chunks" / name).read_bytes(), name
+    verify_manifest(str(tmp_path / "chunks"))
+
+    columnar = read_columnar(str(tmp_path / "chunks"))
+    assert columnar["rows"] == len(dataset)
+    columns, lists = columnar["columns"], columnar["lists"]
+    for column_name, column_type in pipeline.api_schema.items():
+        if column_type in ("int", "float"):
+            np.testing.assert_array_equal(columns[column_name], dataset[column_name].to_numpy())
+        elif column_type == "date":
+            np.testing.assert_array_equal(columns[column_name],
+                                          dataset[column_name].to_numpy().astype("datetime64[D]"))
+        elif column_type == "category":
+            categories = columnar["categories"][column_name]
+            assert list(categories) == sorted(set(dataset[column_name]))
+            assert categories[columns[column_name]].tolist() == dataset[column_name].tolist()
+        elif column_type == "str":
+            assert columns[column_name].tolist() == dataset[column_name].tolist()
+        else:
+            offsets, values, dictionary = (lists[column_name][part] for part in ("offsets", "values", "dictionary"))
+            assert list(dictionary) == sorted(set(dictionary))
+            rows = [dictionary[values[start:end]].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
+            assert rows == dataset[column_name].tolist()